@@ -86,6 +86,9 @@ END_PYTHON
 echo "=== Collecting static files ==="
 python manage.py collectstatic --no-input
 
+echo "=== Backfilling study rollups ==="
+python manage.py backfill_study_rollups
+
 echo "=== Creating admin user ==="
 python manage.py createadmin
 
@@ -2,13 +2,41 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.shortcuts import render, get_object_or_404, redirect
 from .models import Course,Lesson,LessonProgress
+from django.urls import reverse
 from django.views.generic import ListView,DetailView
+from users.pagination import paginate, wants_json
 # Create your views here.
 
+COURSES_PER_PAGE = 24
+
+
+def course_json(course):
+    return {
+        'id': course.id,
+        'title': course.title,
+        'description': course.description,
+        'url': reverse('courses:course_detail', args=[course.pk]),
+    }
+
+
 class CourseListView(LoginRequiredMixin,ListView):
     model=Course
     template_name='courses/course_list.html'
     context_object_name='courses'
+    cursor_ordering=('title','id')                            # keyset pagination: ?cursor= pages by title, id breaks ties
+
+    def get_page(self):
+        return paginate(self.request,Course.objects.all(),self.cursor_ordering,COURSES_PER_PAGE)
+
+    def get(self,request,*args,**kwargs):
+        if wants_json(request):
+            return self.get_page().json_response(course_json)
+        return super().get(request,*args,**kwargs)
+
+    def get_context_data(self,**kwargs):
+        context=super().get_context_data(**kwargs)
+        context['courses']=context['page_obj']=self.get_page()
+        return context
 
 class CourseDetailView(LoginRequiredMixin,DetailView):
     model=Course
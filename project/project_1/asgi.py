@@ -3,6 +3,15 @@ ASGI config for project_1 project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serving the project through this module (rather than wsgi.py) is what makes
+the notification push stream (/api/notifications/stream/) and the long-poll
+fallback cheap: idle connections wait on the event loop instead of holding a
+worker thread. For example:
+
+    gunicorn project_1.asgi:application -k uvicorn.workers.UvicornWorker
+
+and set NOTIFICATION_PUSH=True (plus REDIS_URL when running several workers).
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -63,6 +63,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'users.middleware.UserTimezoneMiddleware',  # the user's Profile.time_zone for dates and "today"
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -79,6 +80,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'users.context_processors.notification_settings',
             ],
         },
     },
@@ -109,6 +111,66 @@ else:
     }
 
 
+# Cache (dashboard snapshots etc.)
+# Redis when REDIS_URL is set, a shared directory when CACHE_DIR is set, otherwise per-process memory
+if config('REDIS_URL', default=None):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': config('REDIS_URL'),
+        }
+    }
+elif config('CACHE_DIR', default=None):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': config('CACHE_DIR'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'eduhelm',
+        }
+    }
+
+
+# Notification push (Server-Sent Events). Only enable when serving project_1.asgi
+# with an ASGI server; under WSGI the bell falls back to conditional polling.
+NOTIFICATION_PUSH = config('NOTIFICATION_PUSH', default=False, cast=bool)
+NOTIFICATION_STREAM_LIFETIME = 300      # seconds before the browser reconnects
+NOTIFICATION_STREAM_HEARTBEAT = 25      # seconds between keep-alive comments
+NOTIFICATION_LONG_POLL_MAX_WAIT = 25    # longest a poll request may be held
+
+# Retention (users.retention, run by manage.py compact_notifications): read notifications
+# older than this become monthly NotificationDigest counts, and activity older than
+# ACTIVITY_RETENTION_DAYS moves to UserActivityArchive, RETENTION_BATCH_SIZE rows per transaction
+NOTIFICATION_RETENTION_DAYS = config('NOTIFICATION_RETENTION_DAYS', default=90, cast=int)
+ACTIVITY_RETENTION_DAYS = config('ACTIVITY_RETENTION_DAYS', default=365, cast=int)
+RETENTION_BATCH_SIZE = config('RETENTION_BATCH_SIZE', default=1000, cast=int)
+
+# Activity feed (users.feed): activities are copied into each group member's feed when
+# they happen, except for groups with more members than this, whose members pull them in
+# when they read their feed
+FEED_FANOUT_MAX_MEMBERS = config('FEED_FANOUT_MAX_MEMBERS', default=500, cast=int)
+
+# Resource file delivery (users.downloads): '' streams from Django; 'x-accel-redirect'
+# (nginx, internal location at RESOURCE_DOWNLOAD_ACCEL_PREFIX aliased to MEDIA_ROOT)
+# or 'x-sendfile' (Apache/lighttpd) hands the transfer to the front proxy
+RESOURCE_DOWNLOAD_OFFLOAD = config('RESOURCE_DOWNLOAD_OFFLOAD', default='')
+RESOURCE_DOWNLOAD_ACCEL_PREFIX = config('RESOURCE_DOWNLOAD_ACCEL_PREFIX', default='/protected-media/')
+# Largest file a chunked resource upload may declare (users.uploads)
+RESOURCE_UPLOAD_MAX_SIZE = config('RESOURCE_UPLOAD_MAX_SIZE', default=4 * 1024 ** 3, cast=int)
+
+# Seconds between flushes of the buffered resource view/download counters (users.counters)
+COUNTER_FLUSH_INTERVAL = config('COUNTER_FLUSH_INTERVAL', default=10, cast=int)
+
+# Threads per process resizing uploaded images into renditions (users.images);
+# IMAGE_RENDITIONS_SYNC generates them inside the saving request instead
+IMAGE_RENDITION_WORKERS = config('IMAGE_RENDITION_WORKERS', default=2, cast=int)
+IMAGE_RENDITIONS_SYNC = config('IMAGE_RENDITIONS_SYNC', default=False, cast=bool)
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
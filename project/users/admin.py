@@ -1,16 +1,22 @@
+from collections import defaultdict
+
 from django.contrib import admin
+from django.utils import timezone
 from .models import (
-    Profile, StudySession, StudyGoal, NoteCategory, StudyNote, SharedResource,
+    Profile, StudySession, DailyStudyRollup, StudyGoal, NoteCategory, StudyNote, SharedResource,
     StudyGroup, GroupMembership, Discussion, DiscussionReply, PeerReview,
-    Badge, UserBadge, Notification, UserActivity
+    Badge, UserBadge, Notification, NotificationDigest, UserActivity, UserActivityArchive
 )
+from .notifications import bump_versions, recount_unread
+from .periods import user_timezone
 
 @admin.register(Profile)
 class ProfileAdmin(admin.ModelAdmin):
     list_display = ['user', 'location', 'study_streak', 'total_study_hours', 'last_study_date', 'updated_at']
     list_filter = ['location', 'created_at', 'updated_at']
     search_fields = ['user__username', 'user__email', 'bio', 'location']
-    readonly_fields = ['created_at', 'updated_at']
+    # The study ledger is derived from sessions; repair it with manage.py reconcile_study_ledger
+    readonly_fields = ['study_streak', 'total_study_hours', 'last_study_date', 'created_at', 'updated_at']
     
     fieldsets = (
         ('User Information', {
@@ -55,6 +61,33 @@ class StudySessionAdmin(admin.ModelAdmin):
     
     actions = ['end_selected_sessions']
     
+    def _session_days(self, sessions):
+        # Rollups are dated in the session owner's timezone
+        return {(s.user_id, timezone.localdate(s.start_time, user_timezone(s.user_id))) for s in sessions}
+    
+    def _rebuild_rollups(self, keys):
+        """Recompute the daily rollups touched by an admin edit"""
+        days_by_user = defaultdict(set)
+        for user_id, day in keys:
+            days_by_user[user_id].add(day)
+        for user_id, days in days_by_user.items():
+            DailyStudyRollup.rebuild(user=user_id, dates=days)
+    
+    def save_model(self, request, obj, form, change):
+        keys = self._session_days(StudySession.objects.filter(pk=obj.pk)) if change else set()
+        super().save_model(request, obj, form, change)
+        self._rebuild_rollups(keys | self._session_days([obj]))
+    
+    def delete_model(self, request, obj):
+        keys = self._session_days([obj])
+        super().delete_model(request, obj)
+        self._rebuild_rollups(keys)
+    
+    def delete_queryset(self, request, queryset):
+        keys = self._session_days(queryset)
+        super().delete_queryset(request, queryset)
+        self._rebuild_rollups(keys)
+    
     def end_selected_sessions(self, request, queryset):
         """End multiple active sessions"""
         count = 0
@@ -65,6 +98,21 @@ class StudySessionAdmin(admin.ModelAdmin):
     end_selected_sessions.short_description = "End selected active sessions"
 
 
+@admin.register(DailyStudyRollup)
+class DailyStudyRollupAdmin(admin.ModelAdmin):
+    list_display = ['user', 'date', 'course', 'minutes', 'session_count', 'updated_at']
+    list_filter = ['date', 'course']
+    search_fields = ['user__username', 'course__title']
+    readonly_fields = [
+        'user', 'date', 'course', 'minutes', 'session_count',
+        'morning_minutes', 'afternoon_minutes', 'evening_minutes', 'updated_at',
+    ]
+    date_hierarchy = 'date'
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('user', 'course')
+
+
 @admin.register(StudyGoal)
 class StudyGoalAdmin(admin.ModelAdmin):
     list_display = ['user', 'goal_type', 'target_minutes', 'is_active', 'created_at']
@@ -193,6 +241,9 @@ class StudyGroupAdmin(admin.ModelAdmin):
     readonly_fields = ['created_at', 'updated_at', 'member_count']
     date_hierarchy = 'created_at'
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('creator', 'course')
+    
     fieldsets = (
         ('Group Information', {
             'fields': ('name', 'description', 'creator')
@@ -221,6 +272,9 @@ class GroupMembershipAdmin(admin.ModelAdmin):
     readonly_fields = ['joined_at']
     date_hierarchy = 'joined_at'
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('user', 'group')
+    
     fieldsets = (
         ('Membership Information', {
             'fields': ('user', 'group', 'role')
@@ -251,12 +305,15 @@ class GroupMembershipAdmin(admin.ModelAdmin):
 
 @admin.register(Discussion)
 class DiscussionAdmin(admin.ModelAdmin):
-    list_display = ['title', 'group', 'author', 'reply_count', 'is_pinned', 'is_locked', 'created_at']
+    list_display = ['title', 'group', 'author', 'reply_count', 'last_activity_at', 'is_pinned', 'is_locked', 'created_at']
     list_filter = ['is_pinned', 'is_locked', 'group', 'created_at']
     search_fields = ['title', 'content', 'author__username', 'group__name']
-    readonly_fields = ['created_at', 'updated_at', 'reply_count']
+    readonly_fields = ['created_at', 'updated_at', 'reply_count', 'last_activity_at']
     date_hierarchy = 'created_at'
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('group', 'author')
+    
     fieldsets = (
         ('Discussion Information', {
             'fields': ('group', 'author', 'title', 'content')
@@ -265,7 +322,7 @@ class DiscussionAdmin(admin.ModelAdmin):
             'fields': ('is_pinned', 'is_locked')
         }),
         ('Statistics', {
-            'fields': ('reply_count',)
+            'fields': ('reply_count', 'last_activity_at')
         }),
         ('Metadata', {
             'fields': ('created_at', 'updated_at'),
@@ -304,8 +361,11 @@ class DiscussionReplyAdmin(admin.ModelAdmin):
     readonly_fields = ['created_at', 'updated_at']
     date_hierarchy = 'created_at'
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('discussion__group', 'author')
+    
     def has_parent(self, obj):
-        return obj.parent is not None
+        return obj.parent_id is not None
     has_parent.boolean = True
     has_parent.short_description = "Is Reply"
     
@@ -367,8 +427,8 @@ class PeerReviewAdmin(admin.ModelAdmin):
 
 @admin.register(Badge)
 class BadgeAdmin(admin.ModelAdmin):
-    list_display = ['name', 'badge_type', 'requirement', 'color', 'is_active', 'created_at']
-    list_filter = ['badge_type', 'is_active', 'created_at']
+    list_display = ['name', 'badge_type', 'metric', 'requirement', 'color', 'is_active', 'created_at']
+    list_filter = ['badge_type', 'metric', 'is_active', 'created_at']
     search_fields = ['name', 'description']
     list_editable = ['is_active']
     
@@ -380,7 +440,7 @@ class BadgeAdmin(admin.ModelAdmin):
             'fields': ('icon', 'color')
         }),
         ('Requirements', {
-            'fields': ('requirement', 'is_active')
+            'fields': ('metric', 'requirement', 'is_active')
         }),
     )
 
@@ -421,12 +481,18 @@ class NotificationAdmin(admin.ModelAdmin):
     actions = ['mark_as_read', 'mark_as_unread']
     
     def mark_as_read(self, request, queryset):
+        user_ids = set(queryset.values_list('user_id', flat=True))
         count = queryset.update(is_read=True)
+        recount_unread(user_ids)
+        bump_versions(user_ids)
         self.message_user(request, f'Marked {count} notification(s) as read.')
     mark_as_read.short_description = "Mark selected as read"
     
     def mark_as_unread(self, request, queryset):
+        user_ids = set(queryset.values_list('user_id', flat=True))
         count = queryset.update(is_read=False)
+        recount_unread(user_ids)
+        bump_versions(user_ids)
         self.message_user(request, f'Marked {count} notification(s) as unread.')
     mark_as_unread.short_description = "Mark selected as unread"
 
@@ -442,4 +508,26 @@ class UserActivityAdmin(admin.ModelAdmin):
     date_hierarchy = 'created_at'
     
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related('user')
\ No newline at end of file
+        return super().get_queryset(request).select_related('user')
+
+
+@admin.register(NotificationDigest)
+class NotificationDigestAdmin(admin.ModelAdmin):
+    list_display = ['user', 'month', 'total']
+    search_fields = ['user__username']
+    readonly_fields = ['user', 'month', 'total', 'counts']
+    date_hierarchy = 'month'
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('user')
+
+
+@admin.register(UserActivityArchive)
+class UserActivityArchiveAdmin(admin.ModelAdmin):
+    list_display = ['user', 'activity_type', 'description', 'created_at', 'archived_at']
+    list_filter = ['activity_type']
+    search_fields = ['user__username', 'description']
+    readonly_fields = ['user', 'activity_type', 'description', 'link', 'created_at', 'archived_at']
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('user')
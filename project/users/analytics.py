@@ -0,0 +1,119 @@
+"""
+Study analytics engine shared by the analytics page, its JSON endpoint and CSV export.
+
+Everything is served from DailyStudyRollup rather than raw sessions: the
+rollups already hold each local day's minutes, session count and
+time-of-day split per course (Profile.time_zone days, bucketed by session
+start hour), so the rows for the window are read once as flat columns and
+binned in a single pass into array-backed day buckets. Course titles are
+resolved afterwards with one bulk lookup.
+"""
+from array import array
+from datetime import timedelta
+
+from django.utils import timezone
+
+from courses.models import Course
+from .models import DailyStudyRollup
+from .periods import user_timezone
+
+
+def resolve_window(window, tz=None):
+    """Normalise a window into a (start_date, end_date) pair.
+
+    ``window`` may be None (whole history), a number of days ending today
+    (in ``tz``, or the current timezone), or an explicit (start_date, end_date) tuple.
+    """
+    today = timezone.localdate(timezone=tz)
+    if window is None:
+        return None, today
+    if isinstance(window, int):
+        return today - timedelta(days=window - 1), today
+    return window
+
+
+def compute_user_analytics(user, window=None, series_days=None):
+    """Compute study analytics for ``user`` over ``window`` in one pass over the daily rollups.
+
+    The daily series covers the whole window, or only its last
+    ``series_days`` days when given. Returns a plain dict that can be
+    rendered, serialised to JSON or written out as CSV.
+    """
+    tz = user_timezone(user.id)
+    start_date, end_date = resolve_window(window, tz)
+
+    rows = list(
+        DailyStudyRollup.objects.filter(user=user).in_range(start_date, end_date)
+        .order_by('date')
+        .values_list('date', 'course_id', 'minutes', 'session_count', 'morning_minutes', 'afternoon_minutes',
+                     'evening_minutes')
+    )
+
+    if series_days is not None:
+        series_start = end_date - timedelta(days=series_days - 1)
+        if start_date is not None:
+            series_start = max(series_start, start_date)
+    elif start_date is not None:
+        series_start = start_date
+    else:
+        # Whole history: the series starts on the first studied day
+        series_start = rows[0][0] if rows else end_date
+
+    day_count = (end_date - series_start).days + 1
+    day_minutes = array('l', [0]) * day_count
+    day_sessions = array('l', [0]) * day_count
+    morning_minutes = afternoon_minutes = evening_minutes = 0
+    course_minutes = {}
+    course_sessions = {}
+    total_sessions = 0
+    total_minutes = 0
+
+    for day, course_id, minutes, sessions, morning, afternoon, evening in rows:
+        total_sessions += sessions
+        total_minutes += minutes
+        morning_minutes += morning
+        afternoon_minutes += afternoon
+        evening_minutes += evening
+        course_minutes[course_id] = course_minutes.get(course_id, 0) + minutes
+        course_sessions[course_id] = course_sessions.get(course_id, 0) + sessions
+        offset = (day - series_start).days
+        if offset >= 0:
+            day_minutes[offset] += minutes
+            day_sessions[offset] += sessions
+
+    titles = dict(
+        Course.objects.filter(id__in=[cid for cid in course_minutes if cid is not None]).values_list('id', 'title')
+    )
+    course_breakdown = sorted(
+        (
+            {
+                'course_id': course_id,
+                'course__title': titles.get(course_id, 'No Course'),
+                'total_minutes': minutes,
+                'session_count': course_sessions[course_id],
+            }
+            for course_id, minutes in course_minutes.items()
+        ),
+        key=lambda stat: stat['total_minutes'],
+        reverse=True,
+    )
+
+    return {
+        'start_date': start_date.isoformat() if start_date else None,
+        'end_date': end_date.isoformat(),
+        'daily': [
+            {
+                'date': (series_start + timedelta(days=i)).strftime('%Y-%m-%d'),
+                'minutes': day_minutes[i],
+                'sessions': day_sessions[i],
+            }
+            for i in range(day_count)
+        ],
+        'course_breakdown': course_breakdown,
+        'morning_minutes': morning_minutes,
+        'afternoon_minutes': afternoon_minutes,
+        'evening_minutes': evening_minutes,
+        'total_sessions': total_sessions,
+        'total_minutes': total_minutes,
+        'avg_session_minutes': total_minutes / total_sessions if total_sessions else 0,
+    }
@@ -0,0 +1,154 @@
+"""
+Rule-driven badge evaluation.
+
+Each Badge names a ``metric`` and a ``requirement`` threshold. Metrics are
+registered here; evaluation loads the user's earned badges once, computes
+each metric at most once and writes awards and notifications in bulk.
+Awards are written with the user's profile row locked and only the rows
+an evaluation actually inserted are announced, so when two evaluations for
+one user race, each badge is notified once.
+users.signals triggers it from the models whose metrics can change, so
+the badge endpoints only read results.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from courses.models import LessonProgress
+from .conditional import touch
+from .dashboard import UserDashboardSnapshot
+from .models import (
+    Profile, StudyNote, SharedResource, GroupMembership, Discussion, PeerReview,
+    Badge, UserBadge, Notification
+)
+from .feed import record_activity
+from .notifications import deliver
+
+BADGE_METRICS = {}
+
+
+def badge_metric(name):
+    """Register a function computing ``name`` for a user id"""
+    def register(func):
+        BADGE_METRICS[name] = func
+        return func
+    return register
+
+
+@badge_metric('study_hours')
+def study_hours(user_id):
+    return Profile.objects.filter(user_id=user_id).values_list('total_study_hours', flat=True).first() or 0
+
+
+@badge_metric('study_streak')
+def study_streak(user_id):
+    return Profile.objects.filter(user_id=user_id).values_list('study_streak', flat=True).first() or 0
+
+
+@badge_metric('groups_joined')
+def groups_joined(user_id):
+    return GroupMembership.objects.filter(user_id=user_id).count()
+
+
+@badge_metric('discussions_started')
+def discussions_started(user_id):
+    return Discussion.objects.filter(author_id=user_id).count()
+
+
+@badge_metric('reviews_given')
+def reviews_given(user_id):
+    return PeerReview.objects.filter(reviewer_id=user_id).count()
+
+
+@badge_metric('notes_created')
+def notes_created(user_id):
+    return StudyNote.objects.filter(user_id=user_id).count()
+
+
+@badge_metric('resources_shared')
+def resources_shared(user_id):
+    return SharedResource.objects.filter(user_id=user_id).count()
+
+
+@badge_metric('lessons_completed')
+def lessons_completed(user_id):
+    # A LessonProgress row is how the courses app records a completed lesson
+    return LessonProgress.objects.filter(user_link_id=user_id).count()
+
+
+# Models whose changes can move a metric: model -> (user field, metrics, on create only)
+METRIC_TRIGGERS = {
+    Profile: ('user_id', ('study_hours', 'study_streak'), False),
+    GroupMembership: ('user_id', ('groups_joined',), True),
+    Discussion: ('author_id', ('discussions_started',), True),
+    PeerReview: ('reviewer_id', ('reviews_given',), True),
+    StudyNote: ('user_id', ('notes_created',), True),
+    SharedResource: ('user_id', ('resources_shared',), True),
+    LessonProgress: ('user_link_id', ('lessons_completed',), True),
+}
+
+
+def evaluate_badges(user_id, metrics=None):
+    """Award every active badge the user now qualifies for.
+
+    Restrict to ``metrics`` when only some inputs changed. The
+    ``badges_earned`` metric is always checked after the others, since new
+    awards can satisfy it. Returns the list of newly awarded badges.
+    """
+    earned = set(UserBadge.objects.filter(user_id=user_id).values_list('badge_id', flat=True))
+    candidates = Badge.objects.filter(is_active=True).exclude(metric='').exclude(id__in=earned)
+    if metrics is not None:
+        candidates = candidates.filter(metric__in=set(metrics) | {'badges_earned'})
+
+    values = {}
+    newly_earned = []
+    deferred = []
+    for badge in candidates:
+        if badge.metric == 'badges_earned':
+            deferred.append(badge)
+            continue
+        if badge.metric not in values:
+            values[badge.metric] = BADGE_METRICS[badge.metric](user_id)
+        if values[badge.metric] >= badge.requirement:
+            newly_earned.append(badge)
+
+    total_earned = len(earned) + len(newly_earned)
+    for badge in sorted(deferred, key=lambda b: b.requirement):
+        if total_earned >= badge.requirement:
+            newly_earned.append(badge)
+            total_earned += 1
+
+    if not newly_earned:
+        return []
+
+    with transaction.atomic():
+        # Serialize with other evaluations for this user; the ones they awarded meanwhile conflict
+        list(Profile.objects.select_for_update().filter(user_id=user_id).values_list('pk', flat=True))
+        earned_at = timezone.now()
+        UserBadge.objects.bulk_create(
+            [UserBadge(user_id=user_id, badge=badge, earned_at=earned_at) for badge in newly_earned],
+            ignore_conflicts=True,
+        )
+        # Only announce the rows this call inserted
+        inserted = set(
+            UserBadge.objects.filter(user_id=user_id, badge__in=newly_earned, earned_at=earned_at)
+            .values_list('badge_id', flat=True)
+        )
+        newly_earned = [badge for badge in newly_earned if badge.id in inserted]
+        if not newly_earned:
+            return []
+        deliver([
+            Notification(
+                user_id=user_id,
+                notification_type='badge',
+                title=f'🏆 Badge Earned: {badge.name}',
+                message=badge.description,
+                link='/profile/',
+            )
+            for badge in newly_earned
+        ])
+        for badge in newly_earned:
+            record_activity(user_id, 'badge_earned', f'Earned the {badge.name} badge')
+    # bulk_create skips post_save, so do the receivers' work by hand
+    UserDashboardSnapshot.invalidate(user_id, 'badges_count')
+    touch('badges', user_id)
+    return newly_earned
@@ -0,0 +1,102 @@
+"""
+Conditional GET support for the per-user JSON endpoints.
+
+Every cacheable resource has a version stamp in the cache: the time its data
+last changed, written by users.signals (or by hand after bulk writes) through
+touch(). Views decorated with user_resource_condition derive their ETag and
+Last-Modified from those stamps alone, so Django's condition() machinery can
+answer If-None-Match / If-Modified-Since with 304 before any rows are loaded.
+
+That is only sound when every worker reads the same stamps. With a cache
+local to each process (LocMemCache, the default without REDIS_URL or
+CACHE_DIR) a touch() in one worker is invisible to the others, so the views
+send no validators at all there and always answer in full. Stamps expire
+after STAMP_TIMEOUT; an expired one starts a new version, which costs
+clients one refetch.
+"""
+import hashlib
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.views.decorators.http import condition
+
+STAMP_KEY = 'conditional:{}:{}'
+STAMP_TIMEOUT = 24 * 60 * 60
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def cache_is_shared():
+    """Whether all workers see the same default cache, so stamps written by one hold for the others"""
+    return settings.CACHES['default']['BACKEND'] not in PROCESS_LOCAL_CACHES
+
+
+def stamp_key(resource, user_id=None):
+    return STAMP_KEY.format(resource, 'all' if user_id is None else user_id)
+
+
+def touch(resource, user_id=None):
+    """Record that a user's resource (or a shared one, without user_id) changed"""
+    cache.set(stamp_key(resource, user_id), time.time(), STAMP_TIMEOUT)
+
+
+def touch_many(resource, user_ids):
+    now = time.time()
+    cache.set_many({stamp_key(resource, user_id): now for user_id in user_ids}, STAMP_TIMEOUT)
+
+
+def get_stamps(keys):
+    stamps = cache.get_many(keys)
+    missing = [key for key in keys if key not in stamps]
+    if missing:
+        # Never touched or evicted: start a new version, which costs clients one refetch
+        now = time.time()
+        for key in missing:
+            cache.add(key, now, STAMP_TIMEOUT)
+        stamps.update(cache.get_many(missing))
+    return [stamps[key] for key in keys]
+
+
+def user_resource_condition(*resources, shared=(), relative_times=False, ajax_only=False, extra=None):
+    """Make a view conditional on the request user's ``resources`` stamps.
+
+    ``shared`` names stamps common to all users (e.g. the badge catalogue).
+    Use ``relative_times`` when the payload has "5 minutes ago" labels, which
+    go stale with time alone, and ``ajax_only`` for views that render HTML
+    unless asked for JSON. ``extra(request)`` adds any other input the
+    payload depends on to the ETag; such views send no Last-Modified, as a
+    change in that input (say, the date) leaves every stamp as it was.
+    """
+    def request_stamps(request):
+        if not hasattr(request, '_conditional_stamps'):
+            keys = [stamp_key(resource, request.user.id) for resource in resources]
+            keys += [stamp_key(resource) for resource in shared]
+            stamps = get_stamps(keys)
+            if relative_times:
+                stamps.append(time.time() // 60 * 60)
+            request._conditional_stamps = stamps
+        return request._conditional_stamps
+
+    def applies(request):
+        if not request.user.is_authenticated or not cache_is_shared():
+            return False
+        return not ajax_only or request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+
+    def etag(request, *args, **kwargs):
+        if not applies(request):
+            return None
+        token = f'{request.user.id}:{request.get_full_path()}:{request_stamps(request)!r}'
+        if extra is not None:
+            token += f':{extra(request)}'
+        return hashlib.md5(token.encode()).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        if extra is not None or not applies(request):
+            return None
+        return datetime.fromtimestamp(max(request_stamps(request)), tz=dt_timezone.utc)
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
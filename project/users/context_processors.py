@@ -0,0 +1,6 @@
+from .notifications import push_available
+
+
+def notification_settings(request):
+    """Tell the notification bell whether the push stream is available"""
+    return {'notification_push': push_available()}
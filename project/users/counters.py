@@ -0,0 +1,95 @@
+"""
+Write-behind counters for hot integer columns (SharedResource.views/downloads).
+
+Requests only add to an in-process buffer under a lock; nothing touches the
+database on the request path. A daemon thread flushes the buffer every
+COUNTER_FLUSH_INTERVAL seconds, and once more when the process exits, as
+one UPDATE ... SET views = views + n per distinct increment, so concurrent
+processes add to the row instead of overwriting each other and updated_at
+is left alone. A failed flush puts its increments back for the next one,
+and the whole flush commits or rolls back together, so no count is applied
+twice. Counts still buffered in a process that is killed outright are lost.
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+
+logger = logging.getLogger(__name__)
+
+FLUSH_BATCH_SIZE = 500
+
+
+class CounterBuffer:
+    def __init__(self, interval=None):
+        self.interval = interval
+        self.pending = Counter()    # (model, field, pk) -> increment not yet written
+        self.lock = threading.Lock()
+        self._thread = None
+
+    def incr(self, model, field, pk, amount=1):
+        with self.lock:
+            self.pending[(model, field, pk)] += amount
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='counter-flush', daemon=True)
+                self._thread.start()
+
+    def pending_for(self, model, field, pk):
+        with self.lock:
+            return self.pending.get((model, field, pk), 0)
+
+    def flush(self):
+        """Write every buffered increment; returns the number of counters written"""
+        with self.lock:
+            batch, self.pending = self.pending, Counter()
+        if not batch:
+            return 0
+
+        rows = defaultdict(list)
+        for (model, field, pk), amount in batch.items():
+            rows[(model, field, amount)].append(pk)
+        try:
+            with transaction.atomic():
+                for (model, field, amount), pks in rows.items():
+                    for i in range(0, len(pks), FLUSH_BATCH_SIZE):
+                        model._default_manager.filter(pk__in=pks[i:i + FLUSH_BATCH_SIZE]).update(
+                            **{field: F(field) + amount}
+                        )
+        except Exception:
+            logger.exception('Counter flush failed; keeping %d counters for the next one', len(batch))
+            with self.lock:
+                self.pending.update(batch)
+            return 0
+        return len(batch)
+
+    def _run(self):
+        interval = self.interval or getattr(settings, 'COUNTER_FLUSH_INTERVAL', 10)
+        while True:
+            time.sleep(interval)
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+
+
+buffer = CounterBuffer()
+atexit.register(buffer.flush)
+
+
+def increment(obj, field, amount=1):
+    """Add ``amount`` to ``obj.<field>`` in the database at the next flush"""
+    buffer.incr(type(obj), field, obj.pk, amount)
+
+
+def pending(obj, field):
+    """Increments to ``obj.<field>`` buffered in this process and not yet written"""
+    return buffer.pending_for(type(obj), field, obj.pk)
+
+
+def flush():
+    return buffer.flush()
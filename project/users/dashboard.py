@@ -0,0 +1,169 @@
+"""
+Cached per-user dashboard snapshot.
+
+Each field lives under its own cache key so that the post_save/post_delete
+receivers in users.signals can drop just the fields a model change affects
+once the surrounding transaction commits. Only plain values are cached, so
+any cache backend (local memory, file based, Redis) works.
+"""
+from django.core.cache import cache
+from django.db.models import Q, Sum
+
+from .models import (
+    StudySession, DailyStudyRollup, StudyNote, SharedResource, GroupMembership, StudyGoal, UserBadge
+)
+from .periods import period_start, user_timezone
+
+CACHE_PREFIX = 'dashboard:v1'
+SNAPSHOT_TIMEOUT = 60 * 60
+RECENT_SESSIONS_LIMIT = 10
+
+
+def _period_start(user_id, period):
+    # The user's own day and week, whoever asks
+    return period_start(period, user_timezone(user_id))
+
+
+def _recent_sessions(user):
+    return [
+        {
+            'id': session.id,
+            'course': {'title': session.course.title} if session.course else None,
+            'duration': session.duration,
+            'start_time': session.start_time,
+            'end_time': session.end_time,
+        }
+        for session in StudySession.objects.for_user(user).completed().recent(RECENT_SESSIONS_LIMIT)
+    ]
+
+
+def _active_session(user):
+    session = StudySession.objects.for_user(user).active().select_related('course').order_by('-start_time').first()
+    if session is None:
+        return None
+    return {
+        'id': session.id,
+        'course': {'title': session.course.title} if session.course else None,
+        'start_time': session.start_time,
+    }
+
+
+def _active_goals(user):
+    """Active goals with their progress: one query for the goals, one aggregate for every period's total"""
+    goals = list(
+        StudyGoal.objects.filter(user=user, is_active=True).values('id', 'goal_type', 'target_minutes')
+    )
+    if not goals:
+        return []
+    starts = {
+        goal_type: _period_start(user.id, period)
+        for goal_type, period in StudyGoal.GOAL_PERIODS.items()
+        if any(goal['goal_type'] == goal_type for goal in goals)
+    }
+    totals = DailyStudyRollup.objects.filter(user=user, date__gte=min(starts.values())).aggregate(**{
+        goal_type: Sum('minutes', filter=Q(date__gte=start)) for goal_type, start in starts.items()
+    })
+    labels = dict(StudyGoal.GOAL_TYPE_CHOICES)
+    return [
+        {
+            'goal': {**goal, 'goal_type_display': labels.get(goal['goal_type'], goal['goal_type'])},
+            'progress': StudyGoal.progress(goal['target_minutes'], totals[goal['goal_type']] or 0),
+        }
+        for goal in goals
+    ]
+
+
+class UserDashboardSnapshot:
+    """Counts and study totals shown on the dashboard, profile and home pages"""
+
+    COMPUTE = {
+        'notes_count': lambda user: StudyNote.objects.filter(user=user).count(),
+        'resources_count': lambda user: SharedResource.objects.filter(user=user).count(),
+        'groups_count': lambda user: GroupMembership.objects.filter(user=user).count(),
+        'goals_count': lambda user: StudyGoal.objects.filter(user=user, is_active=True).count(),
+        'badges_count': lambda user: UserBadge.objects.filter(user=user).count(),
+        'today_minutes': lambda user: DailyStudyRollup.objects.filter(user=user).in_range(_period_start(user.id, 'day')).minutes_sum(),
+        'weekly_minutes': lambda user: DailyStudyRollup.objects.filter(user=user).in_range(_period_start(user.id, 'week')).minutes_sum(),
+        'recent_sessions': _recent_sessions,
+        'active_session': _active_session,
+        'active_goals': _active_goals,
+    }
+    FIELDS = tuple(COMPUTE)
+
+    # Which snapshot fields a change to each model can affect
+    FIELDS_BY_MODEL = {
+        StudySession: ('today_minutes', 'weekly_minutes', 'recent_sessions', 'active_session', 'active_goals'),
+        StudyNote: ('notes_count',),
+        SharedResource: ('resources_count',),
+        GroupMembership: ('groups_count',),
+        StudyGoal: ('goals_count', 'active_goals'),
+        UserBadge: ('badges_count',),
+    }
+
+    def __init__(self, user):
+        self.user = user
+        self._data = None
+
+    @staticmethod
+    def cache_key(user_id, field):
+        # Time-windowed totals are keyed by their period so they roll over on their own
+        if field == 'today_minutes':
+            return f'{CACHE_PREFIX}:{user_id}:{field}:{_period_start(user_id, "day")}'
+        if field == 'weekly_minutes':
+            return f'{CACHE_PREFIX}:{user_id}:{field}:{_period_start(user_id, "week")}'
+        if field == 'active_goals':
+            # A new day can start a new week or month too
+            return f'{CACHE_PREFIX}:{user_id}:{field}:{_period_start(user_id, "day")}'
+        return f'{CACHE_PREFIX}:{user_id}:{field}'
+
+    def get(self, *fields):
+        """Return every field (or just ``fields``), rebuilding only the ones missing from the cache"""
+        if self._data is not None:
+            return self._data
+
+        keys = {field: self.cache_key(self.user.id, field) for field in fields or self.FIELDS}
+        cached = cache.get_many(keys.values())
+        data = {}
+        missing = {}
+        for field, key in keys.items():
+            if key in cached:
+                data[field] = cached[key]
+            else:
+                data[field] = missing[key] = self.COMPUTE[field](self.user)
+
+        self._bump('hits', len(keys) - len(missing))
+        if missing:
+            self._bump('misses', len(missing))
+            self._bump('rebuilds')
+            cache.set_many(missing, SNAPSHOT_TIMEOUT)
+
+        if not fields:
+            self._data = data
+        return data
+
+    def __getitem__(self, field):
+        return self.get()[field]
+
+    @classmethod
+    def invalidate(cls, user_id, *fields):
+        """Drop the given fields (or the whole snapshot) for one user"""
+        cache.delete_many([cls.cache_key(user_id, field) for field in fields or cls.FIELDS])
+
+    @staticmethod
+    def _bump(counter, amount=1):
+        if not amount:
+            return
+        key = f'{CACHE_PREFIX}:stats:{counter}'
+        cache.add(key, 0, None)
+        try:
+            cache.incr(key, amount)
+        except ValueError:
+            # The counter was evicted between add() and incr()
+            cache.set(key, amount, None)
+
+    @staticmethod
+    def stats():
+        """Hit, miss and rebuild counters across all users"""
+        counters = ('hits', 'misses', 'rebuilds')
+        values = cache.get_many([f'{CACHE_PREFIX}:stats:{name}' for name in counters])
+        return {name: values.get(f'{CACHE_PREFIX}:stats:{name}', 0) for name in counters}
@@ -0,0 +1,134 @@
+"""
+Permission-checked file delivery for uploaded resources.
+
+serve_file() answers a GET for a stored file the way a static file server
+would: ETag and Last-Modified from the file's size and mtime (so
+If-None-Match / If-Modified-Since get a 304), and single byte-range
+requests (Range / If-Range) with 206 Partial Content so audio and video
+players can seek. Bodies are streamed in CHUNK_SIZE reads, so memory per
+download stays constant whatever the file size.
+
+With a front proxy, RESOURCE_DOWNLOAD_OFFLOAD hands the transfer back to it
+after Django has checked permissions:
+
+* 'x-accel-redirect' (nginx) sends RESOURCE_DOWNLOAD_ACCEL_PREFIX + the file
+  name, which nginx must map to MEDIA_ROOT in an internal location::
+
+      location /protected-media/ { internal; alias /path/to/media/; }
+
+* 'x-sendfile' (Apache mod_xsendfile, lighttpd) sends the absolute path.
+
+The proxy then handles ranges and conditional requests itself.
+"""
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+
+CHUNK_SIZE = 64 * 1024
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def file_etag(size, mtime):
+    return f'"{size:x}-{int(mtime * 1_000_000):x}"'
+
+
+def parse_range(header, size):
+    """(start, end) inclusive for a single satisfiable byte range, None to ignore the header,
+    or False when it cannot be satisfied"""
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None  # Malformed or multiple ranges: serve the whole file
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # bytes=-N: the final N bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def iter_chunks(stream, start, length):
+    """Read ``length`` bytes from ``start`` in CHUNK_SIZE pieces, closing the file at the end"""
+    try:
+        stream.seek(start)
+        while length > 0:
+            chunk = stream.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        stream.close()
+
+
+def _if_range_matches(request, etag, mtime):
+    value = request.headers.get('If-Range')
+    if value is None:
+        return True
+    if value.startswith(('"', 'W/')):
+        return value == etag
+    modified = parse_http_date_safe(value)
+    return modified is not None and int(mtime) <= modified
+
+
+def serve_file(request, fieldfile, as_attachment=True, filename=None):
+    """Response delivering ``fieldfile`` (a FieldFile); raises FileNotFoundError if it is gone"""
+    storage, name = fieldfile.storage, fieldfile.name
+    size = storage.size(name)
+    mtime = storage.get_modified_time(name).timestamp()
+    etag = file_etag(size, mtime)
+    filename = filename or os.path.basename(name)
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=int(mtime))
+    if not_modified is not None:
+        return not_modified
+
+    offload = getattr(settings, 'RESOURCE_DOWNLOAD_OFFLOAD', '')
+    if offload:
+        response = HttpResponse(content_type=content_type)
+        if offload == 'x-sendfile':
+            response['X-Sendfile'] = storage.path(name)
+        else:
+            response['X-Accel-Redirect'] = quote(settings.RESOURCE_DOWNLOAD_ACCEL_PREFIX + name)
+    else:
+        byte_range = None
+        if 'Range' in request.headers and _if_range_matches(request, etag, mtime):
+            byte_range = parse_range(request.headers['Range'], size)
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+        stream = fieldfile.open('rb')
+        if byte_range is None:
+            response = FileResponse(stream, content_type=content_type)
+            response.block_size = CHUNK_SIZE
+        else:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                iter_chunks(stream, start, end - start + 1), status=206, content_type=content_type,
+            )
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = str(end - start + 1)
+        response['Accept-Ranges'] = 'bytes'
+
+    response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(mtime)
+    response['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,97 @@
+"""
+The social activity feed: what a user and the members of their study groups did.
+
+record_activity() saves a UserActivity and, once the transaction commits,
+fan_out() writes a FeedEntry (reader, activity, created_at) for the actor
+and for every member of the actor's study groups. Reading a feed is then a
+single range scan of the feed_user_created index, however many groups the
+reader is in.
+
+Groups with more than FEED_FANOUT_MAX_MEMBERS members would make every
+activity cost thousands of rows, mostly for readers who never look. Their
+activities get one GroupFeedEntry instead, and sync_feed() copies the ones a
+reader has not seen (past GroupMembership.feed_cursor) into that reader's
+feed when it is read: at most FEED_SYNC_LIMIT per group, the newest.
+"""
+from django.conf import settings
+from django.db import transaction
+
+from .conditional import touch_many
+from .models import FeedEntry, GroupFeedEntry, GroupMembership, StudyGroup, UserActivity
+from .pagination import paginate
+
+FEED_PAGE_SIZE = 20
+FEED_SYNC_LIMIT = 200
+FANOUT_BATCH_SIZE = 2000
+
+
+def record_activity(user_id, activity_type, description, link='', group_ids=None):
+    """Save an activity and share it on commit; ``group_ids`` narrows the actor's groups it goes to"""
+    activity = UserActivity.objects.create(
+        user_id=user_id, activity_type=activity_type, description=description, link=link,
+    )
+    transaction.on_commit(lambda: fan_out(activity, group_ids))
+    return activity
+
+
+def fan_out(activity, group_ids=None):
+    """Write ``activity`` into the feeds of its actor and the actor's fellow group members"""
+    groups = StudyGroup.objects.filter(members__user_id=activity.user_id)
+    if group_ids is not None:
+        groups = groups.filter(pk__in=group_ids)
+    small, large = [], []
+    for group_id, member_count in groups.values_list('pk', 'member_count'):
+        (small if member_count <= settings.FEED_FANOUT_MAX_MEMBERS else large).append(group_id)
+
+    readers = {activity.user_id}
+    readers.update(GroupMembership.objects.filter(group_id__in=small).values_list('user_id', flat=True))
+    with transaction.atomic():
+        FeedEntry.objects.bulk_create(
+            [FeedEntry(user_id=user_id, activity=activity, created_at=activity.created_at) for user_id in readers],
+            batch_size=FANOUT_BATCH_SIZE, ignore_conflicts=True,
+        )
+        GroupFeedEntry.objects.bulk_create(
+            [GroupFeedEntry(group_id=group_id, activity=activity, created_at=activity.created_at) for group_id in large]
+        )
+    # Large groups' members are not touched; the feed's minute stamp (relative_times) covers them
+    touch_many('activity', readers)
+
+
+def sync_feed(user_id):
+    """Copy new activity of the reader's large groups into their feed"""
+    memberships = GroupMembership.objects.filter(
+        user_id=user_id, group__member_count__gt=settings.FEED_FANOUT_MAX_MEMBERS,
+    ).values_list('pk', 'group_id', 'feed_cursor')
+    for membership_id, group_id, cursor in memberships:
+        entries = list(
+            GroupFeedEntry.objects.filter(group_id=group_id, pk__gt=cursor)
+            .order_by('-pk').values_list('pk', 'activity_id', 'created_at')[:FEED_SYNC_LIMIT]
+        )
+        if not entries:
+            continue
+        with transaction.atomic():
+            FeedEntry.objects.bulk_create([
+                FeedEntry(user_id=user_id, activity_id=activity_id, created_at=created_at)
+                for _, activity_id, created_at in entries
+            ], ignore_conflicts=True)
+            GroupMembership.objects.filter(pk=membership_id).update(feed_cursor=entries[0][0])
+
+
+def feed_page(request, user_id, per_page=FEED_PAGE_SIZE):
+    """One cursor page (?cursor=) of a user's feed, newest first"""
+    sync_feed(user_id)
+    entries = FeedEntry.objects.filter(user_id=user_id).select_related('activity__user')
+    return paginate(request, entries, ['-created_at', '-id'], per_page)
+
+
+def serialize_entry(entry):
+    activity = entry.activity
+    return {
+        'id': str(activity.id),
+        'user': activity.user.username,
+        'activity_type': activity.activity_type,
+        'description': activity.description,
+        'link': activity.link,
+        'created_at': activity.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+        'time_ago': activity.time_ago(),
+    }
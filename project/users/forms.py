@@ -2,6 +2,7 @@ from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 from .models import Profile
+from .periods import timezone_choices
 
 
 class UserRegisterForm(UserCreationForm):
@@ -28,10 +29,16 @@ class UserUpdateForm(forms.ModelForm):
 
 class ProfileUpdateForm(forms.ModelForm):
     """Form for updating user profile information"""
+    time_zone = forms.ChoiceField(
+        choices=timezone_choices,
+        label='Time Zone',
+        help_text='Your study days and streaks start at midnight here',
+        widget=forms.Select(attrs={'class': 'form-control'}),
+    )
     
     class Meta:
         model = Profile
-        fields = ['image', 'bio', 'phone_number', 'location', 'date_of_birth']
+        fields = ['image', 'bio', 'phone_number', 'location', 'date_of_birth', 'time_zone']
         widgets = {
             'bio': forms.Textarea(attrs={
                 'class': 'form-control',
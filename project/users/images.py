@@ -0,0 +1,176 @@
+"""
+Resized renditions of uploaded profile, course and group images.
+
+Each image field listed by image_fields() gets fixed-size WebP and JPEG
+renditions (SPECS) once its upload is committed. The work runs on a small
+thread pool (Pillow releases the GIL while resizing), so the saving request
+does not wait. Renditions are written next to the original with the first
+hex digits of the original's SHA-256 in their names, e.g.
+
+    profile_pics/me.jpg  ->  profile_pics/me.avatar_128.3f9a1c2e.webp
+
+so a re-upload under the same name never serves a stale copy from a
+browser or CDN cache, and generate_renditions() can tell that the
+renditions on record were made from older content. ImageRendition records which renditions exist, and
+the {% rendition %} template tag (users.templatetags.renditions) looks them
+up through the cache, falling back to the original until they are ready.
+``manage.py generate_renditions`` backfills existing media.
+"""
+import hashlib
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, close_old_connections
+from PIL import Image, ImageOps
+
+from .models import ImageRendition
+
+logger = logging.getLogger(__name__)
+
+# name -> (width, height, crop); without crop the image is scaled to fit inside the box.
+# Images are never enlarged.
+SPECS = {
+    'avatar_64': (64, 64, True),
+    'avatar_128': (128, 128, True),
+    'card': (400, 250, True),
+    'cover': (1200, 1200, False),
+}
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+# Bump to regenerate every rendition after changing SPECS or FORMATS
+VERSION = 1
+
+MANIFEST_KEY = 'renditions:{}'
+MANIFEST_TIMEOUT = 60 * 60 * 24
+PENDING_TIMEOUT = 60
+
+
+def image_fields():
+    """(model, field name, spec names) for every image that gets renditions"""
+    from courses.models import Course
+    from .models import Profile, StudyGroup
+
+    return [
+        (Profile, 'image', ('avatar_64', 'avatar_128')),
+        (Course, 'image', ('card', 'cover')),
+        (StudyGroup, 'cover_image', ('card', 'cover')),
+    ]
+
+
+def manifest_key(source):
+    return MANIFEST_KEY.format(hashlib.md5(source.encode()).hexdigest())
+
+
+def get_manifest(source):
+    """{(spec, format): url} of the renditions that exist for ``source``"""
+    key = manifest_key(source)
+    manifest = cache.get(key)
+    if manifest is None:
+        rows = ImageRendition.objects.filter(source=source).values_list('spec', 'format', 'file')
+        manifest = {(spec, fmt): default_storage.url(name) for spec, fmt, name in rows}
+        # Nothing yet usually means a job is running; look again soon rather than caching the miss all day
+        cache.set(key, manifest, MANIFEST_TIMEOUT if manifest else PENDING_TIMEOUT)
+    return manifest
+
+
+def rendition_name(source, spec, fmt, digest):
+    root, _ = os.path.splitext(source)
+    return f'{root}.{spec}.{digest[:8]}.{fmt}'
+
+
+def render(image, spec, fmt):
+    width, height, crop = SPECS[spec]
+    if crop:
+        size = (min(width, image.width), min(height, image.height))
+        resized = ImageOps.fit(image, size, Image.Resampling.LANCZOS)
+    else:
+        resized = image.copy()
+        resized.thumbnail((width, height), Image.Resampling.LANCZOS)
+    format_name, options = FORMATS[fmt]
+    if format_name == 'JPEG' and resized.mode != 'RGB':
+        resized = resized.convert('RGB')
+    buffer = io.BytesIO()
+    resized.save(buffer, format_name, **options)
+    return resized.size, buffer.getvalue()
+
+
+def generate_renditions(source, specs, force=False):
+    """Create the missing or outdated renditions of the stored image ``source``; returns how many were written"""
+    if not default_storage.exists(source):
+        return 0
+
+    with default_storage.open(source, 'rb') as original:
+        data = original.read()
+    digest = hashlib.sha256(data + f':{VERSION}'.encode()).hexdigest()
+    wanted = {(spec, fmt) for spec in specs for fmt in FORMATS}
+    existing = {
+        (spec, fmt): name
+        for spec, fmt, name in ImageRendition.objects.filter(source=source).values_list('spec', 'format', 'file')
+    }
+    if not force:
+        # Renditions are named after the content they were made from, so new content under the same name misses
+        wanted = {key for key in wanted if existing.get(key) != rendition_name(source, *key, digest)}
+    if not wanted:
+        return 0
+
+    with Image.open(io.BytesIO(data)) as opened:
+        image = ImageOps.exif_transpose(opened)
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+
+    written = 0
+    for spec, fmt in sorted(wanted):
+        (width, height), content = render(image, spec, fmt)
+        name = rendition_name(source, spec, fmt, digest)
+        if not default_storage.exists(name):
+            name = default_storage.save(name, ContentFile(content))
+        try:
+            ImageRendition.objects.update_or_create(
+                source=source, spec=spec, format=fmt,
+                defaults={'file': name, 'width': width, 'height': height},
+            )
+        except IntegrityError:
+            continue  # Another job wrote the same rendition first
+        if existing.get((spec, fmt)) not in (None, name):
+            default_storage.delete(existing[(spec, fmt)])
+        written += 1
+    cache.delete(manifest_key(source))
+    return written
+
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'IMAGE_RENDITION_WORKERS', 2), thread_name_prefix='renditions',
+        )
+    return _executor
+
+
+def _job(source, specs):
+    try:
+        generate_renditions(source, specs)
+    except Exception:
+        logger.exception('Could not generate renditions for %s', source)
+    finally:
+        close_old_connections()
+
+
+def schedule_renditions(source, specs):
+    """Generate renditions for ``source`` in the background"""
+    if getattr(settings, 'IMAGE_RENDITIONS_SYNC', False):
+        _job(source, specs)
+    else:
+        get_executor().submit(_job, source, specs)
@@ -0,0 +1,26 @@
+"""
+Management command to (re)build the daily study rollup table from session history
+"""
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from users.models import DailyStudyRollup
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds DailyStudyRollup rows from completed study sessions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Only rebuild rollups for this username')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f'User "{options["user"]}" does not exist')
+
+        written = DailyStudyRollup.rebuild(user=user)
+        scope = f'user "{user.username}"' if user else 'all users'
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} rollup row(s) for {scope}.'))
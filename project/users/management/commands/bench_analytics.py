@@ -0,0 +1,117 @@
+"""
+Micro-benchmark for the study analytics engine.
+
+For each size, seeds a throwaway user with completed sessions spread over
+several courses (and their daily rollups), then times the original multi-pass study_analytics code
+against compute_user_analytics. Everything is rolled back afterwards.
+"""
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, reset_queries, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from courses.models import Course
+from users.analytics import compute_user_analytics
+from users.models import DailyStudyRollup, StudySession
+
+
+class Rollback(Exception):
+    pass
+
+
+def legacy_analytics(user):
+    """The pre-engine study_analytics computation: one pass per statistic"""
+    all_sessions = [s for s in StudySession.objects.filter(user=user).order_by('-start_time') if not s.is_active]
+    thirty_days_ago = timezone.now() - timedelta(days=30)
+    recent_sessions = [s for s in all_sessions if s.start_time >= thirty_days_ago]
+
+    daily_data = []
+    for i in range(30):
+        date = (timezone.now() - timedelta(days=i)).date()
+        day_start = timezone.make_aware(datetime.combine(date, datetime.min.time()))
+        day_end = timezone.make_aware(datetime.combine(date, datetime.max.time()))
+        day_sessions = [s for s in recent_sessions if day_start <= s.start_time <= day_end]
+        daily_data.append({'date': date.strftime('%Y-%m-%d'), 'minutes': sum(s.duration for s in day_sessions)})
+
+    course_stats = defaultdict(lambda: {'total_minutes': 0, 'session_count': 0})
+    for session in all_sessions:
+        course_title = session.course.title if session.course else 'No Course'
+        course_stats[course_title]['total_minutes'] += session.duration
+        course_stats[course_title]['session_count'] += 1
+
+    morning = sum(s.duration for s in all_sessions if s.start_time.hour < 12)
+    afternoon = sum(s.duration for s in all_sessions if 12 <= s.start_time.hour < 18)
+    evening = sum(s.duration for s in all_sessions if s.start_time.hour >= 18)
+    total_minutes = sum(s.duration for s in all_sessions)
+    return len(all_sessions), total_minutes, (morning, afternoon, evening)
+
+
+def engine_analytics(user):
+    analytics = compute_user_analytics(user, series_days=30)
+    return (
+        analytics['total_sessions'],
+        analytics['total_minutes'],
+        (analytics['morning_minutes'], analytics['afternoon_minutes'], analytics['evening_minutes']),
+    )
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks compute_user_analytics against the original multi-pass analytics'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                            help='Session counts to benchmark')
+        parser.add_argument('--skip-legacy-above', type=int, default=100000,
+                            help='Skip the legacy path for sizes larger than this')
+
+    def handle(self, *args, **options):
+        for size in options['sizes']:
+            try:
+                with transaction.atomic():
+                    user = self.seed(size)
+                    self.stdout.write(f'--- {size} sessions ---')
+                    results = [self.measure('engine', engine_analytics, user)]
+                    if size <= options['skip_legacy_above']:
+                        results.append(self.measure('legacy', legacy_analytics, user))
+                    if len({result for result in results}) > 1:
+                        self.stdout.write(self.style.ERROR('Engine and legacy results differ!'))
+                    raise Rollback
+            except Rollback:
+                pass
+
+    def seed(self, count):
+        user = User.objects.create_user(username=f'bench_analytics_{count}_{timezone.now().timestamp():.0f}')
+        courses = [Course(title=f'Bench course {i}', description='Benchmark data') for i in range(8)]
+        courses = Course.objects.bulk_create(courses)
+        now = timezone.now()
+        StudySession.objects.bulk_create(
+            (
+                StudySession(
+                    user=user,
+                    course=courses[i % 9] if i % 9 < 8 else None,
+                    start_time=now - timedelta(minutes=37 * i + 5),
+                    end_time=now - timedelta(minutes=37 * i - 20),
+                    duration=25 + i % 40,
+                    is_active=False,
+                )
+                for i in range(count)
+            ),
+            batch_size=2000,
+        )
+        # bulk_create skips end_session, so fill in the rollups the engine reads
+        DailyStudyRollup.rebuild(user=user)
+        return user
+
+    def measure(self, label, func, user):
+        reset_queries()
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            result = func(user)
+            elapsed = time.perf_counter() - started
+        self.stdout.write(f'{label:>7}: {len(ctx.captured_queries):6d} queries, {elapsed * 1000:9.1f} ms')
+        return result
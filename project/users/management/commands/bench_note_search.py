@@ -0,0 +1,107 @@
+"""
+Benchmark for study note search.
+
+Seeds notes spread over a handful of users, then times the original
+icontains filter against the full-text backend for a few queries on one
+user's notes, first page of 24 results. Everything is rolled back afterwards.
+"""
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from users.models import StudyNote
+from users.search import get_search_backend
+
+WORDS = (
+    'algebra calculus derivative integral matrix vector theorem proof lemma graph tree heap queue stack '
+    'protein enzyme cell membrane genome mitochondria photosynthesis osmosis neuron synapse hormone '
+    'revolution empire treaty parliament monarchy republic economy inflation market supply demand '
+    'poem sonnet metaphor narrative character plot theme essay grammar syntax semantics phonology '
+    'velocity acceleration momentum energy entropy quantum photon electron circuit voltage current'
+).split()
+
+
+SYLLABLES = 'ba be bi bo bu ka ke ki ko ku la le li lo lu ma me mi mo mu na ne ni no nu ra re ri ro ru ta te ti to tu'.split()
+
+
+def vocabulary(rng, size=20000):
+    """Filler words plus the subject words, with Zipf-like frequencies as in real text"""
+    words = list({''.join(rng.choices(SYLLABLES, k=rng.randint(2, 4))) for _ in range(size)})
+    for rank, word in enumerate(WORDS):
+        words.insert(100 + rank * 50, word)
+    cum_weights, total = [], 0.0
+    for rank in range(len(words)):
+        total += 1.0 / (rank + 1)
+        cum_weights.append(total)
+    return words, cum_weights
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks full-text note search against the icontains filter'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--notes', type=int, default=200000, help='Notes to seed')
+        parser.add_argument('--users', type=int, default=20, help='Users the notes are spread over')
+        parser.add_argument('--queries', nargs='+', default=['mitochondria', 'quantum entropy', 'sonnet metaphor proof'])
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                user = self.seed(options['notes'], options['users'])
+                backend = get_search_backend()
+                started = time.perf_counter()
+                backend.rebuild()
+                self.stdout.write(f'Indexed {options["notes"]} notes with {type(backend).__name__} '
+                                  f'in {time.perf_counter() - started:.1f}s')
+
+                notes = StudyNote.objects.filter(user=user)
+                for query in options['queries']:
+                    legacy = self.measure(lambda: self.legacy(notes, query))
+                    indexed = self.measure(lambda: self.indexed(backend, notes, query))
+                    self.stdout.write(
+                        f'{query!r:28} icontains {legacy[0] * 1000:8.1f} ms ({legacy[1]} hits)   '
+                        f'full-text {indexed[0] * 1000:8.1f} ms ({indexed[1]} hits)'
+                    )
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, count, user_count):
+        stamp = int(time.time())
+        users = [User.objects.create_user(username=f'bench_search_{stamp}_{i}') for i in range(user_count)]
+        rng = random.Random(42)
+        words, cum_weights = vocabulary(rng)
+        StudyNote.objects.bulk_create(
+            (
+                StudyNote(
+                    user=users[i % user_count],
+                    title=' '.join(rng.choices(WORDS, k=4)).title(),
+                    content=' '.join(rng.choices(words, cum_weights=cum_weights, k=rng.randint(40, 200))),
+                    tags=','.join(rng.choices(WORDS, k=3)),
+                )
+                for i in range(count)
+            ),
+            batch_size=5000,
+        )
+        return users[0]
+
+    def legacy(self, notes, query):
+        matches = notes.filter(Q(title__icontains=query) | Q(content__icontains=query) | Q(tags__icontains=query))
+        return matches.count(), list(matches[:24])
+
+    def indexed(self, backend, notes, query):
+        results = backend.search(notes, query)
+        return results.count(), results[0:24]
+
+    def measure(self, func):
+        started = time.perf_counter()
+        count, _ = func()
+        return time.perf_counter() - started, count
@@ -0,0 +1,107 @@
+"""
+Management command to benchmark the study session query layer.
+
+Seeds a throwaway user with a large session history inside a transaction,
+times the old fetch-everything-then-filter helpers against the
+StudySessionQuerySet methods, then rolls everything back.
+"""
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from users.models import StudySession
+
+
+class Rollback(Exception):
+    pass
+
+
+def legacy_dashboard(user, today_start, week_start):
+    """The pre-queryset dashboard path: load every row, filter in Python"""
+    all_sessions = list(StudySession.objects.filter(user=user))
+    active = [s for s in all_sessions if s.is_active]
+    recent = [s for s in all_sessions if not s.is_active][:10]
+    today = [s for s in StudySession.objects.filter(user=user, start_time__gte=today_start) if not s.is_active]
+    week = [s for s in StudySession.objects.filter(user=user, start_time__gte=week_start) if not s.is_active]
+    return (
+        active[0] if active else None,
+        [s.course for s in recent],
+        sum(s.duration for s in today),
+        sum(s.duration for s in week),
+    )
+
+
+def queryset_dashboard(user, today_start, week_start):
+    """The same numbers computed with StudySessionQuerySet"""
+    sessions = StudySession.objects.for_user(user)
+    completed = sessions.completed()
+    return (
+        sessions.active().order_by('-start_time').first(),
+        [s.course for s in completed.recent(10)],
+        completed.in_window(today_start).minutes_sum(),
+        completed.in_window(week_start).minutes_sum(),
+    )
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks session dashboard queries against a seeded heavy user'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sessions', type=int, default=50000, help='Number of sessions to seed')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per path')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                user = self.seed(options['sessions'])
+                self.run(user, options['repeat'])
+                raise Rollback
+        except Rollback:
+            self.stdout.write('Seed data rolled back.')
+
+    def seed(self, count):
+        user = User.objects.create_user(username=f'bench_{timezone.now().timestamp():.0f}')
+        now = timezone.now()
+        batch = [
+            StudySession(
+                user=user,
+                start_time=now - timedelta(minutes=45 * i),
+                end_time=now - timedelta(minutes=45 * i - 30),
+                duration=30,
+                is_active=False,
+            )
+            for i in range(1, count + 1)
+        ]
+        StudySession.objects.bulk_create(batch, batch_size=2000)
+        StudySession.objects.create(user=user)
+        self.stdout.write(f'Seeded {count} sessions for {user.username}')
+        return user
+
+    def run(self, user, repeat):
+        now = timezone.now()
+        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        week_start = today_start - timedelta(days=now.weekday())
+
+        results = {}
+        for label, func in (('legacy', legacy_dashboard), ('queryset', queryset_dashboard)):
+            timings = []
+            for _ in range(repeat):
+                with CaptureQueriesContext(connection) as ctx:
+                    started = time.perf_counter()
+                    result = func(user, today_start, week_start)
+                    timings.append(time.perf_counter() - started)
+            results[label] = result
+            self.stdout.write(
+                f'{label:>9}: {len(ctx.captured_queries):3d} queries, '
+                f'best {min(timings) * 1000:8.1f} ms, mean {sum(timings) / len(timings) * 1000:8.1f} ms'
+            )
+
+        if results['legacy'][2:] != results['queryset'][2:]:
+            self.stdout.write(self.style.ERROR('Totals differ between paths!'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Both paths agree on today/weekly minutes.'))
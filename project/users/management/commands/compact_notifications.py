@@ -0,0 +1,32 @@
+"""
+Management command applying the retention policy in users.retention: old
+read notifications become per-user monthly digests and old activity feed
+entries move to the archive table. Meant to run daily from cron; each batch
+commits on its own, so it can be stopped and rerun at any point.
+"""
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from users.retention import archive_activity, compact_notifications
+
+
+class Command(BaseCommand):
+    help = 'Compacts old read notifications into monthly digests and archives old user activity'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--notification-days', type=int, default=settings.NOTIFICATION_RETENTION_DAYS,
+                            help='Keep read notifications this many days')
+        parser.add_argument('--activity-days', type=int, default=settings.ACTIVITY_RETENTION_DAYS,
+                            help='Keep activity feed entries this many days')
+        parser.add_argument('--batch-size', type=int, default=settings.RETENTION_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        removed = compact_notifications(options['notification_days'], options['batch_size'])
+        moved = archive_activity(options['activity_days'], options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Compacted {removed} notification(s) and archived {moved} activity entr{"y" if moved == 1 else "ies"} '
+            f'in {time.perf_counter() - started:.2f}s.'
+        ))
@@ -0,0 +1,20 @@
+"""
+Management command to award any badges users already qualify for.
+
+Badges are normally awarded from model signals as metrics change; run this
+after adding a badge or changing a requirement to sweep existing users.
+"""
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from users.badges import evaluate_badges
+
+
+class Command(BaseCommand):
+    help = 'Evaluates badge rules for every user and awards newly earned badges'
+
+    def handle(self, *args, **options):
+        awarded = 0
+        for user_id in User.objects.values_list('id', flat=True).iterator():
+            awarded += len(evaluate_badges(user_id))
+        self.stdout.write(self.style.SUCCESS(f'Awarded {awarded} badge(s).'))
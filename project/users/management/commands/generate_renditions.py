@@ -0,0 +1,40 @@
+"""
+Management command to create the image renditions (users.images) of images
+uploaded before the pipeline existed, or after SPECS changed (with --force).
+New uploads get theirs in the background as they are saved.
+"""
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from users.images import generate_renditions, image_fields
+
+
+class Command(BaseCommand):
+    help = 'Generates missing or outdated resized renditions of profile, course and group images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--force', action='store_true', help='Regenerate renditions that already exist')
+
+    def handle(self, *args, **options):
+        jobs = {}
+        for model, field_name, specs in image_fields():
+            names = model._default_manager.exclude(**{f'{field_name}__isnull': True}).exclude(**{field_name: ''})
+            for name in names.values_list(field_name, flat=True).distinct():
+                jobs.setdefault(name, set()).update(specs)
+
+        def run(item):
+            try:
+                return generate_renditions(*item, force=options['force'])
+            except Exception as exc:
+                self.stderr.write(f'{item[0]}: {exc}')
+                return 0
+            finally:
+                close_old_connections()
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            written = sum(pool.map(run, jobs.items()))
+
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} rendition(s) for {len(jobs)} image(s).'))
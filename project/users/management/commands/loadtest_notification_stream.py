@@ -0,0 +1,136 @@
+"""
+Load test for the notification push stream.
+
+Opens many idle Server-Sent Events connections against the ASGI application
+inside this one process (i.e. one worker), reports memory per connection and
+event-loop responsiveness while they idle, then creates a notification for
+every test user and measures how long it takes to reach every client.
+Test users are deleted afterwards.
+"""
+import asyncio
+import resource
+import time
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.test import Client
+
+from users.notifications import notify_many
+
+
+class StreamClient:
+    """A minimal ASGI client holding one stream open until told to disconnect"""
+
+    def __init__(self, app, cookie):
+        self.app = app
+        self.cookie = cookie
+        self.connected = asyncio.Event()
+        self.notified = asyncio.Event()
+        self.disconnect = asyncio.Event()
+        self.notified_at = None
+        self.sent_request = False
+
+    async def receive(self):
+        if not self.sent_request:
+            self.sent_request = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await self.disconnect.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(self, message):
+        if message['type'] == 'http.response.start':
+            if message['status'] != 200:
+                raise RuntimeError(f'Stream returned HTTP {message["status"]}')
+        elif message['type'] == 'http.response.body':
+            body = message.get('body', b'')
+            if b'event: unread' in body:
+                self.connected.set()
+            if b'event: notification' in body and not self.notified.is_set():
+                self.notified_at = time.perf_counter()
+                self.notified.set()
+
+    async def run(self):
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': 'GET',
+            'scheme': 'http',
+            'path': '/api/notifications/stream/',
+            'raw_path': b'/api/notifications/stream/',
+            'root_path': '',
+            'query_string': b'',
+            'headers': [(b'host', b'testserver'), (b'cookie', self.cookie.encode())],
+            'client': ('127.0.0.1', 50000),
+            'server': ('testserver', 80),
+        }
+        await self.app(scope, self.receive, self.send)
+
+
+def rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class Command(BaseCommand):
+    help = 'Measures how many idle notification stream clients one ASGI worker can hold'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=1000, help='Concurrent stream connections')
+        parser.add_argument('--users', type=int, default=100, help='Distinct users the clients are spread over')
+        parser.add_argument('--idle', type=float, default=5.0, help='Seconds to idle before pushing')
+
+    def handle(self, *args, **options):
+        users, cookies = self.create_users(options['users'])
+        try:
+            asyncio.run(self.run(users, cookies, options))
+        finally:
+            User.objects.filter(id__in=[user.id for user in users]).delete()
+
+    def create_users(self, count):
+        users, cookies = [], []
+        for i in range(count):
+            user = User.objects.create_user(username=f'loadtest_stream_{i}_{time.time_ns()}')
+            client = Client()
+            client.force_login(user)
+            users.append(user)
+            cookies.append(f'sessionid={client.cookies["sessionid"].value}')
+        return users, cookies
+
+    async def run(self, users, cookies, options):
+        app = get_asgi_application()
+        rss_before = rss_mb()
+        clients = [StreamClient(app, cookies[i % len(cookies)]) for i in range(options['clients'])]
+        tasks = [asyncio.create_task(client.run()) for client in clients]
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client.connected.wait() for client in clients))
+        self.stdout.write(
+            f'{len(clients)} clients connected in {time.perf_counter() - started:.2f}s '
+            f'(max RSS {rss_mb():.0f} MB, ~{(rss_mb() - rss_before) * 1024 / len(clients):.1f} KB/client)'
+        )
+
+        # Event-loop lag while everything idles shows headroom for more clients
+        lags = []
+        idle_until = time.perf_counter() + options['idle']
+        while time.perf_counter() < idle_until:
+            tick = time.perf_counter()
+            await asyncio.sleep(0.1)
+            lags.append(time.perf_counter() - tick - 0.1)
+        self.stdout.write(f'Idle event-loop lag: max {max(lags) * 1000:.1f} ms, mean {sum(lags) / len(lags) * 1000:.1f} ms')
+
+        pushed = time.perf_counter()
+        await sync_to_async(notify_many)(users, 'system', 'Load test', 'Ping')
+        await asyncio.wait_for(asyncio.gather(*(client.notified.wait() for client in clients)), 60)
+        latencies = sorted(client.notified_at - pushed for client in clients)
+        self.stdout.write(
+            f'Push fan-out: p50 {latencies[len(latencies) // 2] * 1000:.0f} ms, '
+            f'p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.0f} ms, '
+            f'max {latencies[-1] * 1000:.0f} ms'
+        )
+
+        for client in clients:
+            client.disconnect.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.stdout.write(self.style.SUCCESS('All clients disconnected.'))
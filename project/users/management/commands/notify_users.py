@@ -0,0 +1,39 @@
+"""
+Management command to send one notification to every active user, or to the
+members of a study group (--group), e.g. for system announcements. Goes
+through users.notifications.notify_many(), which writes it in batches.
+"""
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from users.models import Notification, StudyGroup
+from users.notifications import notify_many
+
+
+class Command(BaseCommand):
+    help = 'Sends a notification to all active users or to the members of one study group'
+
+    def add_arguments(self, parser):
+        parser.add_argument('title')
+        parser.add_argument('--message', default='')
+        parser.add_argument('--link', default='')
+        parser.add_argument('--type', default='system', dest='notification_type',
+                            choices=[value for value, label in Notification.NOTIFICATION_TYPES])
+        parser.add_argument('--group', type=int, help='Only notify the members of this study group')
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(is_active=True).order_by('pk')
+        if options['group'] is not None:
+            if not StudyGroup.objects.filter(pk=options['group']).exists():
+                raise CommandError(f"Study group {options['group']} does not exist")
+            users = users.filter(group_memberships__group_id=options['group'])
+
+        started = time.perf_counter()
+        sent = notify_many(
+            users, options['notification_type'], options['title'], options['message'], options['link'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Sent {sent} notification(s) in {time.perf_counter() - started:.2f}s.'
+        ))
@@ -0,0 +1,45 @@
+"""
+Management command to clear out abandoned uploads.
+
+Removes upload sessions (and their partial files) untouched for longer than
+--max-age-hours, and blobs that no resource references any more, e.g. an
+upload whose resource form was never submitted. Run it daily from cron.
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from users.models import ResourceBlob, UploadSession
+from users.uploads import discard_session
+
+
+class Command(BaseCommand):
+    help = 'Deletes stale upload sessions and unreferenced resource blobs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-age-hours', type=int, default=24)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=options['max_age_hours'])
+
+        sessions = 0
+        for session in UploadSession.objects.filter(updated_at__lt=cutoff).iterator():
+            discard_session(session)
+            sessions += 1
+
+        blobs = 0
+        pending = UploadSession.objects.filter(blob__isnull=False).values('blob')
+        stale = ResourceBlob.objects.filter(ref_count=0, created_at__lt=cutoff).exclude(pk__in=pending)
+        for blob_id in stale.values_list('pk', flat=True):
+            with transaction.atomic():
+                # Re-check under the row lock in case an upload just took a reference
+                blob = ResourceBlob.objects.select_for_update().filter(pk=blob_id, ref_count=0).first()
+                if blob is None:
+                    continue
+                blob.delete()
+                transaction.on_commit(lambda blob=blob: blob.file.delete(save=False))
+            blobs += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Removed {sessions} upload session(s) and {blobs} blob(s).'))
@@ -0,0 +1,20 @@
+"""
+Management command to rebuild the study note full-text index.
+
+Saves and deletes keep the index current through users.signals; run this
+after bulk imports or other writes that bypass signals.
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from users.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the full-text search index for study notes'
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        with transaction.atomic():
+            count = backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} note(s) with {type(backend).__name__}.'))
@@ -0,0 +1,91 @@
+"""
+Management command to recompute each profile's study ledger (total_study_hours,
+study_streak and last_study_date) from its completed study sessions and report
+the profiles that had drifted, e.g. after sessions were edited or deleted in
+the admin or written by raw SQL.
+
+Profiles are handled BATCH_SIZE at a time, in user id order. Each batch locks
+its profile rows first, so a session ending meanwhile waits and then adds to
+the recomputed values instead of being overwritten; sessions are streamed in
+per batch rather than loaded for everyone at once.
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from users.models import Profile, StudySession, study_day
+
+BATCH_SIZE = 500
+HOURS_TOLERANCE = 1e-6
+
+
+def replay(sessions):
+    """(total hours, streak, last study day) that ending ``sessions`` one by one would have recorded"""
+    minutes = 0
+    days = set()
+    for session in sessions:
+        minutes += session.duration
+        days.add(study_day(session))
+    if not days:
+        return 0.0, 0, None
+    last_day = max(days)
+    streak = 1
+    while last_day - timedelta(days=streak) in days:
+        streak += 1
+    return minutes / 60.0, streak, last_day
+
+
+class Command(BaseCommand):
+    help = 'Recomputes study totals and streaks from session history and reports drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without fixing it')
+
+    def handle(self, *args, **options):
+        checked = drifted = 0
+        last_user_id = 0
+        while True:
+            with transaction.atomic():
+                profiles = list(
+                    Profile.objects.select_for_update().filter(user_id__gt=last_user_id).order_by('user_id')
+                    .select_related('user').only(
+                        'user_id', 'user__username', 'total_study_hours', 'study_streak', 'last_study_date',
+                    )[:options['batch_size']]
+                )
+                if not profiles:
+                    break
+                last_user_id = profiles[-1].user_id
+
+                sessions_by_user = {profile.user_id: [] for profile in profiles}
+                sessions = (
+                    StudySession.objects.completed().filter(user_id__in=sessions_by_user)
+                    .only('user_id', 'duration', 'start_time', 'end_time').order_by()
+                )
+                for session in sessions.iterator(chunk_size=2000):
+                    sessions_by_user[session.user_id].append(session)
+
+                changed = []
+                for profile in profiles:
+                    hours, streak, last_day = replay(sessions_by_user[profile.user_id])
+                    if (
+                        abs(profile.total_study_hours - hours) <= HOURS_TOLERANCE
+                        and (profile.study_streak, profile.last_study_date) == (streak, last_day)
+                    ):
+                        continue
+                    self.stdout.write(
+                        f'{profile.user.username}: {profile.total_study_hours:.2f}h -> {hours:.2f}h, '
+                        f'streak {profile.study_streak} -> {streak}, '
+                        f'last studied {profile.last_study_date} -> {last_day}'
+                    )
+                    profile.total_study_hours, profile.study_streak, profile.last_study_date = hours, streak, last_day
+                    changed.append(profile)
+
+                if changed and not options['dry_run']:
+                    Profile.objects.bulk_update(changed, ['total_study_hours', 'study_streak', 'last_study_date'])
+                checked += len(profiles)
+                drifted += len(changed)
+
+        verb = 'would be fixed' if options['dry_run'] else 'fixed'
+        self.stdout.write(self.style.SUCCESS(f'Checked {checked} profile(s); {drifted} had drifted and {verb}.'))
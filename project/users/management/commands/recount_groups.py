@@ -0,0 +1,41 @@
+"""
+Management command to rebuild the denormalized group and discussion counters:
+StudyGroup.member_count, Discussion.reply_count and Discussion.last_activity_at.
+
+They are kept in step as members join and leave and replies are posted or
+deleted, but can drift after raw SQL, fixtures loaded with signals off, or a
+membership moved to another group in the admin. Only rows that disagree
+with a fresh count are written.
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, Max, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from users.models import Discussion, DiscussionReply, GroupMembership, StudyGroup
+
+
+class Command(BaseCommand):
+    help = 'Recounts group members and discussion replies and last activity times'
+
+    def handle(self, *args, **options):
+        members = GroupMembership.objects.filter(group=OuterRef('pk')).order_by().values('group')
+        replies = DiscussionReply.objects.filter(discussion=OuterRef('pk')).order_by().values('discussion')
+        last_reply = Subquery(replies.annotate(last=Max('created_at')).values('last'))
+
+        with transaction.atomic():
+            groups = (
+                StudyGroup.objects.alias(actual=Coalesce(Subquery(members.annotate(n=Count('pk')).values('n')), 0))
+                .exclude(member_count=F('actual'))
+                .update(member_count=F('actual'))
+            )
+            discussions = (
+                Discussion.objects.alias(
+                    actual_replies=Coalesce(Subquery(replies.annotate(n=Count('pk')).values('n')), 0),
+                    actual_activity=Greatest('created_at', Coalesce(last_reply, 'created_at')),
+                )
+                .filter(~Q(reply_count=F('actual_replies')) | ~Q(last_activity_at=F('actual_activity')))
+                .update(reply_count=F('actual_replies'), last_activity_at=F('actual_activity'))
+            )
+
+        self.stdout.write(self.style.SUCCESS(f'Fixed {groups} group(s) and {discussions} discussion(s).'))
@@ -0,0 +1,36 @@
+"""
+Long-running reminder dispatcher for scheduled study events.
+
+Sends a 'goal' notification reminder_minutes_before each occurrence of every
+active StudySchedule, recurring series included. Run one instance per
+deployment, e.g. as a separate worker process next to the web server.
+Errors such as a database restart are logged and retried with a backoff
+(users.reminders) rather than stopping the process.
+"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from users.reminders import ReminderScheduler
+
+
+class Command(BaseCommand):
+    help = 'Dispatches study schedule reminders as they fall due'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--horizon-hours', type=float, default=6,
+                            help='How far ahead reminders are held in memory')
+        parser.add_argument('--poll-seconds', type=float, default=30,
+                            help='How often to look for created or edited schedules')
+
+    def handle(self, *args, **options):
+        scheduler = ReminderScheduler(
+            horizon=timedelta(hours=options['horizon_hours']),
+            poll_interval=timedelta(seconds=options['poll_seconds']),
+        )
+        self.stdout.write('Dispatching reminders (Ctrl+C to stop)...')
+        try:
+            scheduler.run()
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f'Sent {scheduler.dispatched} reminder(s).'))
@@ -0,0 +1,33 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.utils import timezone
+
+from .periods import auser_timezone, user_timezone
+
+
+class UserTimezoneMiddleware:
+    """Activate the signed-in user's Profile.time_zone (users.periods) for the request.
+
+    Async-capable, so the streaming notification views are not pushed onto a thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not request.user.is_authenticated:
+            return self.get_response(request)
+        with timezone.override(user_timezone(request.user.id)):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        user = await request.auser()
+        if not user.is_authenticated:
+            return await self.get_response(request)
+        with timezone.override(await auser_timezone(user.id)):
+            return await self.get_response(request)
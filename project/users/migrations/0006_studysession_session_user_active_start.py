@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:52
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0001_initial'),
+        ('users', '0005_alter_badge_id_alter_discussion_id_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='studysession',
+            index=models.Index(fields=['user', 'is_active', 'start_time'], name='session_user_active_start'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0001_initial'),
+        ('users', '0006_studysession_session_user_active_start'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyStudyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('minutes', models.PositiveIntegerField(default=0)),
+                ('session_count', models.PositiveIntegerField(default=0)),
+                ('morning_minutes', models.PositiveIntegerField(default=0, help_text='Minutes from sessions started before 12:00')),
+                ('afternoon_minutes', models.PositiveIntegerField(default=0, help_text='Minutes from sessions started 12:00-18:00')),
+                ('evening_minutes', models.PositiveIntegerField(default=0, help_text='Minutes from sessions started after 18:00')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('course', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='courses.course')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Daily Study Rollup',
+                'verbose_name_plural': 'Daily Study Rollups',
+                'ordering': ['-date'],
+                'constraints': [models.UniqueConstraint(fields=('user', 'date', 'course'), name='rollup_user_date_course'), models.UniqueConstraint(condition=models.Q(('course__isnull', True)), fields=('user', 'date'), name='rollup_user_date_no_course')],
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:59
+
+from django.db import migrations, models
+
+
+# Rules that used to be matched on badge names in check_badge_eligibility:
+# name fragment -> (metric, threshold)
+LEGACY_BADGE_RULES = {
+    'First Steps': ('study_hours', 1),
+    '10 Hour Hero': ('study_hours', 10),
+    'Century Scholar': ('study_hours', 100),
+    '7 Day Streak': ('study_streak', 7),
+    '30 Day Champion': ('study_streak', 30),
+    'Team Player': ('groups_joined', 1),
+    'Discussion Starter': ('discussions_started', 10),
+    'Helpful Peer': ('reviews_given', 25),
+    'Note Taker': ('notes_created', 10),
+    'Resource Master': ('resources_shared', 20),
+    'Course Enthusiast': ('lessons_completed', 5),
+    'Master Student': ('badges_earned', 10),
+}
+
+
+def set_badge_metrics(apps, schema_editor):
+    Badge = apps.get_model('users', 'Badge')
+    for badge in Badge.objects.all():
+        for fragment, (metric, threshold) in LEGACY_BADGE_RULES.items():
+            if fragment in badge.name:
+                badge.metric = metric
+                badge.requirement = threshold
+                badge.save(update_fields=['metric', 'requirement'])
+                break
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_dailystudyrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='badge',
+            name='metric',
+            field=models.CharField(blank=True, choices=[('study_hours', 'Total study hours'), ('study_streak', 'Study streak (days)'), ('groups_joined', 'Study groups joined'), ('discussions_started', 'Discussions started'), ('reviews_given', 'Peer reviews given'), ('notes_created', 'Notes created'), ('resources_shared', 'Resources shared'), ('lessons_completed', 'Lessons completed'), ('badges_earned', 'Badges earned')], help_text='What the requirement is measured against', max_length=30),
+        ),
+        migrations.RunPython(set_badge_metrics, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:05
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0008_badge_metric'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduleOccurrenceException',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_start', models.DateTimeField(help_text='Start the occurrence has in the series')),
+                ('is_cancelled', models.BooleanField(default=False)),
+                ('title', models.CharField(blank=True, max_length=200)),
+                ('description', models.TextField(blank=True)),
+                ('scheduled_start', models.DateTimeField(blank=True, null=True)),
+                ('scheduled_end', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Schedule Occurrence Exception',
+                'verbose_name_plural': 'Schedule Occurrence Exceptions',
+            },
+        ),
+        migrations.AddField(
+            model_name='studyschedule',
+            name='recurrence_until',
+            field=models.DateTimeField(blank=True, help_text='Last possible occurrence start; empty repeats forever', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='studyschedule',
+            index=models.Index(fields=['user', 'is_active', 'scheduled_start'], name='schedule_user_active_start'),
+        ),
+        migrations.AddField(
+            model_name='scheduleoccurrenceexception',
+            name='schedule',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='exceptions', to='users.studyschedule'),
+        ),
+        migrations.AddConstraint(
+            model_name='scheduleoccurrenceexception',
+            constraint=models.UniqueConstraint(fields=('schedule', 'original_start'), name='schedule_exception_unique_start'),
+        ),
+    ]
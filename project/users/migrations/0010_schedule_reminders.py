@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:31
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0009_schedule_recurrence_window'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studyschedule',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='studyschedule',
+            index=models.Index(fields=['is_active', 'scheduled_start'], name='schedule_active_start'),
+        ),
+        migrations.AddIndex(
+            model_name='studyschedule',
+            index=models.Index(fields=['updated_at'], name='schedule_updated_at'),
+        ),
+    ]
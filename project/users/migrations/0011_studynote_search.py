@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:19
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+POSTGRES_VECTOR = (
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(tags, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(content, '')), 'C')"
+)
+
+
+class AddPostgresIndex(migrations.AddIndex):
+    """AddIndex for a PostgreSQL-only index type: the model state gains it everywhere, the database only there"""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+def create_search_index(apps, schema_editor):
+    """Build the vendor's full-text index (see users.search) over existing notes"""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(f'UPDATE users_studynote SET search_vector = {POSTGRES_VECTOR}')
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS users_studynote_fts "
+            "USING fts5(title, tags, content, tokenize='porter unicode61')"
+        )
+        schema_editor.execute(
+            'INSERT INTO users_studynote_fts (rowid, title, tags, content) '
+            'SELECT id, title, tags, content FROM users_studynote'
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS users_studynote_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0010_schedule_reminders'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studynote',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        AddPostgresIndex(
+            model_name='studynote',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='studynote_search_vector'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
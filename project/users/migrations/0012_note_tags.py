@@ -0,0 +1,87 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:49
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def split_tags(tags):
+    # Same rules as users.models.normalize_tags at the time of this migration
+    names = (' '.join(tag.split()).lower() for tag in (tags or '').split(','))
+    return list(dict.fromkeys(name[:50] for name in names if name))
+
+
+def copy_csv_tags(apps, schema_editor):
+    """Create Tag and NoteTag rows from every note's comma-separated tags"""
+    StudyNote = apps.get_model('users', 'StudyNote')
+    Tag = apps.get_model('users', 'Tag')
+    NoteTag = apps.get_model('users', 'NoteTag')
+
+    names_by_note = {}
+    for note_id, user_id, tags in StudyNote.objects.exclude(tags='').values_list('id', 'user_id', 'tags').iterator():
+        names = split_tags(tags)
+        if names:
+            names_by_note[note_id] = (user_id, names)
+
+    pairs = {(user_id, name) for user_id, names in names_by_note.values() for name in names}
+    Tag.objects.bulk_create(
+        [Tag(user_id=user_id, name=name) for user_id, name in pairs], ignore_conflicts=True, batch_size=1000,
+    )
+    tag_ids = {(user_id, name): tag_id for tag_id, user_id, name in Tag.objects.values_list('id', 'user_id', 'name')}
+    NoteTag.objects.bulk_create(
+        [
+            NoteTag(note_id=note_id, tag_id=tag_ids[(user_id, name)])
+            for note_id, (user_id, names) in names_by_note.items()
+            for name in names
+        ],
+        ignore_conflicts=True,
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0011_studynote_search'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tags', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Tag',
+                'verbose_name_plural': 'Tags',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='NoteTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('note', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='note_tags', to='users.studynote')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='note_tags', to='users.tag')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='studynote',
+            name='tag_objects',
+            field=models.ManyToManyField(blank=True, related_name='notes', through='users.NoteTag', to='users.tag'),
+        ),
+        migrations.AddConstraint(
+            model_name='tag',
+            constraint=models.UniqueConstraint(fields=('user', 'name'), name='tag_user_name'),
+        ),
+        migrations.AddConstraint(
+            model_name='notetag',
+            constraint=models.UniqueConstraint(fields=('tag', 'note'), name='notetag_tag_note'),
+        ),
+        migrations.RunPython(copy_csv_tags, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:54
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0001_initial'),
+        ('users', '0012_note_tags'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='discussion',
+            index=models.Index(fields=['group', 'is_pinned', 'updated_at', 'id'], name='discussion_group_pinned'),
+        ),
+        migrations.AddIndex(
+            model_name='sharedresource',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='resource_user_created'),
+        ),
+        migrations.AddIndex(
+            model_name='sharedresource',
+            index=models.Index(fields=['is_public', 'created_at', 'id'], name='resource_public_created'),
+        ),
+        migrations.AddIndex(
+            model_name='studygroup',
+            index=models.Index(fields=['is_private', 'created_at', 'id'], name='group_private_created'),
+        ),
+        migrations.AddIndex(
+            model_name='studynote',
+            index=models.Index(fields=['user', 'is_pinned', 'updated_at', 'id'], name='note_user_pinned_updated'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0001_initial'),
+        ('users', '0013_cursor_pagination_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='sharedresource',
+            name='resource_public_created',
+        ),
+        migrations.AddIndex(
+            model_name='sharedresource',
+            index=models.Index(condition=models.Q(('is_public', True)), fields=['created_at', 'id'], name='resource_public_created'),
+        ),
+        migrations.AddIndex(
+            model_name='sharedresource',
+            index=models.Index(condition=models.Q(('is_public', True)), fields=['resource_type', 'created_at', 'id'], name='resource_public_type'),
+        ),
+        migrations.AddIndex(
+            model_name='sharedresource',
+            index=models.Index(condition=models.Q(('is_public', True)), fields=['course', 'created_at', 'id'], name='resource_public_course'),
+        ),
+        migrations.AddIndex(
+            model_name='sharedresource',
+            index=models.Index(condition=models.Q(('is_public', True)), fields=['views', 'id'], name='resource_public_views'),
+        ),
+        migrations.AddIndex(
+            model_name='sharedresource',
+            index=models.Index(condition=models.Q(('is_public', True)), fields=['downloads', 'id'], name='resource_public_downloads'),
+        ),
+    ]
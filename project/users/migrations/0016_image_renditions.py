@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:03
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0015_chunked_uploads'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageRendition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(help_text='Storage name of the original image', max_length=255)),
+                ('spec', models.CharField(max_length=20)),
+                ('format', models.CharField(max_length=4)),
+                ('file', models.ImageField(max_length=255, upload_to='renditions/')),
+                ('width', models.PositiveIntegerField(default=0)),
+                ('height', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Image Rendition',
+                'verbose_name_plural': 'Image Renditions',
+                'constraints': [models.UniqueConstraint(fields=('source', 'spec', 'format'), name='rendition_source_spec_format')],
+            },
+        ),
+    ]
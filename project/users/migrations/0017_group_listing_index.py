@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:06
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0001_initial'),
+        ('users', '0016_image_renditions'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='studygroup',
+            name='group_private_created',
+        ),
+        migrations.AddIndex(
+            model_name='studygroup',
+            index=models.Index(condition=models.Q(('is_private', False)), fields=['created_at', 'id'], name='group_public_created'),
+        ),
+    ]
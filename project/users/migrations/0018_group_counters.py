@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:09
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+
+def count_existing(apps, schema_editor):
+    """Fill the new counter columns from the rows they count"""
+    StudyGroup = apps.get_model('users', 'StudyGroup')
+    GroupMembership = apps.get_model('users', 'GroupMembership')
+    Discussion = apps.get_model('users', 'Discussion')
+    DiscussionReply = apps.get_model('users', 'DiscussionReply')
+
+    members = GroupMembership.objects.filter(group=OuterRef('pk')).order_by().values('group')
+    StudyGroup.objects.update(member_count=Coalesce(Subquery(members.annotate(n=Count('pk')).values('n')), 0))
+
+    replies = DiscussionReply.objects.filter(discussion=OuterRef('pk')).order_by().values('discussion')
+    Discussion.objects.update(
+        reply_count=Coalesce(Subquery(replies.annotate(n=Count('pk')).values('n')), 0),
+        last_activity_at=Greatest(
+            'created_at', Coalesce(Subquery(replies.annotate(last=Max('created_at')).values('last')), 'created_at'),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0001_initial'),
+        ('users', '0017_group_listing_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='discussion',
+            name='last_activity_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddField(
+            model_name='discussion',
+            name='reply_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='studygroup',
+            name='member_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_existing, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='discussion',
+            index=models.Index(fields=['group', 'is_pinned', 'last_activity_at', 'id'], name='discussion_group_activity'),
+        ),
+        migrations.AddIndex(
+            model_name='studygroup',
+            index=models.Index(condition=models.Q(('is_private', False)), fields=['member_count', 'created_at', 'id'], name='group_public_popular'),
+        ),
+    ]
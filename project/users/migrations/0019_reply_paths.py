@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:12
+
+from django.conf import settings
+from django.db import migrations, models
+
+# users.models.REPLY_PATH_STEP and MAX_REPLY_DEPTH at the time of this migration
+PATH_STEP = 7
+MAX_DEPTH = 32
+
+
+def path_step(pk):
+    digits = '0123456789abcdefghijklmnopqrstuvwxyz'
+    step = ''
+    while pk:
+        pk, digit = divmod(pk, 36)
+        step = digits[digit] + step
+    return step.rjust(PATH_STEP, '0')
+
+
+def build_paths(apps, schema_editor):
+    """Give every existing reply its path and depth, top-level replies first"""
+    DiscussionReply = apps.get_model('users', 'DiscussionReply')
+    children = {}
+    for pk, parent_id in DiscussionReply.objects.values_list('id', 'parent_id').iterator():
+        children.setdefault(parent_id, []).append(pk)
+
+    changed = []
+    # (reply id, path of the parent it hangs from, id of that parent)
+    pending = [(pk, '', None) for pk in children.get(None, [])]
+    while pending:
+        pk, prefix, parent_id = pending.pop()
+        if len(prefix) // PATH_STEP >= MAX_DEPTH:
+            prefix = prefix[:-PATH_STEP]   # too deep: hang it from the grandparent instead
+            parent_id = int(prefix[-PATH_STEP:], 36) if prefix else None
+        path = prefix + path_step(pk)
+        changed.append(DiscussionReply(id=pk, path=path, depth=len(path) // PATH_STEP - 1, parent_id=parent_id))
+        pending.extend((child, path, pk) for child in children.get(pk, []))
+    DiscussionReply.objects.bulk_update(changed, ['path', 'depth', 'parent'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0018_group_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='discussionreply',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='discussionreply',
+            name='path',
+            field=models.CharField(default='', editable=False, max_length=224),
+        ),
+        migrations.RunPython(build_paths, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='discussionreply',
+            index=models.Index(fields=['discussion', 'path'], name='reply_discussion_path'),
+        ),
+        migrations.AddIndex(
+            model_name='discussionreply',
+            index=models.Index(fields=['discussion', 'depth', 'path'], name='reply_discussion_depth'),
+        ),
+    ]
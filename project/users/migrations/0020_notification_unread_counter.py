@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:18
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_unread(apps, schema_editor):
+    """Fill the new counter from the unread notifications it counts"""
+    Profile = apps.get_model('users', 'Profile')
+    Notification = apps.get_model('users', 'Notification')
+
+    unread = Notification.objects.filter(user=OuterRef('user'), is_read=False).order_by().values('user')
+    Profile.objects.update(unread_notifications=Coalesce(Subquery(unread.annotate(n=Count('pk')).values('n')), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0019_reply_paths'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='unread_notifications',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_unread, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:21
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0020_notification_unread_counter'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationDigest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='First day of the month')),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('counts', models.JSONField(default=dict, help_text='Notifications per notification_type')),
+            ],
+            options={
+                'verbose_name': 'Notification Digest',
+                'verbose_name_plural': 'Notification Digests',
+                'ordering': ['-month'],
+            },
+        ),
+        migrations.CreateModel(
+            name='UserActivityArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('activity_type', models.CharField(choices=[('note_created', 'Created a Note'), ('resource_shared', 'Shared a Resource'), ('course_enrolled', 'Enrolled in Course'), ('group_joined', 'Joined Study Group'), ('discussion_posted', 'Posted Discussion'), ('goal_achieved', 'Achieved Study Goal'), ('badge_earned', 'Earned Badge')], max_length=30)),
+                ('description', models.CharField(max_length=300)),
+                ('link', models.CharField(blank=True, max_length=500)),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Archived User Activity',
+                'verbose_name_plural': 'Archived User Activities',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', '-created_at'], name='notification_user_created'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'is_read'], name='notification_user_read'),
+        ),
+        migrations.AddIndex(
+            model_name='useractivity',
+            index=models.Index(fields=['user', '-created_at'], name='activity_user_created'),
+        ),
+        migrations.AddField(
+            model_name='notificationdigest',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notification_digests', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='useractivityarchive',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_activities', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='notificationdigest',
+            constraint=models.UniqueConstraint(fields=('user', 'month'), name='unique_notification_digest_month'),
+        ),
+        migrations.AddIndex(
+            model_name='useractivityarchive',
+            index=models.Index(fields=['user', '-created_at'], name='activity_archive_user_created'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:24
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0021_retention'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='groupmembership',
+            name='feed_cursor',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.CreateModel(
+            name='GroupFeedEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField()),
+                ('activity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='users.useractivity')),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to='users.studygroup')),
+            ],
+            options={
+                'verbose_name': 'Group Feed Entry',
+                'verbose_name_plural': 'Group Feed Entries',
+            },
+        ),
+        migrations.CreateModel(
+            name='FeedEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField()),
+                ('activity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='users.useractivity')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Feed Entry',
+                'verbose_name_plural': 'Feed Entries',
+                'indexes': [models.Index(fields=['user', '-created_at', '-id'], name='feed_user_created')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'activity'), name='unique_feed_entry')],
+            },
+        ),
+    ]
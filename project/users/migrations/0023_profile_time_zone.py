@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0022_activity_feed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='time_zone',
+            field=models.CharField(default='UTC', help_text='e.g. Europe/Berlin', max_length=64),
+        ),
+    ]
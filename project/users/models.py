@@ -1,7 +1,12 @@
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.utils import timezone
 from datetime import timedelta
+import uuid
+
+from .periods import day_start, get_zone, period_start, user_timezone
 
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -13,44 +18,124 @@ class Profile(models.Model):
     location = models.CharField(max_length=100, blank=True)
     date_of_birth = models.DateField(null=True, blank=True)
     
-    # Study tracking
+    # Study tracking: a ledger over completed sessions, only ever changed by the UPDATE in
+    # Profile.record_study and by the reconcile_study_ledger command
     study_streak = models.PositiveIntegerField(default=0, help_text="Current study streak in days")
     total_study_hours = models.FloatField(default=0.0)
     last_study_date = models.DateField(null=True, blank=True, help_text="Last date user studied")
     
+    # IANA zone name; study days, streaks and goal periods run from midnight here (users.periods)
+    time_zone = models.CharField(max_length=64, default='UTC', help_text="e.g. Europe/Berlin")
+    
+    # Unread notifications, for the bell; only ever changed by UPDATEs in users.notifications
+    unread_notifications = models.PositiveIntegerField(default=0, editable=False)
+    
     # Metadata
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
+    
+    # Counters other code adjusts in place, which a full save of a stale copy must not write back
+    COUNTER_FIELDS = {'unread_notifications', 'study_streak', 'total_study_hours', 'last_study_date'}
 
     def __str__(self):
         return f'{self.user.username} Profile'
     
-    def update_study_streak(self):
-        """Update study streak based on last study date"""
-        today = timezone.now().date()
-        
-        if self.last_study_date is None:
-            self.study_streak = 1
-            self.last_study_date = today
-        elif self.last_study_date == today:
-            # Already studied today, no change
-            pass
-        elif self.last_study_date == today - timedelta(days=1):
-            # Studied yesterday, increment streak
-            self.study_streak += 1
-            self.last_study_date = today
-        else:
-            # Streak broken
-            self.study_streak = 1
-            self.last_study_date = today
-        
-        self.save()
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # The zone as loaded, so saving can tell whether it moved (users.signals rebuilds the rollups then)
+        instance.loaded_time_zone = instance.__dict__.get('time_zone')
+        return instance
+    
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+    
+    @classmethod
+    def record_study(cls, user_id, minutes, day):
+        """Add a finished session of ``minutes`` on ``day`` to the user's totals and streak.
+
+        One UPDATE computes the new values from the row's current ones, so sessions
+        ending at the same moment cannot overwrite each other's additions.
+        """
+        F, Value, When = models.F, models.Value, models.When
+        cls.objects.filter(user_id=user_id).update(
+            total_study_hours=F('total_study_hours') + minutes / 60.0,
+            study_streak=models.Case(
+                When(last_study_date__gte=day, then=F('study_streak')),
+                When(last_study_date=day - timedelta(days=1), then=F('study_streak') + 1),
+                default=Value(1),
+            ),
+            last_study_date=models.Case(
+                When(last_study_date__gte=day, then=F('last_study_date')),
+                default=Value(day),
+            ),
+            updated_at=timezone.now(),
+        )
     
     class Meta:
         verbose_name = 'User Profile'
         verbose_name_plural = 'User Profiles'
 
 
+class ImageRendition(models.Model):
+    """A resized copy of an uploaded image (see users.images), keyed by the original's storage name"""
+    source = models.CharField(max_length=255, help_text="Storage name of the original image")
+    spec = models.CharField(max_length=20)
+    format = models.CharField(max_length=4)
+    file = models.ImageField(upload_to='renditions/', max_length=255)
+    width = models.PositiveIntegerField(default=0)
+    height = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    def __str__(self):
+        return f"{self.source} [{self.spec}.{self.format}]"
+    
+    class Meta:
+        verbose_name = 'Image Rendition'
+        verbose_name_plural = 'Image Renditions'
+        constraints = [
+            models.UniqueConstraint(fields=['source', 'spec', 'format'], name='rendition_source_spec_format'),
+        ]
+
+
+class StudySessionQuerySet(models.QuerySet):
+    """Database-side filters and aggregates for study sessions"""
+
+    def for_user(self, user):
+        return self.filter(user=user)
+
+    def completed(self):
+        """Sessions that have been ended"""
+        return self.filter(is_active=False)
+
+    def active(self):
+        """Sessions that are still running"""
+        return self.filter(is_active=True)
+
+    def in_window(self, start=None, end=None):
+        """Sessions started in [start, end); either bound may be omitted"""
+        qs = self
+        if start is not None:
+            qs = qs.filter(start_time__gte=start)
+        if end is not None:
+            qs = qs.filter(start_time__lt=end)
+        return qs
+
+    def recent(self, limit=None):
+        """Newest first, with the course joined for display"""
+        qs = self.select_related('course').order_by('-start_time')
+        return qs[:limit] if limit else qs
+
+    def minutes_sum(self):
+        """Total duration in minutes, computed with a single SUM"""
+        return self.aggregate(total=models.Sum('duration'))['total'] or 0
+
+
 class StudySession(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='study_sessions')
     course = models.ForeignKey('courses.Course', on_delete=models.SET_NULL, null=True, blank=True, related_name='study_sessions')
@@ -63,33 +148,219 @@ class StudySession(models.Model):
     is_active = models.BooleanField(default=True, help_text="Whether session is currently active")
     
     created_at = models.DateTimeField(default=timezone.now)
+
+    objects = StudySessionQuerySet.as_manager()
     
     def __str__(self):
         course_name = self.course.title if self.course else "General Study"
         return f"{self.user.username} - {course_name} ({self.duration}min)"
     
     def end_session(self):
-        """End the study session and calculate duration"""
-        if self.is_active:
+        """End the study session and add it to the user's totals, streak and daily rollup.
+        
+        Returns False when the session had already been ended, e.g. from another tab
+        at the same moment, so that it is only ever counted once.
+        """
+        if not self.is_active:
+            return False
+        
+        with transaction.atomic():
+            # Claim the session: of two concurrent calls only one UPDATE still matches
+            if not StudySession.objects.filter(pk=self.pk, is_active=True).update(is_active=False):
+                self.refresh_from_db()
+                return False
             self.end_time = timezone.now()
             self.is_active = False
+            self.duration = int((self.end_time - self.start_time).total_seconds() / 60)
+            self.save(update_fields=['end_time', 'duration', 'notes'])
             
-            # Calculate duration in minutes
-            duration_seconds = (self.end_time - self.start_time).total_seconds()
-            self.duration = int(duration_seconds / 60)
-            
-            # Update user's total study hours
-            profile = self.user.profile
-            profile.total_study_hours += self.duration / 60.0
-            profile.update_study_streak()
-            profile.save()
-            
-            self.save()
+            Profile.record_study(self.user_id, self.duration, study_day(self))
+            DailyStudyRollup.add_session(self)
+        
+        # The profile UPDATE skips post_save, so ask for the badges its receiver would
+        from .badges import evaluate_badges
+        
+        transaction.on_commit(lambda: evaluate_badges(self.user_id, ('study_hours', 'study_streak')))
+        return True
     
     class Meta:
         verbose_name = 'Study Session'
         verbose_name_plural = 'Study Sessions'
         ordering = ['-start_time']
+        indexes = [
+            models.Index(fields=['user', 'is_active', 'start_time'], name='session_user_active_start'),
+        ]
+
+
+def study_day(session):
+    """The day, in its owner's timezone, a finished session counts toward the study streak"""
+    return timezone.localdate(session.end_time or session.start_time, user_timezone(session.user_id))
+
+
+def time_of_day_field(start_time, tz=None):
+    """Return the rollup bucket field for a session start time (in ``tz``, or the current zone)"""
+    hour = timezone.localtime(start_time, tz).hour
+    if hour < 12:
+        return 'morning_minutes'
+    if hour < 18:
+        return 'afternoon_minutes'
+    return 'evening_minutes'
+
+
+class DailyStudyRollupQuerySet(models.QuerySet):
+    """Readers over the pre-aggregated daily study totals"""
+
+    def in_range(self, start_date=None, end_date=None):
+        """Rollups dated in [start_date, end_date]; either bound may be omitted"""
+        qs = self
+        if start_date is not None:
+            qs = qs.filter(date__gte=start_date)
+        if end_date is not None:
+            qs = qs.filter(date__lte=end_date)
+        return qs
+
+    def minutes_sum(self):
+        return self.aggregate(total=models.Sum('minutes'))['total'] or 0
+
+    def totals(self):
+        """Minutes, session count and time-of-day split in one aggregate"""
+        totals = self.aggregate(
+            minutes=models.Sum('minutes'),
+            session_count=models.Sum('session_count'),
+            morning_minutes=models.Sum('morning_minutes'),
+            afternoon_minutes=models.Sum('afternoon_minutes'),
+            evening_minutes=models.Sum('evening_minutes'),
+        )
+        return {key: value or 0 for key, value in totals.items()}
+
+
+class DailyStudyRollup(models.Model):
+    """Completed study time per user, day and course.
+
+    Kept up to date incrementally by StudySession.end_session and the admin,
+    and rebuilt from session history by the backfill_study_rollups command.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_rollups')
+    date = models.DateField()
+    course = models.ForeignKey('courses.Course', on_delete=models.CASCADE, null=True, blank=True, related_name='daily_rollups')
+
+    minutes = models.PositiveIntegerField(default=0)
+    session_count = models.PositiveIntegerField(default=0)
+    morning_minutes = models.PositiveIntegerField(default=0, help_text="Minutes from sessions started before 12:00")
+    afternoon_minutes = models.PositiveIntegerField(default=0, help_text="Minutes from sessions started 12:00-18:00")
+    evening_minutes = models.PositiveIntegerField(default=0, help_text="Minutes from sessions started after 18:00")
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = DailyStudyRollupQuerySet.as_manager()
+
+    def __str__(self):
+        course_name = self.course.title if self.course else "General Study"
+        return f"{self.user.username} - {self.date} - {course_name} ({self.minutes}min)"
+
+    @classmethod
+    def add_session(cls, session):
+        """Fold one completed session into its day's rollup with F() updates"""
+        tz = user_timezone(session.user_id)
+        rollup, _ = cls.objects.get_or_create(
+            user_id=session.user_id,
+            date=timezone.localdate(session.start_time, tz),
+            course_id=session.course_id,
+        )
+        bucket = time_of_day_field(session.start_time, tz)
+        cls.objects.filter(pk=rollup.pk).update(
+            minutes=models.F('minutes') + session.duration,
+            session_count=models.F('session_count') + 1,
+            **{bucket: models.F(bucket) + session.duration},
+        )
+
+    @classmethod
+    def rebuild(cls, sessions=None, user=None, dates=None):
+        """Recompute rollups from completed sessions in SQL.
+
+        Restrict to one user and/or a set of dates to repair just those days.
+        Days and time-of-day buckets are in each user's timezone: the sessions
+        are aggregated once per zone their users live in, truncated by the
+        database. Returns the number of rollup rows written.
+        """
+        from django.db.models.functions import ExtractHour, TruncDate
+
+        if sessions is None:
+            sessions = StudySession.objects.all()
+        sessions = sessions.completed()
+        rollups = cls.objects.all()
+        profiles = Profile.objects.all()
+        if user is not None:
+            sessions = sessions.filter(user=user)
+            rollups = rollups.filter(user=user)
+            profiles = profiles.filter(user=user)
+        if dates is not None:
+            # Local days are within a day of UTC ones, which bounds the start_time range
+            utc = get_zone('UTC')
+            sessions = sessions.filter(
+                start_time__gte=day_start(min(dates) - timedelta(days=1), utc),
+                start_time__lt=day_start(max(dates) + timedelta(days=2), utc),
+            )
+            rollups = rollups.filter(date__in=dates)
+
+        def bucket(condition):
+            return models.Sum(models.Case(
+                models.When(condition, then='duration'),
+                default=0,
+                output_field=models.IntegerField(),
+            ))
+
+        def rows_in(zone_name):
+            tz = get_zone(zone_name)
+            rows = (
+                sessions.filter(user__profile__time_zone=zone_name).order_by()
+                .annotate(day=TruncDate('start_time', tzinfo=tz), hour=ExtractHour('start_time', tzinfo=tz))
+            )
+            if dates is not None:
+                rows = rows.filter(day__in=dates)
+            return rows.values('user_id', 'course_id', 'day').annotate(
+                total=models.Sum('duration'),
+                count=models.Count('id'),
+                morning=bucket(models.Q(hour__lt=12)),
+                afternoon=bucket(models.Q(hour__gte=12, hour__lt=18)),
+                evening=bucket(models.Q(hour__gte=18)),
+            )
+
+        zone_names = profiles.order_by().values_list('time_zone', flat=True).distinct()
+
+        with transaction.atomic():
+            rollups.delete()
+            created = cls.objects.bulk_create(
+                (
+                    cls(
+                        user_id=row['user_id'],
+                        course_id=row['course_id'],
+                        date=row['day'],
+                        minutes=row['total'] or 0,
+                        session_count=row['count'],
+                        morning_minutes=row['morning'] or 0,
+                        afternoon_minutes=row['afternoon'] or 0,
+                        evening_minutes=row['evening'] or 0,
+                    )
+                    for zone_name in zone_names
+                    for row in rows_in(zone_name).iterator()
+                ),
+                batch_size=1000,
+            )
+        return len(created)
+
+    class Meta:
+        verbose_name = 'Daily Study Rollup'
+        verbose_name_plural = 'Daily Study Rollups'
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'date', 'course'], name='rollup_user_date_course'),
+            models.UniqueConstraint(
+                fields=['user', 'date'],
+                condition=models.Q(course__isnull=True),
+                name='rollup_user_date_no_course',
+            ),
+        ]
 
 
 class StudyGoal(models.Model):
@@ -109,35 +380,25 @@ class StudyGoal(models.Model):
     def __str__(self):
         return f"{self.user.username} - {self.get_goal_type_display()} Goal ({self.target_minutes}min)"
     
+    GOAL_PERIODS = {'daily': 'day', 'weekly': 'week', 'monthly': 'month'}
+    
     def get_progress(self):
         """Calculate progress towards goal"""
-        from datetime import datetime, timedelta
-        
-        now = timezone.now()
-        
-        if self.goal_type == 'daily':
-            start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        elif self.goal_type == 'weekly':
-            start = now - timedelta(days=now.weekday())
-            start = start.replace(hour=0, minute=0, second=0, microsecond=0)
-        else:  # monthly
-            start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        
-        # Get sessions in the period
-        sessions = StudySession.objects.filter(
-            user=self.user,
-            start_time__gte=start,
-            is_active=False
-        )
-        
-        total_minutes = sum(session.duration for session in sessions)
-        percentage = min(100, int((total_minutes / self.target_minutes) * 100)) if self.target_minutes > 0 else 0
+        start = period_start(self.GOAL_PERIODS[self.goal_type], user_timezone(self.user_id))
         
+        # Sum the daily rollups (dated in the user's timezone) in the period
+        total_minutes = DailyStudyRollup.objects.filter(user_id=self.user_id, date__gte=start).minutes_sum()
+        return self.progress(self.target_minutes, total_minutes)
+    
+    @staticmethod
+    def progress(target_minutes, total_minutes):
+        """Progress of ``total_minutes`` studied towards ``target_minutes``"""
+        percentage = min(100, int((total_minutes / target_minutes) * 100)) if target_minutes > 0 else 0
         return {
             'total_minutes': total_minutes,
-            'target_minutes': self.target_minutes,
+            'target_minutes': target_minutes,
             'percentage': percentage,
-            'remaining_minutes': max(0, self.target_minutes - total_minutes)
+            'remaining_minutes': max(0, target_minutes - total_minutes)
         }
     
     class Meta:
@@ -146,6 +407,25 @@ class StudyGoal(models.Model):
         ordering = ['-created_at']
 
 
+class StudyScheduleQuerySet(models.QuerySet):
+    """Database-side window filters for schedules"""
+
+    def overlapping(self, start, end):
+        """Schedules that can have an occurrence starting in [start, end).
+
+        One-off events must start inside the window; recurring series only
+        need to have begun before it ends and not have stopped before it starts.
+        """
+        return self.filter(
+            models.Q(recurrence='none', scheduled_start__gte=start, scheduled_start__lt=end)
+            | (
+                ~models.Q(recurrence='none')
+                & models.Q(scheduled_start__lt=end)
+                & (models.Q(recurrence_until__isnull=True) | models.Q(recurrence_until__gte=start))
+            )
+        )
+
+
 class StudySchedule(models.Model):
     """Scheduled study events or reminders (calendar entries)."""
     RECURRENCE_CHOICES = [
@@ -164,18 +444,61 @@ class StudySchedule(models.Model):
 
     is_recurring = models.BooleanField(default=False)
     recurrence = models.CharField(max_length=10, choices=RECURRENCE_CHOICES, default='none')
+    recurrence_until = models.DateTimeField(null=True, blank=True, help_text='Last possible occurrence start; empty repeats forever')
     reminder_minutes_before = models.PositiveIntegerField(default=15, help_text='Minutes before start to remind')
 
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = StudyScheduleQuerySet.as_manager()
 
     def __str__(self):
         return f"{self.user.username} - {self.title} @ {self.scheduled_start.strftime('%Y-%m-%d %H:%M')}"
 
+    @property
+    def span(self):
+        """Length of each occurrence"""
+        if self.scheduled_end and self.scheduled_end > self.scheduled_start:
+            return self.scheduled_end - self.scheduled_start
+        return timedelta(minutes=self.duration_minutes or 0)
+
     class Meta:
         verbose_name = 'Study Schedule'
         verbose_name_plural = 'Study Schedules'
         ordering = ['scheduled_start']
+        indexes = [
+            models.Index(fields=['user', 'is_active', 'scheduled_start'], name='schedule_user_active_start'),
+            # users.reminders scans upcoming schedules across all users and polls for edits
+            models.Index(fields=['is_active', 'scheduled_start'], name='schedule_active_start'),
+            models.Index(fields=['updated_at'], name='schedule_updated_at'),
+        ]
+
+
+class ScheduleOccurrenceException(models.Model):
+    """A cancelled or changed single occurrence of a recurring schedule"""
+    schedule = models.ForeignKey(StudySchedule, on_delete=models.CASCADE, related_name='exceptions')
+    original_start = models.DateTimeField(help_text='Start the occurrence has in the series')
+    is_cancelled = models.BooleanField(default=False)
+
+    # Overrides; empty fields keep the series values
+    title = models.CharField(max_length=200, blank=True)
+    description = models.TextField(blank=True)
+    scheduled_start = models.DateTimeField(null=True, blank=True)
+    scheduled_end = models.DateTimeField(null=True, blank=True)
+
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        action = 'cancelled' if self.is_cancelled else 'changed'
+        return f"{self.schedule.title} @ {self.original_start.strftime('%Y-%m-%d %H:%M')} ({action})"
+
+    class Meta:
+        verbose_name = 'Schedule Occurrence Exception'
+        verbose_name_plural = 'Schedule Occurrence Exceptions'
+        constraints = [
+            models.UniqueConstraint(fields=['schedule', 'original_start'], name='schedule_exception_unique_start'),
+        ]
 
 
 class NoteCategory(models.Model):
@@ -197,6 +520,59 @@ class NoteCategory(models.Model):
         unique_together = ['user', 'name']
 
 
+def normalize_tags(tags):
+    """Split comma-separated tags into unique, lower-case names, keeping their order"""
+    names = (' '.join(tag.split()).lower() for tag in (tags or '').split(','))
+    return list(dict.fromkeys(name[:50] for name in names if name))
+
+
+class Tag(models.Model):
+    """A user's note tag; StudyNote.tags is mirrored into these through NoteTag"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='tags')
+    name = models.CharField(max_length=50)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.user.username} - {self.name}"
+
+    class Meta:
+        verbose_name = 'Tag'
+        verbose_name_plural = 'Tags'
+        ordering = ['name']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'name'], name='tag_user_name'),
+        ]
+
+
+class NoteTag(models.Model):
+    note = models.ForeignKey('StudyNote', on_delete=models.CASCADE, related_name='note_tags')
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, related_name='note_tags')
+
+    class Meta:
+        constraints = [
+            # Leads with tag, so "notes with tag X" is an index seek
+            models.UniqueConstraint(fields=['tag', 'note'], name='notetag_tag_note'),
+        ]
+
+
+class StudyNoteQuerySet(models.QuerySet):
+    """Tag filters that run as joins on NoteTag's (tag, note) index"""
+
+    def tagged(self, user, names, match_all=True):
+        """Notes carrying every one (or, with match_all=False, any) of the tag names"""
+        names = normalize_tags(','.join(names))
+        tag_ids = list(Tag.objects.filter(user=user, name__in=names).values_list('id', flat=True))
+        if match_all:
+            if len(tag_ids) < len(names):
+                return self.none()
+            notes = self
+            for tag_id in tag_ids:
+                # One join per tag, each a seek on (tag, note)
+                notes = notes.filter(note_tags__tag_id=tag_id)
+            return notes
+        return self.filter(id__in=NoteTag.objects.filter(tag_id__in=tag_ids).values('note_id'))
+
+
 class StudyNote(models.Model):
     """User's study notes with rich text support"""
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='study_notes')
@@ -213,19 +589,103 @@ class StudyNote(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Full-text index on PostgreSQL, maintained by users.search (unused on SQLite, which uses FTS5)
+    search_vector = SearchVectorField(null=True, editable=False)
+    
+    # Normalized copy of ``tags`` for indexed filtering, kept in sync by users.signals
+    tag_objects = models.ManyToManyField(Tag, through=NoteTag, related_name='notes', blank=True)
+    
+    objects = StudyNoteQuerySet.as_manager()
+    
     def __str__(self):
         return f"{self.user.username} - {self.title}"
     
     def get_tags_list(self):
-        """Return tags as a list"""
-        if self.tags:
-            return [tag.strip() for tag in self.tags.split(',')]
-        return []
+        """Return tag names, from prefetched Tag rows when available"""
+        if 'tag_objects' in getattr(self, '_prefetched_objects_cache', {}):
+            return [tag.name for tag in self.tag_objects.all()]
+        return normalize_tags(self.tags)
+    
+    def sync_tags(self):
+        """Make the note's NoteTag links match its comma-separated ``tags``"""
+        names = normalize_tags(self.tags)
+        current = dict(self.note_tags.values_list('tag__name', 'tag_id'))
+        removed = [tag_id for name, tag_id in current.items() if name not in names]
+        added = [name for name in names if name not in current]
+        if removed:
+            self.note_tags.filter(tag_id__in=removed).delete()
+        if added:
+            Tag.objects.bulk_create([Tag(user_id=self.user_id, name=name) for name in added], ignore_conflicts=True)
+            tag_ids = Tag.objects.filter(user_id=self.user_id, name__in=added).values_list('id', flat=True)
+            NoteTag.objects.bulk_create([NoteTag(note=self, tag_id=tag_id) for tag_id in tag_ids], ignore_conflicts=True)
     
     class Meta:
         verbose_name = 'Study Note'
         verbose_name_plural = 'Study Notes'
         ordering = ['-is_pinned', '-updated_at']
+        indexes = [
+            models.Index(fields=['user', 'is_pinned', 'updated_at', 'id'], name='note_user_pinned_updated'),
+            # Created on PostgreSQL only (migration 0011)
+            GinIndex(fields=['search_vector'], name='studynote_search_vector'),
+        ]
+
+
+class ResourceBlob(models.Model):
+    """Uploaded file content, stored once per SHA-256 and shared by every resource with that content"""
+    sha256 = models.CharField(max_length=64, unique=True)
+    file = models.FileField(upload_to='blobs/', max_length=255)
+    size = models.BigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0, help_text="Resources using this blob")
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    def __str__(self):
+        return self.sha256
+    
+    class Meta:
+        verbose_name = 'Resource Blob'
+        verbose_name_plural = 'Resource Blobs'
+
+
+class UploadSession(models.Model):
+    """A resumable chunked upload in progress; becomes a ResourceBlob when every byte arrived"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField(help_text="Declared total size in bytes")
+    received = models.BigIntegerField(default=0, help_text="Bytes written so far")
+    blob = models.ForeignKey(ResourceBlob, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.filename} ({self.received}/{self.size})"
+    
+    @property
+    def is_complete(self):
+        return self.blob_id is not None
+    
+    class Meta:
+        verbose_name = 'Upload Session'
+        verbose_name_plural = 'Upload Sessions'
+
+
+class SharedResourceQuerySet(models.QuerySet):
+    """Database-side filters for the resource library"""
+
+    def discoverable_by(self, user):
+        """Public resources shared by other users"""
+        return self.filter(is_public=True).exclude(user=user)
+
+    def matching(self, resource_type=None, course_id=None, search=None):
+        """Apply the library filters; blank values are ignored"""
+        qs = self
+        if resource_type:
+            qs = qs.filter(resource_type=resource_type)
+        if course_id:
+            qs = qs.filter(course_id=course_id)
+        if search:
+            qs = qs.filter(models.Q(title__icontains=search) | models.Q(description__icontains=search))
+        return qs
 
 
 class SharedResource(models.Model):
@@ -246,8 +706,10 @@ class SharedResource(models.Model):
     description = models.TextField(blank=True)
     resource_type = models.CharField(max_length=10, choices=RESOURCE_TYPES, default='other')
     
-    # For file uploads
-    file = models.FileField(upload_to='study_resources/%Y/%m/', null=True, blank=True)
+    # For file uploads; new uploads point file at their content-addressed blob
+    file = models.FileField(upload_to='study_resources/%Y/%m/', null=True, blank=True, max_length=255)
+    blob = models.ForeignKey(ResourceBlob, on_delete=models.PROTECT, null=True, blank=True, related_name='resources')
+    original_filename = models.CharField(max_length=255, blank=True)
     
     # For external links
     url = models.URLField(max_length=500, blank=True)
@@ -262,6 +724,8 @@ class SharedResource(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = SharedResourceQuerySet.as_manager()
+    
     def __str__(self):
         return self.title
     
@@ -275,12 +739,42 @@ class SharedResource(models.Model):
         verbose_name = 'Shared Resource'
         verbose_name_plural = 'Shared Resources'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id'], name='resource_user_created'),
+            # Discovery: each filter and sort order the library offers has an index to page along.
+            # is_public is the index condition rather than a leading column because Django
+            # filters booleans as a bare WHERE "is_public", which SQLite cannot match to a column.
+            models.Index(fields=['created_at', 'id'], name='resource_public_created', condition=models.Q(is_public=True)),
+            models.Index(
+                fields=['resource_type', 'created_at', 'id'], name='resource_public_type', condition=models.Q(is_public=True),
+            ),
+            models.Index(
+                fields=['course', 'created_at', 'id'], name='resource_public_course', condition=models.Q(is_public=True),
+            ),
+            models.Index(fields=['views', 'id'], name='resource_public_views', condition=models.Q(is_public=True)),
+            models.Index(fields=['downloads', 'id'], name='resource_public_downloads', condition=models.Q(is_public=True)),
+        ]
 
 
 # ============================================================================
 # PHASE 5: COLLABORATIVE LEARNING MODELS
 # ============================================================================
 
+class StudyGroupQuerySet(models.QuerySet):
+
+    def with_viewer(self, user):
+        """Annotate whether ``user`` is a member / admin of each group (read by is_member() and is_admin())"""
+        memberships = GroupMembership.objects.filter(group=models.OuterRef('pk'), user=user)
+        return self.annotate(
+            viewer_id=models.Value(user.pk, output_field=models.IntegerField()),
+            viewer_is_member=models.Exists(memberships),
+            viewer_is_admin=models.ExpressionWrapper(
+                models.Q(creator=user) | models.Q(models.Exists(memberships.filter(role='admin'))),
+                output_field=models.BooleanField(),
+            ),
+        )
+
+
 class StudyGroup(models.Model):
     """Study groups for collaborative learning"""
     name = models.CharField(max_length=200)
@@ -290,6 +784,9 @@ class StudyGroup(models.Model):
     is_private = models.BooleanField(default=False, help_text="Private groups require invitation to join")
     cover_image = models.ImageField(upload_to='group_covers/%Y/%m/', blank=True, null=True)
     
+    # Kept in step with GroupMembership by add_member() and users.signals; repaired by recount_groups
+    member_count = models.PositiveIntegerField(default=0, editable=False)
+    
     # Associated course (optional)
     course = models.ForeignKey('courses.Course', on_delete=models.SET_NULL, null=True, blank=True, related_name='study_groups')
     
@@ -297,29 +794,62 @@ class StudyGroup(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = StudyGroupQuerySet.as_manager()
+    
     def __str__(self):
         return self.name
     
-    def member_count(self):
-        """Return current number of members"""
-        return self.members.count()
-    
     def is_full(self):
         """Check if group has reached max capacity"""
-        return self.member_count() >= self.max_members
+        return self.member_count >= self.max_members
+    
+    def add_member(self, user, role='member', enforce_limit=True):
+        """Make ``user`` a member; returns the membership, or None if the group is full.
+        Raises IntegrityError if they are already a member."""
+        with transaction.atomic():
+            # Claiming the seat and checking capacity are one UPDATE, so concurrent joins cannot overfill
+            seat = StudyGroup.objects.filter(pk=self.pk)
+            if enforce_limit:
+                seat = seat.filter(member_count__lt=models.F('max_members'))
+            if not seat.update(member_count=models.F('member_count') + 1):
+                return None
+            membership = GroupMembership(user=user, group=self, role=role)
+            membership._counted = True  # tells the post_save receiver the seat is already counted
+            membership.save()
+        self.member_count += 1
+        return membership
+    
+    def _viewer_answer(self, user, flag):
+        # The with_viewer() annotation, if this row was loaded with it for ``user``
+        if getattr(self, 'viewer_id', None) == user.pk:
+            return getattr(self, flag)
+        return None
     
     def is_member(self, user):
         """Check if user is a member"""
+        answer = self._viewer_answer(user, 'viewer_is_member')
+        if answer is not None:
+            return answer
         return self.members.filter(user=user).exists()
     
     def is_admin(self, user):
         """Check if user is an admin of the group"""
-        return self.members.filter(user=user, role='admin').exists() or self.creator == user
+        answer = self._viewer_answer(user, 'viewer_is_admin')
+        if answer is not None:
+            return answer
+        return self.creator_id == user.pk or self.members.filter(user=user, role='admin').exists()
     
     class Meta:
         verbose_name = 'Study Group'
         verbose_name_plural = 'Study Groups'
         ordering = ['-created_at']
+        indexes = [
+            # Public listing; a partial index for the same reason as SharedResource's
+            models.Index(fields=['created_at', 'id'], name='group_public_created', condition=models.Q(is_private=False)),
+            models.Index(
+                fields=['member_count', 'created_at', 'id'], name='group_public_popular', condition=models.Q(is_private=False),
+            ),
+        ]
 
 
 class GroupMembership(models.Model):
@@ -335,6 +865,9 @@ class GroupMembership(models.Model):
     role = models.CharField(max_length=20, choices=ROLE_CHOICES, default='member')
     joined_at = models.DateTimeField(default=timezone.now)
     
+    # Last GroupFeedEntry of a large group copied into this member's feed (users.feed)
+    feed_cursor = models.PositiveBigIntegerField(default=0, editable=False)
+    
     def __str__(self):
         return f"{self.user.username} - {self.group.name} ({self.role})"
     
@@ -356,6 +889,10 @@ class Discussion(models.Model):
     is_pinned = models.BooleanField(default=False)
     is_locked = models.BooleanField(default=False, help_text="Locked discussions cannot receive new replies")
     
+    # Kept in step with DiscussionReply by users.signals; repaired by recount_groups
+    reply_count = models.PositiveIntegerField(default=0, editable=False)
+    last_activity_at = models.DateTimeField(default=timezone.now, editable=False)
+    
     # Metadata
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
@@ -363,21 +900,31 @@ class Discussion(models.Model):
     def __str__(self):
         return f"{self.group.name} - {self.title}"
     
-    def reply_count(self):
-        """Return number of replies"""
-        return self.replies.count()
-    
     def last_activity(self):
         """Return timestamp of last activity"""
-        last_reply = self.replies.order_by('-created_at').first()
-        if last_reply:
-            return last_reply.created_at
-        return self.created_at
+        return self.last_activity_at
     
     class Meta:
         verbose_name = 'Discussion'
         verbose_name_plural = 'Discussions'
         ordering = ['-is_pinned', '-updated_at']
+        indexes = [
+            models.Index(fields=['group', 'is_pinned', 'updated_at', 'id'], name='discussion_group_pinned'),
+            models.Index(fields=['group', 'is_pinned', 'last_activity_at', 'id'], name='discussion_group_activity'),
+        ]
+
+
+REPLY_PATH_STEP = 7        # base-36 digits per ancestor in DiscussionReply.path
+MAX_REPLY_DEPTH = 32       # replies nested deeper are attached to the deepest allowed ancestor
+
+
+def reply_path_step(pk):
+    digits = '0123456789abcdefghijklmnopqrstuvwxyz'
+    step = ''
+    while pk:
+        pk, digit = divmod(pk, 36)
+        step = digits[digit] + step
+    return step.rjust(REPLY_PATH_STEP, '0')
 
 
 class DiscussionReply(models.Model):
@@ -388,6 +935,10 @@ class DiscussionReply(models.Model):
     
     # Threading support
     parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='children')
+    # Materialized path: the fixed-width ids of every ancestor and then this reply, so ordering by
+    # path lists a thread depth-first and a subtree is a path prefix (see users.threads)
+    path = models.CharField(max_length=REPLY_PATH_STEP * MAX_REPLY_DEPTH, editable=False, default='')
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
     
     # Metadata
     created_at = models.DateTimeField(default=timezone.now)
@@ -396,10 +947,27 @@ class DiscussionReply(models.Model):
     def __str__(self):
         return f"Reply by {self.author.username} on {self.discussion.title}"
     
+    def save(self, *args, **kwargs):
+        if self.path:
+            return super().save(*args, **kwargs)
+        # The path ends with this reply's own id, so it is written right after the insert
+        with transaction.atomic():
+            while self.parent is not None and self.parent.depth >= MAX_REPLY_DEPTH - 1:
+                self.parent = self.parent.parent
+            super().save(*args, **kwargs)
+            prefix = self.parent.path if self.parent is not None else ''
+            self.path = prefix + reply_path_step(self.pk)
+            self.depth = len(self.path) // REPLY_PATH_STEP - 1
+            DiscussionReply.objects.filter(pk=self.pk).update(path=self.path, depth=self.depth)
+    
     class Meta:
         verbose_name = 'Discussion Reply'
         verbose_name_plural = 'Discussion Replies'
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['discussion', 'path'], name='reply_discussion_path'),
+            models.Index(fields=['discussion', 'depth', 'path'], name='reply_discussion_depth'),
+        ]
 
 
 class PeerReview(models.Model):
@@ -449,11 +1017,24 @@ class Badge(models.Model):
         ('special', 'Special Achievement'),
     ]
     
+    METRIC_CHOICES = [
+        ('study_hours', 'Total study hours'),
+        ('study_streak', 'Study streak (days)'),
+        ('groups_joined', 'Study groups joined'),
+        ('discussions_started', 'Discussions started'),
+        ('reviews_given', 'Peer reviews given'),
+        ('notes_created', 'Notes created'),
+        ('resources_shared', 'Resources shared'),
+        ('lessons_completed', 'Lessons completed'),
+        ('badges_earned', 'Badges earned'),
+    ]
+    
     name = models.CharField(max_length=100)
     description = models.TextField()
     icon = models.CharField(max_length=50, help_text="Font Awesome icon class (e.g., fa-trophy)")
     badge_type = models.CharField(max_length=20, choices=BADGE_TYPES, default='study')
     color = models.CharField(max_length=7, default='#FFD700', help_text="Hex color code")
+    metric = models.CharField(max_length=30, choices=METRIC_CHOICES, blank=True, help_text="What the requirement is measured against")
     requirement = models.IntegerField(help_text="Requirement value (e.g., 100 hours, 50 notes)")
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(default=timezone.now)
@@ -508,8 +1089,10 @@ class Notification(models.Model):
         return f"{self.user.username} - {self.title}"
     
     def mark_as_read(self):
+        from .notifications import mark_read
+        
+        mark_read(self.user_id, [self.pk])
         self.is_read = True
-        self.save()
     
     def time_ago(self):
         """Return human-readable time since notification"""
@@ -532,6 +1115,29 @@ class Notification(models.Model):
         verbose_name = 'Notification'
         verbose_name_plural = 'Notifications'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='notification_user_created'),
+            models.Index(fields=['user', 'is_read'], name='notification_user_read'),
+        ]
+
+
+class NotificationDigest(models.Model):
+    """Per-user monthly tally of read notifications removed by compact_notifications (users.retention)"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notification_digests')
+    month = models.DateField(help_text="First day of the month")
+    total = models.PositiveIntegerField(default=0)
+    counts = models.JSONField(default=dict, help_text="Notifications per notification_type")
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.month:%B %Y} ({self.total})"
+    
+    class Meta:
+        verbose_name = 'Notification Digest'
+        verbose_name_plural = 'Notification Digests'
+        ordering = ['-month']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'month'], name='unique_notification_digest_month'),
+        ]
 
 
 # ========== User Activity/Stats ==========
@@ -577,4 +1183,58 @@ class UserActivity(models.Model):
     class Meta:
         verbose_name = 'User Activity'
         verbose_name_plural = 'User Activities'
-        ordering = ['-created_at']
\ No newline at end of file
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='activity_user_created'),
+        ]
+
+
+class FeedEntry(models.Model):
+    """One activity in one reader's feed, written by users.feed when the activity happens"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='feed_entries')
+    activity = models.ForeignKey(UserActivity, on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField()
+    
+    class Meta:
+        verbose_name = 'Feed Entry'
+        verbose_name_plural = 'Feed Entries'
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='feed_user_created'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'activity'], name='unique_feed_entry'),
+        ]
+
+
+class GroupFeedEntry(models.Model):
+    """An activity of a member of a group too large to fan out to; members copy these on read"""
+    group = models.ForeignKey(StudyGroup, on_delete=models.CASCADE, related_name='feed_entries')
+    activity = models.ForeignKey(UserActivity, on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField()
+    
+    class Meta:
+        verbose_name = 'Group Feed Entry'
+        verbose_name_plural = 'Group Feed Entries'
+
+
+class UserActivityArchive(models.Model):
+    """UserActivity rows older than ACTIVITY_RETENTION_DAYS, moved here by compact_notifications.
+    Rows keep their original ids."""
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_activities')
+    activity_type = models.CharField(max_length=30, choices=UserActivity.ACTIVITY_TYPES)
+    description = models.CharField(max_length=300)
+    link = models.CharField(max_length=500, blank=True)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+    
+    def __str__(self):
+        return f"{self.user.username} - {self.get_activity_type_display()}"
+    
+    class Meta:
+        verbose_name = 'Archived User Activity'
+        verbose_name_plural = 'Archived User Activities'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='activity_archive_user_created'),
+        ]
@@ -0,0 +1,242 @@
+"""
+Notification delivery, change tracking and the push hub behind the streaming endpoints.
+
+deliver() and notify_many() write notifications with bulk_create, in
+batches of FANOUT_BATCH_SIZE users, and add to each recipient's
+Profile.unread_notifications in one UPDATE per batch; mark_read() clears
+any number of them in one UPDATE. The bell reads that counter instead of
+counting rows. Single notifications saved or deleted through the ORM keep
+it in step via users.signals, and recount_unread() repairs it.
+
+Every change to a user's notifications bumps a per-user version counter in
+the cache. Waiting async requests (the Server-Sent Events stream and the
+long-poll fallback) register with NotificationHub, whose single watcher task
+per event loop reads all subscribed versions with one cache get_many per
+tick, so idle clients cost no database queries. A bump is only seen by
+the process that made it when the cache is local to each one (LocMemCache),
+so the stream and the version checks of the poll endpoint are only served
+when cache_is_shared() (REDIS_URL or CACHE_DIR); push_available() tells the
+bell whether to use them.
+"""
+import asyncio
+from collections import Counter, defaultdict
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, QuerySet, Subquery
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .conditional import cache_is_shared, touch, touch_many
+from .models import Notification, Profile
+
+VERSION_KEY = 'notifications:version:{}'
+HUB_INTERVAL = 1.0
+FANOUT_BATCH_SIZE = 2000
+STREAM_BATCH_SIZE = 50
+
+
+def version_key(user_id):
+    return VERSION_KEY.format(user_id)
+
+
+def push_available():
+    """Whether the bell may wait on the stream or long poll: NOTIFICATION_PUSH is on and versions cross workers"""
+    return settings.NOTIFICATION_PUSH and cache_is_shared()
+
+
+def get_version(user_id):
+    return cache.get(version_key(user_id), 0)
+
+
+def bump_version(user_id):
+    """Record that a user's notifications changed"""
+    key = version_key(user_id)
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Evicted between add() and incr()
+        cache.set(key, 1, None)
+    touch('notifications', user_id)
+
+
+def bump_versions(user_ids):
+    """bump_version() for many users with two cache round trips instead of two per user"""
+    keys = {version_key(user_id): user_id for user_id in user_ids}
+    if not keys:
+        return
+    # Not atomic like incr(): a bump racing this one may be merged into it, which only
+    # means its waiters wake for both changes at once
+    versions = cache.get_many(list(keys))
+    cache.set_many({key: versions.get(key, 0) + 1 for key in keys}, None)
+    touch_many('notifications', keys.values())
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _recipient_ids(users):
+    if isinstance(users, QuerySet):
+        return users.values_list('pk', flat=True).iterator(chunk_size=FANOUT_BATCH_SIZE)
+    return (getattr(user, 'pk', user) for user in users)
+
+
+def _add_unread(counts):
+    # One UPDATE per distinct increment (per batch of users), as users.counters does
+    user_ids_by_amount = defaultdict(list)
+    for user_id, amount in counts.items():
+        user_ids_by_amount[amount].append(user_id)
+    for amount, user_ids in user_ids_by_amount.items():
+        for chunk in _chunks(user_ids, FANOUT_BATCH_SIZE):
+            Profile.objects.filter(user_id__in=chunk).update(
+                unread_notifications=F('unread_notifications') + amount
+            )
+
+
+def deliver(notifications, batch_size=FANOUT_BATCH_SIZE):
+    """Save unsaved Notification objects in bulk, doing the work post_save receivers would do for each"""
+    if not notifications:
+        return notifications
+    with transaction.atomic():
+        Notification.objects.bulk_create(notifications, batch_size=batch_size)
+        _add_unread(Counter(n.user_id for n in notifications if not n.is_read))
+    user_ids = {n.user_id for n in notifications}
+    transaction.on_commit(lambda: bump_versions(user_ids))
+    return notifications
+
+
+def notify_many(users, notification_type, title, message='', link=''):
+    """Send the same notification to every user in ``users`` (Users, user ids or a User queryset).
+
+    Each batch of FANOUT_BATCH_SIZE users is its own transaction, so a failure part way
+    leaves the earlier batches delivered. Returns the number of notifications created.
+    """
+    created_at = timezone.now()
+    sent = 0
+    for user_ids in _chunks(_recipient_ids(users), FANOUT_BATCH_SIZE):
+        deliver([
+            Notification(
+                user_id=user_id, notification_type=notification_type, title=title, message=message,
+                link=link, created_at=created_at,
+            )
+            for user_id in user_ids
+        ])
+        sent += len(user_ids)
+    return sent
+
+
+def mark_read(user_id, ids=None):
+    """Mark a user's unread notifications (all, or those in ``ids``) read in one UPDATE; returns how many"""
+    unread = Notification.objects.filter(user_id=user_id, is_read=False)
+    if ids is not None:
+        unread = unread.filter(pk__in=ids)
+    with transaction.atomic():
+        changed = unread.update(is_read=True)
+        if changed:
+            # Subtract rather than zero: a notification delivered meanwhile is still unread
+            Profile.objects.filter(user_id=user_id).update(
+                unread_notifications=Greatest(F('unread_notifications') - changed, 0)
+            )
+    if changed:
+        transaction.on_commit(lambda: bump_version(user_id))
+    return changed
+
+
+def recount_unread(user_ids=None):
+    """Rebuild Profile.unread_notifications from the rows, for ``user_ids`` or everyone"""
+    unread = (
+        Notification.objects.filter(user_id=OuterRef('user_id'), is_read=False)
+        .order_by().values('user_id').annotate(n=Count('pk')).values('n')
+    )
+    profiles = Profile.objects.all() if user_ids is None else Profile.objects.filter(user_id__in=user_ids)
+    return profiles.update(unread_notifications=Coalesce(Subquery(unread), 0))
+
+
+def unread_count(user_id):
+    return Profile.objects.filter(user_id=user_id).values_list('unread_notifications', flat=True).first() or 0
+
+
+async def aunread_count(user_id):
+    return await Profile.objects.filter(user_id=user_id).values_list('unread_notifications', flat=True).afirst() or 0
+
+
+def serialize_notification(notification):
+    return {
+        'id': str(notification.id),
+        'type': notification.notification_type,
+        'title': notification.title,
+        'message': notification.message,
+        'link': notification.link,
+        'is_read': notification.is_read,
+        'created_at': notification.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+        'time_ago': notification.time_ago(),
+    }
+
+
+def notification_payload(user_id, limit=20):
+    """The bell's JSON payload: latest notifications, unread count and version"""
+    # Read the version first so a change racing with the queries is seen next time
+    version = get_version(user_id)
+    notifications = Notification.objects.filter(user_id=user_id).order_by('-created_at')[:limit]
+    return {
+        'notifications': [serialize_notification(n) for n in notifications],
+        'unread_count': unread_count(user_id),
+        'version': version,
+    }
+
+
+class NotificationHub:
+    """Wakes async requests waiting for a user's notification version to change"""
+
+    def __init__(self, interval=HUB_INTERVAL):
+        self.interval = interval
+        self.waiters = {}
+        self._task = None
+
+    async def wait(self, user_id, known_version, timeout):
+        """Return the user's version once it differs from known_version, or after timeout"""
+        current = await cache.aget(version_key(user_id), 0)
+        if current != known_version or timeout <= 0:
+            return current
+
+        event = asyncio.Event()
+        self.waiters.setdefault(user_id, {})[event] = known_version
+        self._ensure_watcher()
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            user_waiters = self.waiters.get(user_id, {})
+            user_waiters.pop(event, None)
+            if not user_waiters:
+                self.waiters.pop(user_id, None)
+        return await cache.aget(version_key(user_id), 0)
+
+    def subscriber_count(self):
+        return sum(len(events) for events in self.waiters.values())
+
+    def _ensure_watcher(self):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._task = loop.create_task(self._watch())
+
+    async def _watch(self):
+        while self.waiters:
+            await asyncio.sleep(self.interval)
+            keys = {version_key(user_id): user_id for user_id in list(self.waiters)}
+            versions = await cache.aget_many(keys)
+            for key, user_id in keys.items():
+                current = versions.get(key, 0)
+                for event, known_version in list(self.waiters.get(user_id, {}).items()):
+                    if current != known_version:
+                        event.set()
+
+
+hub = NotificationHub()
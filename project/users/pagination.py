@@ -0,0 +1,209 @@
+"""
+Keyset (cursor) pagination for the list views.
+
+OFFSET pagination makes the database walk past every row before the page it
+returns, so the hundredth page costs a hundred times the first. A cursor
+instead carries the sort key of the row a page ended on, and the next page
+asks for the rows after that key:
+
+    WHERE (is_pinned, updated_at, id) < (%s, %s, %s)
+    ORDER BY is_pinned DESC, updated_at DESC, id DESC LIMIT 25
+
+An index on the ordering columns seeks straight to the key, so every page
+costs the same. Orderings must end with the primary key so the key is
+unique, and should sort every column the same way: a row-value comparison
+cannot express mixed directions, which fall back to an equivalent OR chain
+that indexes serve less well. Cursors are opaque URL-safe tokens; they can step forward and back
+but not jump to a page number, and pages carry no total count.
+"""
+import base64
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import BooleanField, Expression, F, Q
+from django.http import JsonResponse
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def wants_json(request):
+    """Whether a list view should answer with the JSON (infinite scroll) variant"""
+    return request.GET.get('format') == 'json'
+
+
+class RowComparison(Expression):
+    """``(col, ...) <op> (value, ...)`` on the given model fields"""
+    output_field = BooleanField()
+
+    def __init__(self, fields, op, values):
+        super().__init__()
+        self.fields = fields
+        self.op = op
+        self.values = values
+        self.columns = [F(field.attname) for field in fields]
+
+    def get_source_expressions(self):
+        return self.columns
+
+    def set_source_expressions(self, exprs):
+        self.columns = exprs
+
+    def as_sql(self, compiler, connection):
+        columns, params = [], []
+        for column in self.columns:
+            sql, column_params = compiler.compile(column)
+            columns.append(sql)
+            params.extend(column_params)
+        params.extend(field.get_db_prep_value(value, connection) for field, value in zip(self.fields, self.values))
+        placeholders = ', '.join(['%s'] * len(self.values))
+        return f"({', '.join(columns)}) {self.op} ({placeholders})", params
+
+
+class CursorPage:
+    """One page of rows plus the cursors of its neighbours"""
+
+    def __init__(self, object_list, request, param, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.request = request
+        self.param = param
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def _url(self, cursor):
+        if cursor is None:
+            return None
+        params = self.request.GET.copy()
+        params[self.param] = cursor
+        return f'{self.request.path}?{params.urlencode()}'
+
+    @property
+    def next_url(self):
+        return self._url(self.next_cursor)
+
+    @property
+    def previous_url(self):
+        return self._url(self.previous_cursor)
+
+    def as_json(self, serialize):
+        """JSON body for infinite scroll: keep fetching ``next`` until it is null"""
+        return {
+            'results': [serialize(obj) for obj in self.object_list],
+            'next': self.next_url,
+            'previous': self.previous_url,
+            'next_cursor': self.next_cursor,
+            'previous_cursor': self.previous_cursor,
+        }
+
+    def json_response(self, serialize):
+        return JsonResponse(self.as_json(serialize), encoder=DjangoJSONEncoder)
+
+
+class CursorPaginator:
+    def __init__(self, queryset, ordering, per_page):
+        if ordering[-1].lstrip('-') not in ('id', 'pk'):
+            raise ValueError('A cursor ordering must end with the primary key.')
+        self.queryset = queryset
+        self.ordering = tuple(ordering)
+        self.per_page = per_page
+        opts = queryset.model._meta
+        self.fields = [
+            (opts.pk if name.lstrip('-') == 'pk' else opts.get_field(name.lstrip('-')), name.startswith('-'))
+            for name in ordering
+        ]
+
+    # ---- cursors -----------------------------------------------------------
+
+    def encode(self, obj, backwards=False):
+        # isoformat() keeps the microseconds that DjangoJSONEncoder would round away
+        values = [getattr(obj, field.attname) for field, _ in self.fields]
+        values = [value.isoformat() if hasattr(value, 'isoformat') else value for value in values]
+        payload = json.dumps([int(backwards), values], separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode(self, cursor):
+        try:
+            backwards, values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+            if len(values) != len(self.fields):
+                raise ValueError
+            return bool(backwards), [field.to_python(value) for (field, _), value in zip(self.fields, values)]
+        except Exception as exc:
+            raise InvalidCursor(f'Invalid cursor: {cursor!r}') from exc
+
+    def _beyond(self, values, backwards):
+        """Rows strictly after ``values`` in the ordering, or strictly before when ``backwards``"""
+        def lookup(i):
+            field, descending = self.fields[i]
+            return field.attname, 'lt' if descending != backwards else 'gt'
+
+        if len({descending for _, descending in self.fields}) == 1:
+            op = '<' if lookup(0)[1] == 'lt' else '>'
+            return RowComparison([field for field, _ in self.fields], op, values)
+
+        name, op = lookup(len(self.fields) - 1)
+        condition = Q(**{f'{name}__{op}': values[-1]})
+        for i in range(len(self.fields) - 2, -1, -1):
+            name, op = lookup(i)
+            condition = Q(**{f'{name}__{op}': values[i]}) | (Q(**{name: values[i]}) & condition)
+        # The redundant bound on the leading column gives the planner at least some index range
+        name, op = lookup(0)
+        return Q(**{f'{name}__{op}e': values[0]}) & condition
+
+    # ---- pages -------------------------------------------------------------
+
+    def page(self, request, cursor=None, param='cursor'):
+        """The page after (or, for a backwards cursor, before) ``cursor``; raises InvalidCursor"""
+        backwards, values = self.decode(cursor) if cursor else (False, None)
+        ordering = self.ordering
+        if backwards:
+            ordering = tuple(name[1:] if name.startswith('-') else f'-{name}' for name in ordering)
+
+        rows = self.queryset.order_by(*ordering)
+        if values is not None:
+            rows = rows.filter(self._beyond(values, backwards))
+        rows = list(rows[:self.per_page + 1])
+        more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if backwards:
+            rows.reverse()
+            has_next, has_previous = True, more
+        else:
+            has_next, has_previous = more, values is not None
+        if not rows:
+            return CursorPage(rows, request, param)
+        return CursorPage(
+            rows, request, param,
+            next_cursor=self.encode(rows[-1]) if has_next else None,
+            previous_cursor=self.encode(rows[0], backwards=True) if has_previous else None,
+        )
+
+    def get_page(self, request, param='cursor'):
+        """The page named by ``request.GET[param]``, falling back to the first page for a bad cursor"""
+        try:
+            return self.page(request, request.GET.get(param), param)
+        except InvalidCursor:
+            return self.page(request, None, param)
+
+
+def paginate(request, queryset, ordering, per_page, param='cursor'):
+    return CursorPaginator(queryset, ordering, per_page).get_page(request, param)
@@ -0,0 +1,90 @@
+"""
+Day, week and month windows in a user's own timezone.
+
+Profile.time_zone names the zone a student lives in, and their study days,
+streaks, goal periods and charts run from their midnight rather than UTC's.
+UserTimezoneMiddleware activates it for each request, so timezone.localtime(),
+the template date filters and __date lookups follow it there; code handling
+another user's data (admin actions, signal receivers, commands, the reminder
+worker) passes user_timezone(user_id) explicitly instead.
+
+The zone names are cached, and rewritten whenever a profile is saved, so
+looking one up costs no query. Entries expire after TIMEZONE_TIMEOUT, which
+bounds how long a worker with its own cache (LocMemCache) keeps the old zone
+after the profile was saved by another one.
+"""
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError, available_timezones
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+TIMEZONE_KEY = 'timezone:{}'
+TIMEZONE_TIMEOUT = 5 * 60
+PERIODS = ('day', 'week', 'month')
+
+
+def timezone_choices():
+    return [(name, name.replace('_', ' ')) for name in sorted(available_timezones())]
+
+
+def get_zone(name):
+    """ZoneInfo for ``name``, or the site's zone when it is empty or unknown"""
+    try:
+        return ZoneInfo(name or settings.TIME_ZONE)
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo(settings.TIME_ZONE)
+
+
+def user_timezone(user_id):
+    name = cache.get(TIMEZONE_KEY.format(user_id))
+    if name is None:
+        from .models import Profile
+
+        name = Profile.objects.filter(user_id=user_id).values_list('time_zone', flat=True).first() or ''
+        cache.set(TIMEZONE_KEY.format(user_id), name, TIMEZONE_TIMEOUT)
+    return get_zone(name)
+
+
+async def auser_timezone(user_id):
+    name = await cache.aget(TIMEZONE_KEY.format(user_id))
+    if name is None:
+        from .models import Profile
+
+        name = await Profile.objects.filter(user_id=user_id).values_list('time_zone', flat=True).afirst() or ''
+        await cache.aset(TIMEZONE_KEY.format(user_id), name, TIMEZONE_TIMEOUT)
+    return get_zone(name)
+
+
+def remember_timezone(user_id, name):
+    cache.set(TIMEZONE_KEY.format(user_id), name, TIMEZONE_TIMEOUT)
+
+
+def day_start(day, tz):
+    """The aware datetime at which ``day`` begins in ``tz``"""
+    return timezone.make_aware(datetime.combine(day, time.min), tz)
+
+
+def period_start(period, tz, now=None):
+    """First day of the ``period`` ('day', 'week' from Monday, or 'month') containing ``now`` in ``tz``"""
+    today = timezone.localdate(now, tz)
+    if period == 'day':
+        return today
+    if period == 'week':
+        return today - timedelta(days=today.weekday())
+    if period == 'month':
+        return today.replace(day=1)
+    raise ValueError(f'Unknown period: {period!r}')
+
+
+def period_window(period, tz, now=None):
+    """(start, end) aware datetimes of the ``period`` containing ``now`` in ``tz``; end is exclusive"""
+    first = period_start(period, tz, now)
+    if period == 'day':
+        following = first + timedelta(days=1)
+    elif period == 'week':
+        following = first + timedelta(days=7)
+    else:
+        following = (first + timedelta(days=32)).replace(day=1)
+    return day_start(first, tz), day_start(following, tz)
@@ -0,0 +1,274 @@
+"""
+Reminder dispatch for StudySchedule.reminder_minutes_before.
+
+ReminderScheduler keeps a min-heap of reminder instants due within a rolling
+horizon, holding at most the next occurrence of each schedule plus moved
+overrides, so memory is bounded by the number of schedules active in the
+horizon rather than by how far series repeat. The run loop sleeps until the
+earliest of the next reminder, the next change poll and the horizon end.
+
+Edits are picked up incrementally: the poll reads only schedules whose
+updated_at moved, and every due entry is re-validated against its schedule
+and exceptions in one batch before sending, so deleted, deactivated, changed
+or cancelled occurrences never produce stale reminders. The clock is
+injectable so the loop can be driven with simulated time.
+
+The loop outlives errors: a failing step (the database restarting, say) is
+logged, the reminders it was sending go back on the heap, and the step is
+retried after a backoff that doubles up to MAX_BACKOFF. Stale database
+connections are dropped between steps, as the request cycle does for the
+web workers.
+"""
+import heapq
+import logging
+import time
+from datetime import timedelta
+
+from django.db import close_old_connections, connection
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import Notification, ScheduleOccurrenceException, StudySchedule
+from .notifications import deliver
+from .periods import user_timezone
+from .schedules import iter_series_starts
+
+SCHEDULE_FIELDS = (
+    'id', 'user_id', 'title', 'scheduled_start', 'scheduled_end', 'duration_minutes',
+    'recurrence', 'recurrence_until', 'reminder_minutes_before', 'is_active',
+)
+
+# Entry kinds: the next occurrence of a series, or an override moved to a new start
+SERIES, MOVED = 0, 1
+
+# Retry delays after failed steps: doubling from the first up to the cap
+BACKOFF = timedelta(seconds=5)
+MAX_BACKOFF = timedelta(minutes=5)
+
+logger = logging.getLogger(__name__)
+
+
+class SystemClock:
+    def now(self):
+        return timezone.now()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+
+class SimulatedClock:
+    """A clock whose sleep() advances time instantly"""
+
+    def __init__(self, start):
+        self.current = start
+
+    def now(self):
+        return self.current
+
+    def sleep(self, seconds):
+        self.current += timedelta(seconds=seconds)
+
+
+def _remind_at(schedule, start):
+    return start - timedelta(minutes=schedule.reminder_minutes_before)
+
+
+def _next_occurrence(schedule, since):
+    """Start of the first occurrence at or after ``since``, or None once the series ended"""
+    # Recurrences keep their wall-clock time in the owner's timezone, as on their calendar
+    start = next(iter_series_starts(schedule, since, user_timezone(schedule.user_id)), None)
+    if start is None or (schedule.recurrence_until and start > schedule.recurrence_until):
+        return None
+    return start
+
+
+class ReminderScheduler:
+    def __init__(self, clock=None, horizon=timedelta(hours=6), poll_interval=timedelta(seconds=30),
+                 batch_size=2000):
+        self.clock = clock or SystemClock()
+        self.horizon = horizon
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.heap = []             # (remind_at, schedule_id, original_start, kind)
+        self.queued = {}           # schedule_id -> (remind_at, original_start) of its live SERIES entry
+        self.sent = {}             # (schedule_id, original_start) -> remind_at, to never remind twice
+        self.horizon_end = None
+        self.next_poll = None
+        self.synced_at = None
+        self.dispatched = 0
+
+    # ---- queueing ----------------------------------------------------------
+
+    def _queue_series(self, schedule, since):
+        """Queue the schedule's first reminder for an occurrence at or after ``since``"""
+        start = _next_occurrence(schedule, since)
+        if start is None or _remind_at(schedule, start) >= self.horizon_end:
+            # Ended, or beyond the horizon: the next refill will pick it up
+            self.queued.pop(schedule.id, None)
+            return
+        entry = (_remind_at(schedule, start), start)
+        if self.queued.get(schedule.id) != entry:
+            self.queued[schedule.id] = entry
+            heapq.heappush(self.heap, (entry[0], schedule.id, start, SERIES))
+
+    def _queue_moved(self, now, window_end, schedule_ids=None):
+        """Queue reminders for occurrences an override moved to a new start"""
+        moved = ScheduleOccurrenceException.objects.filter(
+            is_cancelled=False, schedule__is_active=True, scheduled_start__gte=now, scheduled_start__lt=window_end,
+        ).select_related('schedule')
+        if schedule_ids is not None:
+            moved = moved.filter(schedule_id__in=schedule_ids)
+        for exception in moved.iterator(self.batch_size):
+            remind_at = _remind_at(exception.schedule, exception.scheduled_start)
+            if remind_at < self.horizon_end and (exception.schedule_id, exception.original_start) not in self.sent:
+                heapq.heappush(self.heap, (max(remind_at, now), exception.schedule_id, exception.original_start, MOVED))
+
+    def refill(self, now):
+        """Queue every reminder due between now and the end of a new horizon"""
+        self.horizon_end = now + self.horizon
+        active = StudySchedule.objects.filter(is_active=True)
+        longest = active.aggregate(longest=Max('reminder_minutes_before'))['longest'] or 0
+        window_end = self.horizon_end + timedelta(minutes=longest)
+
+        for schedule in active.overlapping(now, window_end).only(*SCHEDULE_FIELDS).iterator(self.batch_size):
+            if schedule.id not in self.queued:
+                self._queue_series(schedule, now + timedelta(minutes=schedule.reminder_minutes_before))
+
+        self._queue_moved(now, window_end)
+
+        # Reminders sent before this horizon can no longer come up again
+        self.sent = {key: at for key, at in self.sent.items() if at >= now - self.horizon}
+
+    def poll(self, now):
+        """Re-queue schedules created or edited since the last poll"""
+        synced_at = timezone.now()
+        if self.synced_at is not None:
+            # Overlap polls so rows committed late with an earlier updated_at are not missed
+            changed = StudySchedule.objects.filter(
+                updated_at__gte=self.synced_at - self.poll_interval, is_active=True,
+            ).only(*SCHEDULE_FIELDS)
+            changed_ids, longest = [], 0
+            for schedule in changed.iterator(self.batch_size):
+                changed_ids.append(schedule.id)
+                longest = max(longest, schedule.reminder_minutes_before)
+                self._queue_series(schedule, now + timedelta(minutes=schedule.reminder_minutes_before))
+            if changed_ids:
+                self._queue_moved(now, self.horizon_end + timedelta(minutes=longest), changed_ids)
+        self.synced_at = synced_at
+        self.next_poll = now + self.poll_interval
+
+    # ---- dispatch ----------------------------------------------------------
+
+    def _pop_due(self, now):
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            remind_at, schedule_id, original_start, kind = heapq.heappop(self.heap)
+            if kind == SERIES:
+                if self.queued.get(schedule_id) != (remind_at, original_start):
+                    continue  # superseded by a re-queue after an edit
+                del self.queued[schedule_id]
+            due.append((remind_at, schedule_id, original_start, kind))
+        return due
+
+    def dispatch_due(self, now):
+        """Send every reminder that is due, returning the created notifications"""
+        due = self._pop_due(now)
+        if not due:
+            return []
+        try:
+            return self._dispatch(due, now)
+        except Exception:
+            # Put them back as standalone entries, which are re-validated like any other when retried
+            for remind_at, schedule_id, original_start, _ in due:
+                heapq.heappush(self.heap, (remind_at, schedule_id, original_start, MOVED))
+            raise
+
+    def _dispatch(self, due, now):
+        ids = {schedule_id for _, schedule_id, _, _ in due}
+        schedules = StudySchedule.objects.filter(id__in=ids, is_active=True).only(*SCHEDULE_FIELDS).in_bulk()
+        exceptions = {
+            (exception.schedule_id, exception.original_start): exception
+            for exception in ScheduleOccurrenceException.objects.filter(
+                schedule_id__in=schedules, original_start__in={original for _, _, original, _ in due},
+            )
+        }
+
+        notifications = []
+        sending = {}
+        for remind_at, schedule_id, original_start, kind in due:
+            schedule = schedules.get(schedule_id)
+            if schedule is None:
+                continue  # deleted or deactivated
+            if kind == SERIES:
+                if _next_occurrence(schedule, original_start) != original_start:
+                    # Edited so this occurrence no longer exists; queue whatever is next instead
+                    self._queue_series(schedule, now + timedelta(minutes=schedule.reminder_minutes_before))
+                    continue
+                if _remind_at(schedule, original_start) > now:
+                    # The reminder was shortened since queueing; wait for the new instant
+                    self._queue_series(schedule, original_start)
+                    continue
+                self._queue_series(schedule, original_start + timedelta(microseconds=1))
+
+            exception = exceptions.get((schedule_id, original_start))
+            if exception is not None and exception.is_cancelled:
+                continue
+            start = exception.scheduled_start if exception and exception.scheduled_start else original_start
+            if _remind_at(schedule, start) > now:
+                continue  # moved later; refill or poll queues it as MOVED
+            if (schedule_id, original_start) in self.sent or (schedule_id, original_start) in sending:
+                continue
+            sending[(schedule_id, original_start)] = remind_at
+
+            title = exception.title if exception and exception.title else schedule.title
+            local_start = timezone.localtime(start, user_timezone(schedule.user_id))
+            notifications.append(Notification(
+                user_id=schedule.user_id,
+                notification_type='goal',
+                title=f'⏰ Coming up: {title}',
+                message=f'Starts at {local_start:%H:%M} on {local_start:%b %d}.',
+                link='/study/schedule/calendar/',
+                created_at=now,
+            ))
+
+        deliver(notifications, batch_size=self.batch_size)
+        self.sent.update(sending)
+        self.dispatched += len(notifications)
+        return notifications
+
+    # ---- loop --------------------------------------------------------------
+
+    def step(self):
+        """Do whatever is due now and return when to wake next"""
+        now = self.clock.now()
+        if self.horizon_end is None or now >= self.horizon_end:
+            self.refill(now)
+        if self.next_poll is None or now >= self.next_poll:
+            self.poll(now)
+        self.dispatch_due(now)
+        wake = min(self.horizon_end, self.next_poll)
+        if self.heap:
+            wake = min(wake, self.heap[0][0])
+        return wake
+
+    def run(self, until=None):
+        failures = 0
+        while until is None or self.clock.now() < until:
+            # Never under a caller's open transaction, which closing would break
+            if not connection.in_atomic_block:
+                close_old_connections()
+            try:
+                wake = self.step()
+                failures = 0
+            except Exception:
+                failures += 1
+                delay = min(BACKOFF * 2 ** (failures - 1), MAX_BACKOFF)
+                logger.exception('Reminder step failed (%d in a row); retrying in %s', failures, delay)
+                # Refill and poll again in case the failure interrupted either
+                self.horizon_end = self.next_poll = None
+                wake = self.clock.now() + delay
+            if until is not None:
+                wake = min(wake, until)
+            delay = (wake - self.clock.now()).total_seconds()
+            if delay > 0:
+                self.clock.sleep(delay)
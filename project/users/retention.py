@@ -0,0 +1,106 @@
+"""
+Retention for the tables that grow with every user action.
+
+Read notifications older than NOTIFICATION_RETENTION_DAYS are folded into a
+NotificationDigest per user and month (how many of each type there were)
+and deleted. UserActivity rows older than ACTIVITY_RETENTION_DAYS move to
+UserActivityArchive and drop out of the activity feeds (users.feed). Both walk the table in primary-key order, one batch of
+RETENTION_BATCH_SIZE rows per transaction, so locks stay short and an
+interrupted run simply continues next time.
+
+The deletes skip the per-row post_delete receivers: the work they would do
+per row (cache version bumps and conditional-response stamps) is done once
+per user and batch instead. Unread notifications are never compacted, so
+Profile.unread_notifications is unaffected.
+"""
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .conditional import touch_many
+from .models import (
+    FeedEntry, GroupFeedEntry, Notification, NotificationDigest, UserActivity, UserActivityArchive,
+)
+from .notifications import bump_versions
+
+
+def _batches(queryset, batch_size):
+    last_pk = 0
+    while True:
+        batch = list(queryset.filter(pk__gt=last_pk).order_by('pk')[:batch_size])
+        if not batch:
+            return
+        yield batch
+        last_pk = batch[-1].pk
+
+
+def _raw_delete(model, pks):
+    # Bypasses the collector, which would load every row again to send post_delete
+    model.objects.filter(pk__in=pks)._raw_delete(model.objects.db)
+
+
+def compact_notifications(days=None, batch_size=None):
+    """Fold read notifications older than ``days`` into monthly digests; returns how many were removed"""
+    days = settings.NOTIFICATION_RETENTION_DAYS if days is None else days
+    batch_size = batch_size or settings.RETENTION_BATCH_SIZE
+    old = Notification.objects.filter(is_read=True, created_at__lt=timezone.now() - timedelta(days=days))
+    removed = 0
+    for batch in _batches(old.only('pk', 'user_id', 'notification_type', 'created_at'), batch_size):
+        tallies = defaultdict(Counter)
+        for notification in batch:
+            month = timezone.localdate(notification.created_at).replace(day=1)
+            tallies[notification.user_id, month][notification.notification_type] += 1
+
+        with transaction.atomic():
+            existing = NotificationDigest.objects.select_for_update().filter(
+                user_id__in={user_id for user_id, month in tallies},
+                month__in={month for user_id, month in tallies},
+            )
+            digests = {(digest.user_id, digest.month): digest for digest in existing}
+            created = []
+            for (user_id, month), tally in tallies.items():
+                digest = digests.get((user_id, month))
+                if digest is None:
+                    created.append(NotificationDigest(
+                        user_id=user_id, month=month, total=sum(tally.values()), counts=dict(tally),
+                    ))
+                    continue
+                digest.counts = dict(Counter(digest.counts) + tally)
+                digest.total += sum(tally.values())
+            NotificationDigest.objects.bulk_update(
+                [digests[key] for key in tallies if key in digests], ['total', 'counts'],
+            )
+            NotificationDigest.objects.bulk_create(created)
+            _raw_delete(Notification, [notification.pk for notification in batch])
+
+        bump_versions({user_id for user_id, month in tallies})
+        removed += len(batch)
+    return removed
+
+
+def archive_activity(days=None, batch_size=None):
+    """Move UserActivity rows older than ``days`` to UserActivityArchive; returns how many moved"""
+    days = settings.ACTIVITY_RETENTION_DAYS if days is None else days
+    batch_size = batch_size or settings.RETENTION_BATCH_SIZE
+    old = UserActivity.objects.filter(created_at__lt=timezone.now() - timedelta(days=days))
+    moved = 0
+    for batch in _batches(old, batch_size):
+        with transaction.atomic():
+            UserActivityArchive.objects.bulk_create([
+                UserActivityArchive(
+                    id=activity.pk, user_id=activity.user_id, activity_type=activity.activity_type,
+                    description=activity.description, link=activity.link, created_at=activity.created_at,
+                )
+                for activity in batch
+            ], ignore_conflicts=True)
+            pks = [activity.pk for activity in batch]
+            FeedEntry.objects.filter(activity_id__in=pks).delete()
+            GroupFeedEntry.objects.filter(activity_id__in=pks).delete()
+            _raw_delete(UserActivity, pks)
+
+        touch_many('activity', {activity.user_id for activity in batch})
+        moved += len(batch)
+    return moved
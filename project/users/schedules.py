@@ -0,0 +1,128 @@
+"""
+Occurrence expansion for recurring study schedules.
+
+expand_schedules() turns the schedules that can touch a time window into
+the occurrences inside it. Each series is a generator that jumps straight to
+the first occurrence near the window rather than stepping from the series
+start, and heapq.merge interleaves the series lazily in start order, so a
+month view costs work proportional to the events shown. Recurrence steps are
+taken in local wall-clock time so a 9:00 session stays at 9:00 across DST.
+ScheduleOccurrenceException rows cancel or override single occurrences.
+"""
+import calendar
+import heapq
+from collections import namedtuple
+from datetime import timedelta
+from operator import attrgetter
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import StudySchedule, ScheduleOccurrenceException
+
+# Occurrences that began this long before a window may still be running inside it
+LOOKBACK = timedelta(days=1)
+MAX_WINDOW = timedelta(days=366)
+
+Occurrence = namedtuple(
+    'Occurrence',
+    'schedule original_start scheduled_start scheduled_end title description is_override',
+)
+
+
+def _add_months(value, months):
+    month_index = value.month - 1 + months
+    year, month = value.year + month_index // 12, month_index % 12 + 1
+    # The 31st of a series falls on the last day of shorter months
+    return value.replace(year=year, month=month, day=min(value.day, calendar.monthrange(year, month)[1]))
+
+
+def iter_series_starts(schedule, after, tz=None):
+    """Yield the start of every occurrence of ``schedule`` at or after ``after``, forever"""
+    if schedule.recurrence == 'none':
+        if schedule.scheduled_start >= after:
+            yield schedule.scheduled_start
+        return
+
+    tz = tz or timezone.get_current_timezone()
+    first = timezone.localtime(schedule.scheduled_start, tz).replace(tzinfo=None)
+    target = timezone.localtime(after, tz).replace(tzinfo=None)
+
+    if schedule.recurrence == 'monthly':
+        n = max(0, (target.year - first.year) * 12 + target.month - first.month - 1)
+        step = lambda n: _add_months(first, n)
+    else:
+        days = 7 if schedule.recurrence == 'weekly' else 1
+        n = max(0, (target - first).days // days - 1)
+        step = lambda n: first + timedelta(days=days * n)
+
+    while True:
+        start = timezone.make_aware(step(n), tz)
+        if start >= after:
+            yield start
+        n += 1
+
+
+def is_occurrence(schedule, start, tz=None):
+    """Whether ``start`` is the start of one of the series' occurrences"""
+    return next(iter_series_starts(schedule, start, tz), None) == start
+
+
+def iter_occurrences(schedule, start, end, skip=frozenset(), tz=None):
+    """Yield the series' unmodified occurrences overlapping [start, end)"""
+    span = schedule.span
+    for original in iter_series_starts(schedule, start - span, tz):
+        if original >= end or (schedule.recurrence_until and original > schedule.recurrence_until):
+            return
+        if original in skip or (original < start and original + span <= start):
+            continue
+        yield Occurrence(
+            schedule, original, original, original + span if span else None,
+            schedule.title, schedule.description, False,
+        )
+
+
+def _override(schedule, exception):
+    start = exception.scheduled_start or exception.original_start
+    end = exception.scheduled_end or (start + schedule.span if schedule.span else None)
+    return Occurrence(
+        schedule, exception.original_start, start, end,
+        exception.title or schedule.title, exception.description or schedule.description, True,
+    )
+
+
+def expand_schedules(user, start, end, tz=None):
+    """Iterate over the user's occurrences overlapping [start, end) in start order"""
+    if end <= start:
+        raise ValueError('The window must end after it starts.')
+    if end - start > MAX_WINDOW:
+        raise ValueError(f'The window may span at most {MAX_WINDOW.days} days.')
+
+    schedules = {
+        schedule.id: schedule
+        for schedule in StudySchedule.objects.filter(user=user, is_active=True).overlapping(start - LOOKBACK, end)
+    }
+    earliest = start - LOOKBACK
+    exceptions = ScheduleOccurrenceException.objects.filter(schedule_id__in=schedules).filter(
+        Q(original_start__gte=earliest, original_start__lt=end)
+        | Q(scheduled_start__gte=earliest, scheduled_start__lt=end)
+    )
+
+    skip = {}
+    overrides = []
+    for exception in exceptions:
+        schedule = schedules[exception.schedule_id]
+        skip.setdefault(schedule.id, set()).add(exception.original_start)
+        if exception.is_cancelled:
+            continue
+        occurrence = _override(schedule, exception)
+        occurrence_end = occurrence.scheduled_end or occurrence.scheduled_start
+        if occurrence.scheduled_start < end and (occurrence_end > start or occurrence.scheduled_start >= start):
+            overrides.append(occurrence)
+    overrides.sort(key=attrgetter('scheduled_start'))
+
+    series = [
+        iter_occurrences(schedule, start, end, skip.get(schedule.id, frozenset()), tz)
+        for schedule in schedules.values()
+    ]
+    return heapq.merge(*series, overrides, key=attrgetter('scheduled_start'))
@@ -0,0 +1,231 @@
+"""
+Full-text search over study notes.
+
+The backend is chosen from the default database's vendor:
+
+* PostgreSQL: StudyNote.search_vector (title weighted A, tags B, content C)
+  behind a GIN index, ranked with ts_rank and excerpted with ts_headline.
+* SQLite: an FTS5 table (users_studynote_fts) ranked with bm25() and
+  excerpted with snippet().
+* Anything else: the old icontains filter, unranked.
+
+users.signals keeps the index in step with note saves and deletes, and
+``manage.py rebuild_search_index`` rebuilds it after bulk writes. search()
+returns a lazily evaluated result set that Django's Paginator can page;
+each note on a page carries ``search_rank`` and an HTML-safe
+``search_snippet`` with the matched terms in <mark>.
+"""
+import re
+
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import F, Q
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import StudyNote
+
+SEARCH_CONFIG = 'english'
+SNIPPET_WORDS = 24
+FTS_TABLE = 'users_studynote_fts'
+
+# Highlight markers that cannot occur in user text, swapped for <mark> after escaping
+START_SEL, STOP_SEL = '\x02', '\x03'
+
+
+def highlight(snippet):
+    if not snippet:
+        return ''
+    return mark_safe(escape(snippet).replace(START_SEL, '<mark>').replace(STOP_SEL, '</mark>'))
+
+
+class SearchResults:
+    """A ranked, sliceable view of the notes matching a query, for Paginator"""
+
+    def __init__(self, backend, notes, query):
+        self.backend = backend
+        self.notes = notes
+        self.query = query
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            self._count = self.backend.count(self.notes, self.query)
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop = index.start or 0, index.stop
+            return self.backend.page(self.notes, self.query, start, None if stop is None else stop - start)
+        return self.backend.page(self.notes, self.query, index, 1)[0]
+
+
+class NoteSearchBackend:
+    """Interface: keep an index of notes and answer ranked queries against it"""
+
+    def index(self, notes):
+        """(Re)index the given notes"""
+
+    def remove(self, note_ids):
+        """Drop the given note ids from the index"""
+
+    def rebuild(self):
+        """Reindex every note; returns the number indexed"""
+        return StudyNote.objects.count()
+
+    def search(self, notes, query):
+        """Rank the notes in queryset ``notes`` matching ``query``"""
+        return SearchResults(self, notes, query)
+
+    def count(self, notes, query):
+        raise NotImplementedError
+
+    def page(self, notes, query, offset, limit):
+        raise NotImplementedError
+
+
+class LikeSearchBackend(NoteSearchBackend):
+    """Unindexed substring matching, for databases without a full-text engine"""
+
+    def _matching(self, notes, query):
+        return notes.filter(Q(title__icontains=query) | Q(content__icontains=query) | Q(tags__icontains=query))
+
+    def count(self, notes, query):
+        return self._matching(notes, query).count()
+
+    def page(self, notes, query, offset, limit):
+        page = self._matching(notes, query).select_related('category', 'course')
+        page = list(page[offset:offset + limit] if limit is not None else page[offset:])
+        for note in page:
+            note.search_rank = None
+            note.search_snippet = ''
+        return page
+
+
+class PostgresSearchBackend(NoteSearchBackend):
+    def _vector(self):
+        return (
+            SearchVector('title', weight='A', config=SEARCH_CONFIG)
+            + SearchVector('tags', weight='B', config=SEARCH_CONFIG)
+            + SearchVector('content', weight='C', config=SEARCH_CONFIG)
+        )
+
+    def _query(self, query):
+        return SearchQuery(query, search_type='websearch', config=SEARCH_CONFIG)
+
+    def index(self, notes):
+        StudyNote.objects.filter(pk__in=[note.pk for note in notes]).update(search_vector=self._vector())
+
+    def rebuild(self):
+        return StudyNote.objects.update(search_vector=self._vector())
+
+    def count(self, notes, query):
+        return notes.filter(search_vector=self._query(query)).count()
+
+    def page(self, notes, query, offset, limit):
+        search_query = self._query(query)
+        ranked = (
+            notes.filter(search_vector=search_query)
+            .annotate(
+                search_rank=SearchRank(F('search_vector'), search_query),
+                raw_snippet=SearchHeadline(
+                    'content', search_query, config=SEARCH_CONFIG,
+                    start_sel=START_SEL, stop_sel=STOP_SEL, max_words=SNIPPET_WORDS, min_words=SNIPPET_WORDS // 2,
+                ),
+            )
+            .select_related('category', 'course')
+            .order_by('-search_rank', '-updated_at')
+        )
+        page = list(ranked[offset:offset + limit] if limit is not None else ranked[offset:])
+        for note in page:
+            note.search_snippet = highlight(note.raw_snippet)
+        return page
+
+
+class SQLiteSearchBackend(NoteSearchBackend):
+    # bm25() column weights for title, tags, content
+    WEIGHTS = (10.0, 5.0, 1.0)
+
+    def _match(self, query):
+        # Quote each word so user input cannot use FTS5 query syntax; the last word matches as a prefix
+        terms = ['"{}"'.format(term.replace('"', '""')) for term in re.findall(r'\w+', query)]
+        if terms:
+            terms[-1] += '*'
+        return ' '.join(terms)
+
+    def _restrict(self, notes):
+        sql, params = notes.order_by().values('pk').query.sql_with_params()
+        # Unary + stops FTS5 from driving the query by rowid, one MATCH lookup per candidate note
+        return f'+rowid IN ({sql})', params
+
+    def index(self, notes):
+        rows = [(note.pk, note.title, note.tags, note.content) for note in notes]
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(row[0],) for row in rows])
+            cursor.executemany(f'INSERT INTO {FTS_TABLE} (rowid, title, tags, content) VALUES (%s, %s, %s, %s)', rows)
+
+    def remove(self, note_ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [(note_id,) for note_id in note_ids])
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, title, tags, content) '
+                f'SELECT id, title, tags, content FROM {StudyNote._meta.db_table}'
+            )
+            cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+        return StudyNote.objects.count()
+
+    def count(self, notes, query):
+        match = self._match(query)
+        if not match:
+            return 0
+        restrict, params = self._restrict(notes)
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND {restrict}', [match, *params])
+            return cursor.fetchone()[0]
+
+    def page(self, notes, query, offset, limit):
+        match = self._match(query)
+        if not match:
+            return []
+        restrict, params = self._restrict(notes)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid, bm25({FTS_TABLE}, %s, %s, %s) AS rank, '
+                f"snippet({FTS_TABLE}, -1, %s, %s, '…', %s) "
+                f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND {restrict} '
+                f'ORDER BY rank LIMIT %s OFFSET %s',
+                [*self.WEIGHTS, START_SEL, STOP_SEL, SNIPPET_WORDS, match, *params,
+                 -1 if limit is None else limit, offset],
+            )
+            hits = cursor.fetchall()
+
+        by_id = StudyNote.objects.select_related('category', 'course').in_bulk([hit[0] for hit in hits])
+        page = []
+        for note_id, rank, snippet in hits:
+            note = by_id[note_id]
+            # bm25() is lower for better matches
+            note.search_rank = -rank
+            note.search_snippet = highlight(snippet)
+            page.append(note)
+        return page
+
+
+BACKENDS = {
+    'postgresql': PostgresSearchBackend,
+    'sqlite': SQLiteSearchBackend,
+}
+
+
+def get_search_backend():
+    return BACKENDS.get(connection.vendor, LikeSearchBackend)()
+
+
+def search_notes(notes, query):
+    return get_search_backend().search(notes, query)
@@ -1,13 +1,234 @@
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save   #fires a signal when the user is created
+from django.db.models.signals import post_save, pre_delete, post_delete   #fires a signal when the user is created
+from django.db import transaction
+from django.db.models import F, QuerySet
+from django.db.models.functions import Greatest
 from django.dispatch import receiver
-from .models import Profile
+from django.urls import reverse
+from django.utils import timezone
+from courses.models import Course
+from .badges import METRIC_TRIGGERS, evaluate_badges
+from .conditional import touch
+from .search import get_search_backend
+from .dashboard import UserDashboardSnapshot
+from .feed import record_activity
+from .images import image_fields, schedule_renditions
+from .models import (
+    Profile, DailyStudyRollup, Notification, UserBadge, UserActivity, StudySchedule, ScheduleOccurrenceException, Badge,
+    StudyNote, SharedResource, StudyGroup, GroupMembership, Discussion, DiscussionReply,
+)
+from .notifications import bump_version, recount_unread
+from .periods import remember_timezone
 
 @receiver(post_save,sender=User)
 def create_profile(sender, instance, created, **kwargs):
     if created:
         Profile.objects.create(user=instance)
 
+
+@receiver(post_save, sender=Profile)
+def profile_timezone_changed(sender, instance, created=False, update_fields=None, **kwargs):
+    if update_fields is not None and 'time_zone' not in update_fields:
+        return
+    # Again after commit, in case a concurrent request cached the old zone meanwhile
+    user_id, name = instance.user_id, instance.time_zone
+    remember_timezone(user_id, name)
+    transaction.on_commit(lambda: remember_timezone(user_id, name))
+    moved = not created and getattr(instance, 'loaded_time_zone', None) != name
+    instance.loaded_time_zone = name
+    if moved:
+        # Study days, hour buckets and period totals were all cut at the old zone's midnight
+        def rebucket():
+            DailyStudyRollup.rebuild(user=user_id)
+            UserDashboardSnapshot.invalidate(user_id)
+        transaction.on_commit(rebucket)
+
+
+def invalidate_dashboard_snapshot(sender, instance, **kwargs):
+    # Wait for commit so a concurrent page load cannot re-cache pre-commit totals
+    fields = UserDashboardSnapshot.FIELDS_BY_MODEL[sender]
+    transaction.on_commit(lambda: UserDashboardSnapshot.invalidate(instance.user_id, *fields))
+
+
+for snapshot_model in UserDashboardSnapshot.FIELDS_BY_MODEL:
+    post_save.connect(invalidate_dashboard_snapshot, sender=snapshot_model)
+    post_delete.connect(invalidate_dashboard_snapshot, sender=snapshot_model)
+
+
+def evaluate_badges_for_change(sender, instance, created=False, **kwargs):
+    user_field, metrics, on_create_only = METRIC_TRIGGERS[sender]
+    if on_create_only and not created:
+        return
+    user_id = getattr(instance, user_field)
+    transaction.on_commit(lambda: evaluate_badges(user_id, metrics))
+
+
+for trigger_model in METRIC_TRIGGERS:
+    post_save.connect(evaluate_badges_for_change, sender=trigger_model)
+
+
+@receiver(post_save, sender=StudyNote)
+def index_note(sender, instance, **kwargs):
+    get_search_backend().index([instance])
+    instance.sync_tags()
+
+
+@receiver(post_delete, sender=StudyNote)
+def unindex_note(sender, instance, **kwargs):
+    get_search_backend().remove([instance.pk])
+
+
+@receiver(post_save, sender=StudyNote)
+def note_activity(sender, instance, created, **kwargs):
+    if created:
+        # Notes are private: the feed says that one was written, not what it says
+        record_activity(instance.user_id, 'note_created', 'Wrote a study note')
+
+
+@receiver(post_save, sender=SharedResource)
+def resource_activity(sender, instance, created, **kwargs):
+    if created and instance.is_public:
+        record_activity(
+            instance.user_id, 'resource_shared', f'Shared {instance.title}',
+            reverse('resource_view', args=[instance.pk]),
+        )
+
+
+@receiver(post_save, sender=Discussion)
+def discussion_activity(sender, instance, created, **kwargs):
+    if created:
+        # Only the discussion's own group can open it
+        record_activity(
+            instance.author_id, 'discussion_posted', f'Started the discussion "{instance.title}"',
+            reverse('discussion_detail', args=[instance.pk]), group_ids=[instance.group_id],
+        )
+
+
+@receiver(post_save, sender=Notification)
+def notification_saved(sender, instance, created, **kwargs):
+    # users.notifications.deliver() does this for bulk_create; edits (the admin) may flip is_read
+    if not created:
+        recount_unread([instance.user_id])
+    elif not instance.is_read:
+        Profile.objects.filter(user_id=instance.user_id).update(
+            unread_notifications=F('unread_notifications') + 1
+        )
+    transaction.on_commit(lambda: bump_version(instance.user_id))
+
+
+@receiver(post_delete, sender=Notification)
+def notification_deleted(sender, instance, origin=None, **kwargs):
+    if deleted_along_with(origin, User):
+        return
+    if not instance.is_read:
+        Profile.objects.filter(user_id=instance.user_id).update(
+            unread_notifications=Greatest(F('unread_notifications') - 1, 0)
+        )
+    transaction.on_commit(lambda: bump_version(instance.user_id))
+
+
+def image_saved(sender, instance, update_fields=None, **kwargs):
+    for field_name, specs in RENDITION_FIELDS[sender]:
+        if update_fields is not None and field_name not in update_fields:
+            continue
+        name = getattr(instance, field_name).name
+        if name:
+            # A no-op once current renditions exist, so unchanged images cost one read off the request path
+            transaction.on_commit(lambda name=name, specs=specs: schedule_renditions(name, specs))
+
+
+RENDITION_FIELDS = {}
+for image_model, image_field, image_specs in image_fields():
+    RENDITION_FIELDS.setdefault(image_model, []).append((image_field, image_specs))
+for image_model in RENDITION_FIELDS:
+    post_save.connect(image_saved, sender=image_model)
+
+
+def deleted_along_with(origin, *models):
+    # True when a delete started from one of ``models`` (an instance or a queryset) cascaded here
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return model in models
+
+
+@receiver(post_save, sender=GroupMembership)
+def membership_added(sender, instance, created, **kwargs):
+    if created and not getattr(instance, '_counted', False):
+        StudyGroup.objects.filter(pk=instance.group_id).update(member_count=F('member_count') + 1)
+
+
+@receiver(post_delete, sender=GroupMembership)
+def membership_removed(sender, instance, origin=None, **kwargs):
+    if deleted_along_with(origin, StudyGroup):
+        return
+    StudyGroup.objects.filter(pk=instance.group_id, member_count__gt=0).update(member_count=F('member_count') - 1)
+
+
+@receiver(post_save, sender=DiscussionReply)
+def reply_added(sender, instance, created, **kwargs):
+    if created:
+        Discussion.objects.filter(pk=instance.discussion_id).update(
+            reply_count=F('reply_count') + 1,
+            last_activity_at=Greatest('last_activity_at', instance.created_at),
+        )
+
+
+@receiver(post_delete, sender=DiscussionReply)
+def reply_removed(sender, instance, origin=None, **kwargs):
+    # Removing a reply leaves last_activity_at alone: the activity still happened
+    if deleted_along_with(origin, Discussion, StudyGroup):
+        return
+    Discussion.objects.filter(pk=instance.discussion_id, reply_count__gt=0).update(reply_count=F('reply_count') - 1)
+
+
+# Conditional-response resources (users.conditional) that each model's rows belong to
+CONDITIONAL_RESOURCES = {
+    UserBadge: 'badges',
+    UserActivity: 'activity',
+    StudySchedule: 'schedule',
+}
+
+
+def touch_conditional_resource(sender, instance, **kwargs):
+    transaction.on_commit(lambda: touch(CONDITIONAL_RESOURCES[sender], instance.user_id))
+
+
+for conditional_model in CONDITIONAL_RESOURCES:
+    post_save.connect(touch_conditional_resource, sender=conditional_model)
+    post_delete.connect(touch_conditional_resource, sender=conditional_model)
+
+
+@receiver([post_save, post_delete], sender=ScheduleOccurrenceException)
+def schedule_exception_changed(sender, instance, **kwargs):
+    # A cascade from deleting the schedule is covered by the schedule's own receiver
+    # Touching the schedule also lets the reminder scheduler's change poll see the edit
+    StudySchedule.objects.filter(pk=instance.schedule_id).update(updated_at=timezone.now())
+    user_id = StudySchedule.objects.filter(pk=instance.schedule_id).values_list('user_id', flat=True).first()
+    if user_id is not None:
+        transaction.on_commit(lambda: touch('schedule', user_id))
+
+
+@receiver([post_save, post_delete], sender=Badge)
+def badge_catalog_changed(sender, instance, **kwargs):
+    transaction.on_commit(lambda: touch('badge_catalog'))
+
+
+@receiver(pre_delete, sender=Course)
+def remember_course_rollup_days(sender, instance, **kwargs):
+    # Deleting a course cascades its rollups while its sessions move to "no course",
+    # so note the affected days and rebuild them once the delete has happened
+    instance._rollup_days = list(
+        DailyStudyRollup.objects.filter(course=instance).values_list('user_id', 'date')
+    )
+
+
+@receiver(post_delete, sender=Course)
+def rebuild_course_rollup_days(sender, instance, **kwargs):
+    days_by_user = {}
+    for user_id, day in getattr(instance, '_rollup_days', []):
+        days_by_user.setdefault(user_id, set()).add(day)
+    for user_id, days in days_by_user.items():
+        DailyStudyRollup.rebuild(user=user_id, dates=days)
+
 # Commenting out save_profile to prevent duplicate creation loops
 # @receiver(post_save,sender=User)
 # def save_profile(sender, instance, created=False, **kwargs):
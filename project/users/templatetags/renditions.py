@@ -0,0 +1,18 @@
+from django import template
+
+from ..images import FORMATS, get_manifest
+
+register = template.Library()
+
+
+@register.simple_tag
+def rendition(image, spec, fmt='webp'):
+    """URL of the ``spec`` rendition of an ImageField value, or of the original until it has been generated"""
+    if not image:
+        return ''
+    manifest = get_manifest(image.name)
+    # Settle for the same size in another format before falling back to the full-size original
+    for candidate in [fmt, *FORMATS]:
+        if (spec, candidate) in manifest:
+            return manifest[(spec, candidate)]
+    return image.url
@@ -1,3 +1,1516 @@
-from django.test import TestCase
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+from importlib import import_module
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.apps import apps as django_apps
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.db.models import Q
+from django.core.paginator import Paginator
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+from PIL import Image
+
+from courses.models import Course
+from .analytics import compute_user_analytics
+from .badges import BADGE_METRICS, evaluate_badges
+from .dashboard import UserDashboardSnapshot
+from .downloads import parse_range, serve_file
+from .images import generate_renditions, manifest_key
+from .models import (
+    MAX_REPLY_DEPTH, Badge, DailyStudyRollup, Discussion, DiscussionReply, FeedEntry, GroupFeedEntry, GroupMembership,
+    ImageRendition, Notification, NotificationDigest, Profile, ResourceBlob, ScheduleOccurrenceException,
+    SharedResource, StudyGroup, StudyGoal, StudyNote, StudySchedule, StudySession, Tag, UploadSession, UserActivity,
+    UserActivityArchive, UserBadge, normalize_tags, study_day,
+)
+from .pagination import CursorPaginator, InvalidCursor, RowComparison
+from .periods import get_zone, period_window
+from .search import search_notes
+from .notifications import STREAM_BATCH_SIZE, deliver, mark_read, notify_many, recount_unread, unread_count
+from .reminders import ReminderScheduler, SimulatedClock
+from .retention import archive_activity, compact_notifications
+from .schedules import MAX_WINDOW, _add_months, expand_schedules
+from .threads import BRANCHES_PER_PAGE, INLINE_DEPTH, load_thread
+from . import counters, uploads
+
+
+def at(*args):
+    return timezone.make_aware(datetime(*args))
+
+
+def shared_cache(test):
+    """Settings swapping the per-process default cache for a file-based one, as with CACHE_DIR"""
+    location = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, location, ignore_errors=True)
+    return override_settings(CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location},
+    })
+
+
+class ReminderSchedulerTests(TestCase):
+    """Drives the reminder loop with a simulated clock"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='reminders', password='pw')
+        self.clock = SimulatedClock(at(2024, 3, 1, 0, 0))
+        self.scheduler = ReminderScheduler(
+            clock=self.clock, horizon=timedelta(hours=6), poll_interval=timedelta(minutes=10),
+        )
+
+    def schedule(self, start, **fields):
+        fields.setdefault('reminder_minutes_before', 15)
+        return StudySchedule.objects.create(user=self.user, title='Revision', scheduled_start=start, **fields)
+
+    def reminder_times(self):
+        return list(
+            Notification.objects.filter(user=self.user, notification_type='goal')
+            .order_by('created_at').values_list('created_at', flat=True)
+        )
+
+    def test_recurring_series_reminds_before_each_occurrence(self):
+        self.schedule(at(2024, 2, 20, 9, 0), recurrence='daily', is_recurring=True)
+        self.scheduler.run(until=at(2024, 3, 4, 0, 0))
+        self.assertEqual(self.reminder_times(), [
+            at(2024, 3, 1, 8, 45), at(2024, 3, 2, 8, 45), at(2024, 3, 3, 8, 45),
+        ])
+
+    def test_sleeps_until_the_next_reminder(self):
+        self.schedule(at(2024, 3, 1, 2, 0))
+        self.assertEqual(self.scheduler.step(), at(2024, 3, 1, 0, 10))  # next change poll
+        self.scheduler.next_poll = at(2024, 3, 1, 3, 0)
+        self.assertEqual(self.scheduler.step(), at(2024, 3, 1, 1, 45))
+
+    def test_failed_steps_are_logged_and_retried(self):
+        self.schedule(at(2024, 3, 1, 2, 0), recurrence='daily', is_recurring=True)
+        outage = [DatabaseError('server closed the connection')] * 2
+
+        def flaky_deliver(notifications, batch_size):
+            if outage:
+                raise outage.pop()
+            return deliver(notifications, batch_size=batch_size)
+
+        with mock.patch('users.reminders.deliver', flaky_deliver), self.assertLogs('users.reminders', 'ERROR') as logs:
+            self.scheduler.run(until=at(2024, 3, 3, 0, 0))
+        self.assertEqual(len(logs.records), 2)
+        # Retried after 5s, then 10s more, and nothing lost or sent twice
+        self.assertEqual(self.reminder_times(), [at(2024, 3, 1, 1, 45, 15), at(2024, 3, 2, 1, 45)])
+
+    def test_edits_and_deletes_after_queueing(self):
+        moved = self.schedule(at(2024, 3, 1, 2, 0))
+        deleted = self.schedule(at(2024, 3, 1, 3, 0))
+        self.scheduler.step()
+
+        moved.scheduled_start = at(2024, 3, 1, 4, 0)
+        moved.save()
+        deleted.delete()
+        added = self.schedule(at(2024, 3, 1, 5, 0), reminder_minutes_before=60)
+
+        self.scheduler.run(until=at(2024, 3, 2, 0, 0))
+        self.assertEqual(self.reminder_times(), [at(2024, 3, 1, 3, 45), at(2024, 3, 1, 4, 0)])
+        self.assertEqual(self.scheduler.dispatched, 2)
+        self.assertNotIn(added.id, self.scheduler.queued)
+
+    def test_cancelled_and_overridden_occurrences(self):
+        series = self.schedule(at(2024, 3, 1, 9, 0), recurrence='daily', is_recurring=True)
+        ScheduleOccurrenceException.objects.create(
+            schedule=series, original_start=at(2024, 3, 1, 9, 0), is_cancelled=True,
+        )
+        ScheduleOccurrenceException.objects.create(
+            schedule=series, original_start=at(2024, 3, 2, 9, 0),
+            scheduled_start=at(2024, 3, 2, 14, 0), title='Moved revision',
+        )
+        self.scheduler.run(until=at(2024, 3, 4, 0, 0))
+
+        self.assertEqual(self.reminder_times(), [at(2024, 3, 2, 13, 45), at(2024, 3, 3, 8, 45)])
+        self.assertTrue(Notification.objects.filter(title__contains='Moved revision').exists())
+
+    def test_memory_is_one_entry_per_schedule(self):
+        self.schedule(at(2024, 2, 1, 0, 10), recurrence='daily', is_recurring=True, reminder_minutes_before=5)
+        self.schedule(at(2024, 3, 20, 9, 0))
+        self.scheduler.step()
+        self.assertEqual(len(self.scheduler.heap), 1)
+
+
+class ScheduleExpansionTests(TestCase):
+    """Recurring schedules expand into the occurrences of a window, with per-occurrence exceptions"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='planner', password='pw')
+        self.client.force_login(self.user)
+
+    def schedule(self, start, recurrence='daily', **fields):
+        return StudySchedule.objects.create(
+            user=self.user, title='Revision', scheduled_start=start, recurrence=recurrence,
+            is_recurring=recurrence != 'none', **fields,
+        )
+
+    def starts(self, start, end, tz=None):
+        return [occurrence.scheduled_start for occurrence in expand_schedules(self.user, start, end, tz)]
+
+    def test_month_end_days_clamp_to_shorter_months(self):
+        self.assertEqual(_add_months(datetime(2023, 1, 31, 9), 1), datetime(2023, 2, 28, 9))
+        self.assertEqual(_add_months(datetime(2023, 12, 31, 9), 2), datetime(2024, 2, 29, 9))
+        self.schedule(at(2024, 1, 31, 9), 'monthly')
+        # Each month counts from the series start, so March is back on the 31st
+        self.assertEqual(self.starts(at(2024, 1, 1), at(2024, 5, 1)), [
+            at(2024, 1, 31, 9), at(2024, 2, 29, 9), at(2024, 3, 31, 9), at(2024, 4, 30, 9),
+        ])
+
+    def test_steps_keep_the_wall_clock_time_across_dst(self):
+        tz = get_zone('America/New_York')
+        self.schedule(datetime(2024, 3, 9, 9, tzinfo=tz), duration_minutes=60)
+        starts = self.starts(datetime(2024, 3, 9, tzinfo=tz), datetime(2024, 3, 12, tzinfo=tz), tz)
+        self.assertEqual([timezone.localtime(start, tz).hour for start in starts], [9, 9, 9])
+        # Clocks went forward on March 10th, so 09:00 is an hour earlier in UTC
+        self.assertEqual([start.astimezone(get_zone('UTC')).hour for start in starts], [14, 13, 13])
+
+    def test_series_stop_at_recurrence_until(self):
+        self.schedule(at(2024, 3, 1, 9), recurrence_until=at(2024, 3, 3, 9))
+        self.assertEqual(self.starts(at(2024, 3, 1), at(2024, 3, 10)), [
+            at(2024, 3, 1, 9), at(2024, 3, 2, 9), at(2024, 3, 3, 9),
+        ])
+        self.assertEqual(self.starts(at(2024, 3, 4), at(2024, 3, 10)), [])
+
+    def test_occurrences_running_into_the_window(self):
+        self.schedule(at(2024, 3, 1, 23), duration_minutes=120)
+        self.schedule(at(2024, 3, 1, 22), 'none', scheduled_end=at(2024, 3, 2, 1))
+        self.schedule(at(2024, 3, 1, 20), 'none', scheduled_end=at(2024, 3, 1, 21))  # over before the window
+        self.schedule(at(2024, 2, 28, 23), 'none', scheduled_end=at(2024, 3, 2, 1))  # past the one-day lookback
+        self.assertEqual(self.starts(at(2024, 3, 2), at(2024, 3, 3)), [
+            at(2024, 3, 1, 22), at(2024, 3, 1, 23), at(2024, 3, 2, 23),
+        ])
+
+    def test_cancelled_and_moved_occurrences(self):
+        series = self.schedule(at(2024, 2, 20, 9), duration_minutes=60)
+        exception = lambda original, **fields: ScheduleOccurrenceException.objects.create(
+            schedule=series, original_start=original, **fields,
+        )
+        exception(at(2024, 3, 2, 9), is_cancelled=True)
+        exception(at(2024, 3, 3, 9), scheduled_start=at(2024, 3, 5, 10))  # moved out of the window
+        exception(at(2024, 2, 25, 9), scheduled_start=at(2024, 3, 3, 15), title='Catch-up')  # moved into it
+        exception(at(2024, 3, 10, 9), is_cancelled=True)  # outside the window
+
+        occurrences = list(expand_schedules(self.user, at(2024, 3, 2), at(2024, 3, 4)))
+        self.assertEqual([(o.original_start, o.scheduled_start, o.title, o.is_override) for o in occurrences], [
+            (at(2024, 2, 25, 9), at(2024, 3, 3, 15), 'Catch-up', True),
+        ])
+        self.assertEqual(occurrences[0].scheduled_end, at(2024, 3, 3, 16))
+        self.assertEqual(self.starts(at(2024, 3, 5), at(2024, 3, 6)), [at(2024, 3, 5, 9), at(2024, 3, 5, 10)])
+        self.assertEqual(self.starts(at(2024, 2, 25), at(2024, 2, 26)), [])
+
+    def test_events_api_rejects_bad_windows(self):
+        url = reverse('api_schedule_events')
+        start = datetime(2024, 1, 1).date()
+        too_long = (start + MAX_WINDOW + timedelta(days=1)).isoformat()
+        for end in ('2024-01-01', '2023-12-31', too_long):
+            with self.subTest(end=end):
+                response = self.client.get(url, {'start': start.isoformat(), 'end': end})
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
+        longest = (start + MAX_WINDOW).isoformat()
+        self.assertEqual(self.client.get(url, {'start': start.isoformat(), 'end': longest}).status_code, 200)
+
+    def test_occurrence_update_view(self):
+        series = self.schedule(at(2024, 3, 1, 9), duration_minutes=60)
+        url = reverse('study_schedule_occurrence', args=[series.id])
+        events = lambda: self.client.get(reverse('api_schedule_events'), {'start': '2024-03-01', 'end': '2024-03-03'}).json()
+
+        response = self.client.post(url, {'occurrence_start': '2024-03-01T10:00:00+00:00', 'cancel': '1'})
+        self.assertEqual(response.status_code, 400)  # not an occurrence
+        self.assertEqual(self.client.post(url, {'occurrence_start': 'soon'}).status_code, 400)
+
+        self.client.post(url, {'occurrence_start': '2024-03-01T09:00:00+00:00', 'cancel': '1'})
+        self.client.post(url, {
+            'occurrence_start': '2024-03-02T09:00:00+00:00', 'scheduled_start': '2024-03-02T11:00:00+00:00',
+        })
+        self.assertEqual([(event['start'], event['is_override']) for event in events()], [
+            ('2024-03-02T11:00:00+00:00', True),
+        ])
+
+        self.client.post(url, {'occurrence_start': '2024-03-01T09:00:00+00:00', 'restore': '1'})
+        self.assertEqual(len(events()), 2)
+
+
+class GroupListingQueryTests(TestCase):
+    """Group and discussion listings cost the same number of queries however many rows they show"""
+
+    def setUp(self):
+        self.user = User.objects.create_superuser(username='lister', password='pw')
+        self.other = User.objects.create_user(username='other', password='pw')
+        self.course = Course.objects.create(title='Algebra', description='')
+        self.client.force_login(self.user)
+
+    def add_groups(self, count):
+        for i in range(count):
+            mine = StudyGroup.objects.create(name=f'Mine {i}', description='', creator=self.user, course=self.course)
+            GroupMembership.objects.create(user=self.user, group=mine, role='admin')
+            GroupMembership.objects.create(user=self.other, group=mine)
+            public = StudyGroup.objects.create(name=f'Public {i}', description='', creator=self.other, max_members=1)
+            GroupMembership.objects.create(user=self.other, group=public, role='admin')
+
+    def add_discussions(self, group, count):
+        for i in range(count):
+            discussion = Discussion.objects.create(group=group, author=self.other, title=f'Topic {i}', content='')
+            DiscussionReply.objects.create(discussion=discussion, author=self.user, content='Reply')
+
+    def query_count(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def assertConstantQueries(self, url, grow):
+        # Commit callbacks included, so cached totals are dropped as they would be in production
+        with self.captureOnCommitCallbacks(execute=True):
+            grow(2)
+        few = self.query_count(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            grow(10)
+        self.assertEqual(self.query_count(url), few)
+
+    def test_groups_list(self):
+        self.assertConstantQueries(reverse('groups_list'), self.add_groups)
+        response = self.client.get(reverse('groups_list'))
+        self.assertContains(response, '2/10 members')
+        self.assertContains(response, 'Full')
+
+    def test_group_detail_and_discussion_list(self):
+        group = StudyGroup.objects.create(name='Study', description='', creator=self.other)
+        GroupMembership.objects.create(user=self.user, group=group)
+        grow = lambda count: self.add_discussions(group, count)
+        self.assertConstantQueries(reverse('group_detail', args=[group.id]), grow)
+        self.assertConstantQueries(reverse('discussion_list', args=[group.id]), grow)
+
+    def test_admin_changelists(self):
+        self.assertConstantQueries(reverse('admin:users_studygroup_changelist'), self.add_groups)
+        group = StudyGroup.objects.first()
+        grow = lambda count: self.add_discussions(group, count)
+        self.assertConstantQueries(reverse('admin:users_discussion_changelist'), grow)
+
+    def test_viewer_annotations_match_per_row_methods(self):
+        self.add_groups(1)
+        group = StudyGroup.objects.get(name='Mine 0')
+        annotated = StudyGroup.objects.with_viewer(self.other).get(pk=group.pk)
+        self.assertEqual(annotated.is_member(self.other), group.is_member(self.other))
+        self.assertEqual(annotated.is_admin(self.other), group.is_admin(self.other))
+        # Annotated for another viewer: falls back to querying
+        self.assertTrue(annotated.is_admin(self.user))
+
+
+class GroupCounterTests(TestCase):
+    """member_count, reply_count and last_activity_at follow the rows they count"""
+
+    def setUp(self):
+        self.owner = User.objects.create_user(username='owner', password='pw')
+        self.joiner = User.objects.create_user(username='joiner', password='pw')
+        self.group = StudyGroup.objects.create(name='Study', description='', creator=self.owner, max_members=2)
+        self.group.add_member(self.owner, role='admin')
+
+    def counted(self, obj):
+        obj.refresh_from_db()
+        return obj
+
+    def test_join_stops_at_max_members(self):
+        self.client.force_login(self.joiner)
+        self.client.get(reverse('group_join', args=[self.group.id]))
+        self.assertEqual(self.counted(self.group).member_count, 2)
+
+        late = User.objects.create_user(username='late', password='pw')
+        self.assertIsNone(self.group.add_member(late))
+        self.assertEqual(self.counted(self.group).member_count, 2)
+        self.assertFalse(self.group.is_member(late))
+
+        self.client.post(reverse('group_leave', args=[self.group.id]))
+        self.assertEqual(self.counted(self.group).member_count, 1)
+
+    def test_replies_and_cascades(self):
+        discussion = Discussion.objects.create(group=self.group, author=self.owner, title='Topic', content='')
+        self.client.force_login(self.owner)
+        self.client.post(reverse('discussion_detail', args=[discussion.id]), {'content': 'First'})
+        first = DiscussionReply.objects.get()
+        self.client.post(reverse('discussion_detail', args=[discussion.id]), {'content': 'Nested', 'parent_id': first.id})
+
+        discussion = self.counted(discussion)
+        self.assertEqual(discussion.reply_count, 2)
+        self.assertEqual(discussion.last_activity_at, DiscussionReply.objects.latest('created_at').created_at)
+
+        first.delete()  # takes its nested reply with it
+        self.assertEqual(self.counted(discussion).reply_count, 0)
+
+        self.joiner.delete()
+        self.group.add_member(User.objects.create_user(username='third', password='pw'))
+        self.assertEqual(self.counted(self.group).member_count, 2)
+
+    def test_recount_groups_repairs_drift(self):
+        discussion = Discussion.objects.create(group=self.group, author=self.owner, title='Topic', content='')
+        reply = DiscussionReply.objects.create(discussion=discussion, author=self.owner, content='Reply')
+        StudyGroup.objects.update(member_count=7)
+        Discussion.objects.update(reply_count=0, last_activity_at=discussion.created_at)
+
+        call_command('recount_groups', stdout=StringIO())
+
+        self.assertEqual(self.counted(self.group).member_count, 1)
+        discussion = self.counted(discussion)
+        self.assertEqual(discussion.reply_count, 1)
+        self.assertEqual(discussion.last_activity_at, reply.created_at)
+
+
+class NotificationFanoutTests(TestCase):
+    """Notifications are written and read in bulk, with Profile.unread_notifications kept in step"""
+
+    def setUp(self):
+        self.users = [User.objects.create_user(username=f'user{i}') for i in range(30)]
+
+    def test_notify_many_queries_do_not_grow_with_recipients(self):
+        with CaptureQueriesContext(connection) as few:
+            notify_many(self.users[:3], 'system', 'Hello')
+        with CaptureQueriesContext(connection) as many:
+            notify_many(self.users, 'system', 'Hello again')
+        self.assertEqual(len(many), len(few))
+        self.assertEqual(Notification.objects.count(), 33)
+        self.assertEqual(unread_count(self.users[0].id), 2)
+        self.assertEqual(unread_count(self.users[-1].id), 1)
+
+    def test_mark_all_read_is_one_update(self):
+        user = self.users[0]
+        notify_many([user] * 5, 'system', 'Hello')
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('mark_all_notifications_read'))
+        updates = [q['sql'] for q in queries if q['sql'].startswith('UPDATE "users_notification"')]
+        self.assertEqual(len(updates), 1)
+        self.assertFalse(Notification.objects.filter(user=user, is_read=False).exists())
+        self.assertEqual(unread_count(user.id), 0)
+
+        response = self.client.get(reverse('get_notifications'))
+        self.assertEqual(response.json()['unread_count'], 0)
+
+    def test_single_rows_keep_the_counter(self):
+        user = self.users[0]
+        first = Notification.objects.create(user=user, notification_type='system', title='One', message='')
+        Notification.objects.create(user=user, notification_type='system', title='Two', message='')
+        self.assertEqual(unread_count(user.id), 2)
+
+        self.assertEqual(mark_read(user.id, [first.pk]), 1)
+        self.assertEqual(mark_read(user.id, [first.pk]), 0)
+        self.assertEqual(unread_count(user.id), 1)
+
+        Notification.objects.filter(is_read=False).get().delete()
+        self.assertEqual(unread_count(user.id), 0)
+
+        first.is_read = False
+        first.save()
+        self.assertEqual(unread_count(user.id), 1)
+
+        Profile.objects.update(unread_notifications=9)
+        recount_unread()
+        self.assertEqual(unread_count(user.id), 1)
+        self.assertEqual(unread_count(self.users[1].id), 0)
+
+    async def test_stream_sends_every_notification_past_the_last_id(self):
+        user = self.users[0]
+        await self.async_client.aforce_login(user)
+        with shared_cache(self), override_settings(NOTIFICATION_STREAM_LIFETIME=5):
+            response = await self.async_client.get(reverse('notification_stream'), headers={'Last-Event-ID': '0'})
+            events = aiter(response.streaming_content)
+            await anext(events)  # retry interval
+            self.assertIn(b'event: unread', await anext(events))
+
+            def deliver():
+                with self.captureOnCommitCallbacks(execute=True):
+                    notify_many([user] * (STREAM_BATCH_SIZE * 2 + 3), 'system', 'Hello')
+
+            await sync_to_async(deliver)()
+            sent = []
+            while b'event: unread' not in (event := await anext(events)):
+                sent.append(event)
+            await events.aclose()
+        self.assertEqual(len(sent), STREAM_BATCH_SIZE * 2 + 3)
+        self.assertIn(b'"unread_count": 103', event)
+
+    async def test_stream_needs_a_shared_cache(self):
+        await self.async_client.aforce_login(self.users[0])
+        response = await self.async_client.get(reverse('notification_stream'))
+        self.assertEqual(response.status_code, 204)
+
+    def test_notify_users_command_targets_a_group(self):
+        group = StudyGroup.objects.create(name='Study', description='', creator=self.users[0])
+        for user in self.users[:4]:
+            group.add_member(user)
+        call_command('notify_users', 'Meeting moved', '--type', 'group', '--group', str(group.id), stdout=StringIO())
+        self.assertEqual(
+            set(Notification.objects.values_list('user_id', flat=True)), {user.id for user in self.users[:4]}
+        )
+        self.assertEqual(unread_count(self.users[3].id), 1)
+
+
+class RetentionTests(TestCase):
+    """compact_notifications folds old read notifications into digests and archives old activity"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='learner')
+        self.old = timezone.now() - timedelta(days=400)
+
+    def notification(self, created_at, is_read=True, notification_type='system'):
+        return Notification.objects.create(
+            user=self.user, notification_type=notification_type, title='Note', message='',
+            is_read=is_read, created_at=created_at,
+        )
+
+    def test_old_read_notifications_become_a_digest(self):
+        for notification_type in ['system', 'system', 'badge']:
+            self.notification(self.old, notification_type=notification_type)
+        unread = self.notification(self.old, is_read=False)
+        recent = self.notification(timezone.now())
+
+        self.assertEqual(compact_notifications(days=90, batch_size=2), 3)
+        self.assertEqual(set(Notification.objects.values_list('pk', flat=True)), {unread.pk, recent.pk})
+        digest = NotificationDigest.objects.get()
+        self.assertEqual(digest.month, timezone.localdate(self.old).replace(day=1))
+        self.assertEqual((digest.total, digest.counts), (3, {'system': 2, 'badge': 1}))
+
+        self.notification(self.old, notification_type='badge')
+        compact_notifications(days=90)
+        digest.refresh_from_db()
+        self.assertEqual((digest.total, digest.counts), (4, {'system': 2, 'badge': 2}))
+        self.assertEqual(Profile.objects.get(user=self.user).unread_notifications, 1)
+
+    def test_old_activity_moves_to_the_archive(self):
+        old = UserActivity.objects.create(
+            user=self.user, activity_type='note_created', description='Wrote', created_at=self.old,
+        )
+        UserActivity.objects.create(user=self.user, activity_type='note_created', description='Wrote again')
+
+        call_command('compact_notifications', '--batch-size', '1', stdout=StringIO())
+
+        self.assertEqual(UserActivity.objects.count(), 1)
+        archived = UserActivityArchive.objects.get()
+        self.assertEqual((archived.pk, archived.description, archived.created_at), (old.pk, 'Wrote', old.created_at))
+        self.assertEqual(archive_activity(), 0)
+
+
+class ActivityFeedTests(TestCase):
+    """Activities fan out to group members' feeds on write, or on read for large groups"""
+
+    def setUp(self):
+        self.actor = User.objects.create_user(username='actor')
+        self.peer = User.objects.create_user(username='peer')
+        self.stranger = User.objects.create_user(username='stranger')
+        self.group = StudyGroup.objects.create(name='Study', description='', creator=self.actor)
+        self.other = StudyGroup.objects.create(name='Other', description='', creator=self.actor)
+        for group, user in [(self.group, self.actor), (self.group, self.peer), (self.other, self.actor)]:
+            group.add_member(user)
+
+    def feed(self, user, **params):
+        self.client.force_login(user)
+        return self.client.get(reverse('get_activity_feed'), params).json()
+
+    def test_activity_reaches_fellow_members_only(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            StudyNote.objects.create(user=self.actor, title='Secret', content='')
+            Discussion.objects.create(group=self.other, author=self.actor, title='Topic', content='')
+
+        self.assertEqual([a['activity_type'] for a in self.feed(self.actor)['activities']],
+                         ['discussion_posted', 'note_created'])
+        peer_feed = self.feed(self.peer)['activities']
+        self.assertEqual([(a['user'], a['activity_type']) for a in peer_feed], [('actor', 'note_created')])
+        self.assertNotIn('Secret', peer_feed[0]['description'])
+        self.assertEqual(self.feed(self.stranger)['activities'], [])
+
+    @override_settings(FEED_FANOUT_MAX_MEMBERS=1)
+    def test_large_groups_fan_out_on_read(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            StudyNote.objects.create(user=self.actor, title='Note', content='')
+        self.assertEqual(GroupFeedEntry.objects.filter(group=self.group).count(), 1)
+        self.assertFalse(FeedEntry.objects.filter(user=self.peer).exists())
+
+        self.assertEqual(len(self.feed(self.peer)['activities']), 1)
+        membership = GroupMembership.objects.get(group=self.group, user=self.peer)
+        self.assertEqual(membership.feed_cursor, GroupFeedEntry.objects.get(group=self.group).pk)
+        self.assertEqual(len(self.feed(self.peer)['activities']), 1)
+
+    def test_feed_is_cursor_paginated(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(25):
+                Discussion.objects.create(group=self.group, author=self.actor, title=f'Topic {i}', content='')
+        first = self.feed(self.peer)
+        self.assertEqual(len(first['activities']), 20)
+        second = self.feed(self.peer, cursor=first['next_cursor'])
+        self.assertEqual(len(second['activities']), 5)
+        self.assertIsNone(second['next_cursor'])
+        self.assertEqual(second['activities'][-1]['description'], 'Started the discussion "Topic 0"')
+
+
+class StudyLedgerTests(TestCase):
+    """Ending sessions adds to the profile's ledger with UPDATEs; reconcile_study_ledger rebuilds it"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='learner')
+
+    def profile(self):
+        return Profile.objects.get(user=self.user)
+
+    def session(self, minutes, days_ago=0):
+        end = timezone.now() - timedelta(days=days_ago)
+        return StudySession.objects.create(user=self.user, start_time=end - timedelta(minutes=minutes))
+
+    def test_a_session_is_counted_once(self):
+        session = self.session(30)
+        other_tab = StudySession.objects.get(pk=session.pk)
+        self.assertTrue(session.end_session())
+        self.assertFalse(other_tab.end_session())
+        self.assertEqual(other_tab.duration, 30)
+
+        profile = self.profile()
+        self.assertAlmostEqual(profile.total_study_hours, 0.5)
+        self.assertEqual((profile.study_streak, profile.last_study_date), (1, timezone.localdate()))
+
+    def test_streak_follows_study_days(self):
+        Profile.objects.update(study_streak=4, last_study_date=timezone.localdate() - timedelta(days=1))
+        self.session(10).end_session()
+        self.session(10).end_session()
+        self.assertEqual(self.profile().study_streak, 5)
+
+        Profile.objects.update(last_study_date=timezone.localdate() - timedelta(days=3))
+        self.session(10).end_session()
+        self.assertEqual(self.profile().study_streak, 1)
+
+    def test_profile_form_saves_keep_the_ledger(self):
+        stale = self.profile()
+        self.session(60).end_session()
+        stale.bio = 'Hello'
+        stale.save()
+        self.assertAlmostEqual(self.profile().total_study_hours, 1.0)
+
+    def test_reconcile_rebuilds_drifted_profiles(self):
+        for days_ago in [5, 1, 1, 0]:
+            StudySession.objects.filter(pk=self.session(30).pk).update(
+                is_active=False, duration=30, end_time=timezone.now() - timedelta(days=days_ago),
+            )
+        out = StringIO()
+        call_command('reconcile_study_ledger', '--dry-run', stdout=out)
+        self.assertIn('1 had drifted', out.getvalue())
+        self.assertEqual(self.profile().study_streak, 0)
+
+        call_command('reconcile_study_ledger', '--batch-size', '1', stdout=StringIO())
+        profile = self.profile()
+        self.assertAlmostEqual(profile.total_study_hours, 2.0)
+        self.assertEqual((profile.study_streak, profile.last_study_date), (2, timezone.localdate()))
+
+        out = StringIO()
+        call_command('reconcile_study_ledger', stdout=out)
+        self.assertIn('0 had drifted', out.getvalue())
+
+
+class UserTimezoneTests(TestCase):
+    """Study days, rollups and windows follow Profile.time_zone rather than UTC"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='kiwi')
+        profile = Profile.objects.get(user=self.user)
+        profile.time_zone = 'Pacific/Auckland'
+        profile.save()
+
+    def finished(self, start, minutes):
+        return StudySession.objects.create(
+            user=self.user, start_time=start, end_time=start + timedelta(minutes=minutes),
+            duration=minutes, is_active=False,
+        )
+
+    def test_sessions_count_toward_the_local_day(self):
+        # 20:00 UTC on June 1st is 08:00 on June 2nd in Auckland (UTC+12)
+        session = self.finished(datetime(2026, 6, 1, 20, tzinfo=get_zone('UTC')), 45)
+        self.assertEqual(study_day(session), datetime(2026, 6, 2).date())
+
+        DailyStudyRollup.add_session(session)
+        added = list(DailyStudyRollup.objects.values_list('date', 'minutes', 'morning_minutes'))
+        self.assertEqual(added, [(datetime(2026, 6, 2).date(), 45, 45)])
+
+        DailyStudyRollup.rebuild(user=self.user)
+        self.assertEqual(list(DailyStudyRollup.objects.values_list('date', 'minutes', 'morning_minutes')), added)
+        DailyStudyRollup.rebuild(user=self.user, dates=[datetime(2026, 6, 2).date()])
+        self.assertEqual(list(DailyStudyRollup.objects.values_list('date', 'minutes', 'morning_minutes')), added)
+
+    def test_analytics_bucket_by_local_day_and_hour(self):
+        DailyStudyRollup.add_session(self.finished(datetime(2026, 6, 1, 20, tzinfo=get_zone('UTC')), 30))
+        analytics = compute_user_analytics(self.user, (datetime(2026, 6, 1).date(), datetime(2026, 6, 2).date()))
+        self.assertEqual([day['minutes'] for day in analytics['daily']], [0, 30])
+
+    def test_changing_zone_rebuckets_study_days(self):
+        session = self.finished(datetime(2026, 6, 1, 20, tzinfo=get_zone('UTC')), 45)
+        DailyStudyRollup.add_session(session)
+        snapshot_key = UserDashboardSnapshot.cache_key(self.user.id, 'notes_count')
+        cache.set(snapshot_key, 99)
+
+        profile = Profile.objects.get(user=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.save()  # zone unchanged
+        self.assertEqual(cache.get(snapshot_key), 99)
+
+        profile.time_zone = 'America/New_York'
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.save()
+        self.assertEqual(study_day(session), datetime(2026, 6, 1).date())
+        self.assertEqual(
+            list(DailyStudyRollup.objects.values_list('date', 'minutes', 'evening_minutes')),
+            [(datetime(2026, 6, 1).date(), 45, 0)],  # 16:00 in New York
+        )
+        self.assertIsNone(cache.get(snapshot_key))
+
+    def test_period_windows(self):
+        tz = get_zone('Pacific/Auckland')
+        now = datetime(2026, 6, 3, 23, tzinfo=get_zone('UTC'))  # Thursday June 4th, 11:00 local
+        start, end = period_window('week', tz, now)
+        self.assertEqual((start.date(), end.date()), (datetime(2026, 6, 1).date(), datetime(2026, 6, 8).date()))
+        self.assertEqual(start.utcoffset(), timedelta(hours=12))
+        start, end = period_window('month', tz, now)
+        self.assertEqual((start.date(), end.date()), (datetime(2026, 6, 1).date(), datetime(2026, 7, 1).date()))
+
+
+@override_settings(IMAGE_RENDITIONS_SYNC=True)
+class ImageRenditionTests(TestCase):
+    """Uploaded images get cropped or fitted renditions, served by {% rendition %} once they exist"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        cache.clear()
+        self.user = User.objects.create_user(username='pictured')
+
+    def image(self, size, mode='RGB', color=(200, 30, 30), name='picture.png'):
+        buffer = BytesIO()
+        Image.new(mode, size, color).save(buffer, 'PNG')
+        return ContentFile(buffer.getvalue(), name=name)
+
+    def sizes(self, source):
+        return {
+            (spec, fmt): (width, height)
+            for spec, fmt, width, height in ImageRendition.objects.filter(source=source)
+            .values_list('spec', 'format', 'width', 'height')
+        }
+
+    def opened(self, source, spec, fmt):
+        name = ImageRendition.objects.get(source=source, spec=spec, format=fmt).file.name
+        with default_storage.open(name, 'rb') as stored:
+            image = Image.open(stored)
+            image.load()
+        return image
+
+    def upload_course_image(self, content):
+        course = Course(title='Art', description='')
+        course.image = content
+        with self.captureOnCommitCallbacks(execute=True):
+            course.save()
+        return course
+
+    def test_crop_fills_the_box_and_fit_keeps_the_aspect_ratio(self):
+        course = self.upload_course_image(self.image((2400, 800)))
+        sizes = self.sizes(course.image.name)
+        self.assertEqual(sizes[('card', 'webp')], (400, 250))
+        self.assertEqual(sizes[('cover', 'jpg')], (1200, 400))
+        self.assertEqual(self.opened(course.image.name, 'card', 'jpg').size, (400, 250))
+
+    def test_small_images_are_not_enlarged(self):
+        course = self.upload_course_image(self.image((300, 100)))
+        self.assertEqual(self.sizes(course.image.name), {
+            ('card', 'webp'): (300, 100), ('card', 'jpg'): (300, 100),
+            ('cover', 'webp'): (300, 100), ('cover', 'jpg'): (300, 100),
+        })
+
+    def test_transparent_images_become_rgb_jpegs(self):
+        course = self.upload_course_image(self.image((500, 500), 'RGBA', (0, 0, 255, 128)))
+        jpeg = self.opened(course.image.name, 'card', 'jpg')
+        self.assertEqual((jpeg.format, jpeg.mode), ('JPEG', 'RGB'))
+        self.assertEqual(self.opened(course.image.name, 'card', 'webp').mode, 'RGBA')
+
+    def test_tag_falls_back_to_the_original_until_generated(self):
+        course = Course(title='Art', description='')
+        course.image = self.image((800, 800))
+        course.save()  # outside captureOnCommitCallbacks: no renditions yet
+        source = course.image.name
+        tag = Template("{% load renditions %}{% rendition image 'card' %}|{% rendition image 'cover' 'jpg' %}")
+        render_tag = lambda: tag.render(Context({'image': course.image}))
+        self.assertEqual(render_tag(), f'{course.image.url}|{course.image.url}')
+        self.assertEqual(cache.get(manifest_key(source)), {})
+
+        self.assertEqual(generate_renditions(source, ('card', 'cover')), 4)
+        self.assertIsNone(cache.get(manifest_key(source)))
+        card = ImageRendition.objects.get(source=source, spec='card', format='webp').file
+        cover = ImageRendition.objects.get(source=source, spec='cover', format='jpg').file
+        self.assertEqual(render_tag(), f'{card.url}|{cover.url}')
+        self.assertEqual(generate_renditions(source, ('card', 'cover')), 0)
+        self.assertEqual(render_tag(), f'{card.url}|{cover.url}')  # now from the cached manifest
+
+    def test_reupload_under_the_same_name_replaces_the_renditions(self):
+        profile = Profile.objects.get(user=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.image.save('me.png', self.image((256, 256)))
+        source = profile.image.name
+        stale = ImageRendition.objects.get(source=source, spec='avatar_64', format='jpg').file.name
+        self.assertEqual(self.opened(source, 'avatar_64', 'jpg').getpixel((32, 32))[:2], (200, 30))
+
+        default_storage.delete(source)
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.image.save('me.png', self.image((256, 256), color=(20, 40, 220)))
+        self.assertEqual(profile.image.name, source)
+        self.assertEqual(ImageRendition.objects.filter(source=source).count(), 4)
+        self.assertNotEqual(ImageRendition.objects.get(source=source, spec='avatar_64', format='jpg').file.name, stale)
+        self.assertFalse(default_storage.exists(stale))
+        red, green, blue = self.opened(source, 'avatar_64', 'jpg').getpixel((32, 32))
+        self.assertGreater(blue, red)
+
+
+class ReplyTreeTests(TestCase):
+    """Threads load a page of branches, or one subtree, in a single query"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='poster', password='pw')
+        group = StudyGroup.objects.create(name='Study', description='', creator=self.user)
+        group.add_member(self.user, role='admin')
+        self.discussion = Discussion.objects.create(group=group, author=self.user, title='Topic', content='')
+
+    def reply(self, parent=None):
+        return DiscussionReply.objects.create(discussion=self.discussion, author=self.user, content='x', parent=parent)
+
+    def chain(self, parent, length):
+        for _ in range(length):
+            parent = self.reply(parent)
+        return parent
+
+    def load(self, query=None, focus=None):
+        request = RequestFactory().get('/', query or {})
+        with self.assertNumQueries(1):
+            page = load_thread(request, self.discussion, focus=focus)
+            for root in page:
+                root.author.username
+        return page
+
+    def test_pages_of_top_level_branches(self):
+        roots = [self.reply() for _ in range(BRANCHES_PER_PAGE + 3)]
+        self.chain(roots[0], 2)
+        self.chain(roots[-1], 2)
+
+        first = self.load()
+        self.assertEqual([r.pk for r in first], [r.pk for r in roots[:BRANCHES_PER_PAGE]])
+        self.assertEqual(len(first.roots[0].tree_children[0].tree_children), 1)
+        self.assertTrue(first.has_next)
+
+        second = self.load({'cursor': first.next_cursor})
+        self.assertEqual([r.pk for r in second], [r.pk for r in roots[BRANCHES_PER_PAGE:]])
+        self.assertEqual(len(second.roots[-1].tree_children), 1)
+        self.assertFalse(second.has_next)
+
+    def test_deep_branches_continue_on_their_own_page(self):
+        root = self.reply()
+        last_shown = self.chain(root, INLINE_DEPTH - 1)
+        self.chain(last_shown, 3)
+
+        page = self.load()
+        node = page.roots[0]
+        while node.tree_children:
+            node = node.tree_children[0]
+        self.assertEqual(node.pk, last_shown.pk)
+        self.assertTrue(node.has_hidden_replies)
+
+        focused = self.load({'thread': node.pk}, focus=last_shown)
+        self.assertEqual(focused.roots, [last_shown])
+        self.assertEqual(len(focused.roots[0].tree_children), 1)
+
+    def test_depth_is_capped(self):
+        deepest = self.chain(None, MAX_REPLY_DEPTH + 2)
+        self.assertEqual(deepest.depth, MAX_REPLY_DEPTH - 1)
+        self.assertEqual(deepest.parent.depth, MAX_REPLY_DEPTH - 2)
+
+    def test_detail_page_queries_do_not_grow_with_the_thread(self):
+        self.client.force_login(self.user)
+        url = reverse('discussion_detail', args=[self.discussion.id])
+        self.chain(self.reply(), 3)
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(url)
+        for _ in range(5):
+            self.chain(self.reply(), 8)
+        with CaptureQueriesContext(connection) as many:
+            response = self.client.get(url)
+        self.assertEqual(len(many), len(few))
+        self.assertContains(response, 'Continue this thread', count=5)
+
+
+class ChunkedUploadTests(TestCase):
+    """Resumable uploads end up as one content-addressed blob named by the bytes on disk"""
+
+    content = os.urandom(3 * uploads.CHUNK_SIZE + 123)
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.addCleanup(uploads._hashers.clear)
+        self.user = User.objects.create_user(username='uploader')
+
+    def session(self):
+        return UploadSession.objects.create(user=self.user, filename='notes.pdf', size=len(self.content))
+
+    def send(self, session, start, end):
+        return uploads.receive_chunk(session, BytesIO(self.content[start:end]), start, end - start)
+
+    def assertStored(self, blob):
+        self.assertEqual(blob.sha256, hashlib.sha256(self.content).hexdigest())
+        with open(os.path.join(self.media_root, blob.file.name), 'rb') as stored:
+            self.assertEqual(stored.read(), self.content)
+
+    def test_chunks_over_the_api(self):
+        self.client.force_login(self.user)
+        response = self.client.post(
+            reverse('upload_session_create'), {'filename': 'notes.pdf', 'size': len(self.content)},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 201)
+        url = response['Location']
+        cut = 100_000
+        response = self.client.put(url, self.content + b'!', content_type='application/octet-stream', HTTP_UPLOAD_OFFSET='0')
+        self.assertEqual((response.status_code, response.json()['offset']), (400, 0))  # runs past the declared size
+        self.client.put(url, self.content[:cut], content_type='application/octet-stream', HTTP_UPLOAD_OFFSET='0')
+        response = self.client.put(url, self.content[:cut], content_type='application/octet-stream', HTTP_UPLOAD_OFFSET='0')
+        self.assertEqual((response.status_code, response.json()['offset']), (409, cut))
+        response = self.client.put(url, self.content[cut:], content_type='application/octet-stream', HTTP_UPLOAD_OFFSET=str(cut))
+        self.assertEqual(response.json()['complete'], True)
+        self.assertStored(UploadSession.objects.get().blob)
+
+    def test_resume_after_the_hasher_is_lost(self):
+        session = self.send(self.session(), 0, 1000)
+        uploads._hashers.clear()  # the next chunk lands on another process
+        session = self.send(session, 1000, 5000)
+        session = self.send(session, 5000, len(self.content))
+        self.assertStored(session.blob)
+
+    def test_stale_hasher_is_not_extended(self):
+        session = self.send(self.session(), 0, 1000)
+        with uploads._hashers_lock:
+            stale = uploads._hashers.pop(session.id)
+        session = self.send(session, 1000, 5000)  # taken by another process
+        uploads._hashers[session.id] = stale  # ...while this one still holds the hasher at offset 1000
+        session = self.send(session, 5000, len(self.content))
+        self.assertStored(session.blob)
+
+    def test_identical_content_is_stored_once(self):
+        first = self.send(self.session(), 0, len(self.content))
+        second = self.send(self.session(), 0, len(self.content))
+        self.assertEqual(first.blob_id, second.blob_id)
+        self.assertEqual(ResourceBlob.objects.count(), 1)
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'uploads', 'partial')), [])
+
+
+class ConditionalGetTests(TestCase):
+    """The JSON endpoints answer 304 from cache stamps, but only when every worker shares them"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='etags')
+        self.client.force_login(self.user)
+        self.url = reverse('get_notifications')
+
+    def test_no_validators_with_a_per_process_cache(self):
+        self.assertNotIn('ETag', self.client.get(self.url))
+
+    def test_not_modified_until_touched(self):
+        with shared_cache(self):
+            etag = self.client.get(self.url)['ETag']
+            self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+            with self.captureOnCommitCallbacks(execute=True):
+                Notification.objects.create(user=self.user, notification_type='system', title='Hello')
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()['unread_count'], 1)
+
+    def test_no_last_modified_when_the_etag_has_extra_inputs(self):
+        # The schedule feed also depends on today's date, which no stamp records
+        url = reverse('api_schedule_events')
+        with shared_cache(self):
+            self.assertIn('Last-Modified', self.client.get(self.url))
+            response = self.client.get(url)
+            self.assertIn('ETag', response)
+            self.assertNotIn('Last-Modified', response)
+            tomorrow = http_date(time.time() + 24 * 60 * 60)
+            self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=tomorrow).status_code, 200)
+
+
+class BadgeRuleTests(TestCase):
+    """Badges are awarded from their metric and requirement, each announced exactly once"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='collector')
+        self.notes = self.badge('Note Taker', 'notes_created', 2)
+        self.team = self.badge('Team Player', 'groups_joined', 1)
+        self.master = self.badge('Master Student', 'badges_earned', 2)
+
+    def badge(self, name, metric, requirement):
+        return Badge.objects.create(name=name, description=name, icon='fa-trophy', metric=metric, requirement=requirement)
+
+    def announced(self):
+        return list(Notification.objects.filter(user=self.user, notification_type='badge').values_list('title', flat=True))
+
+    def note(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            StudyNote.objects.create(user=self.user, title='Note', content='...')
+
+    def test_awards_follow_the_rules(self):
+        self.note()
+        self.assertFalse(UserBadge.objects.exists())
+        self.note()
+        self.assertEqual(self.announced(), ['🏆 Badge Earned: Note Taker'])
+
+        group = StudyGroup.objects.create(name='Study', description='', creator=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            group.add_member(self.user)
+        self.assertEqual(
+            set(UserBadge.objects.filter(user=self.user).values_list('badge__name', flat=True)),
+            {'Note Taker', 'Team Player', 'Master Student'},
+        )
+        self.assertEqual(len(self.announced()), 3)
+        self.assertEqual(evaluate_badges(self.user.id), [])
+
+    def test_badge_awarded_by_a_racing_evaluation_is_not_announced_again(self):
+        def racing_count(user_id):
+            # Another evaluation awards the badge after this one read the earned set
+            UserBadge.objects.create(user_id=user_id, badge=self.notes)
+            return 5
+
+        with mock.patch.dict(BADGE_METRICS, notes_created=racing_count):
+            self.assertEqual(evaluate_badges(self.user.id, ['notes_created']), [])
+        self.assertEqual(self.announced(), [])
+        self.assertEqual(UserBadge.objects.filter(user=self.user).count(), 1)
+
+    def test_legacy_badges_get_metrics_from_their_names(self):
+        legacy = Badge.objects.create(name='Century Scholar', description='', icon='fa-book', requirement=0)
+        unknown = Badge.objects.create(name='Early Bird', description='', icon='fa-sun', requirement=3)
+        import_module('users.migrations.0008_badge_metric').set_badge_metrics(django_apps, None)
+        legacy.refresh_from_db()
+        unknown.refresh_from_db()
+        self.assertEqual((legacy.metric, legacy.requirement), ('study_hours', 100))
+        self.assertEqual((unknown.metric, unknown.requirement), ('', 3))
+
+
+class DownloadTests(TestCase):
+    """serve_file answers ranges, If-Range and unsatisfiable ranges like a static file server"""
+
+    content = bytes(range(256)) * 40
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=self.media_root, RESOURCE_DOWNLOAD_OFFLOAD='')
+        media.enable()
+        self.addCleanup(media.disable)
+        self.file = ResourceBlob(file=default_storage.save('blobs/sample', ContentFile(self.content))).file
+        self.factory = RequestFactory()
+
+    def serve(self, filename='notes.pdf', **headers):
+        return serve_file(self.factory.get('/', headers=headers), self.file, filename=filename)
+
+    def test_parse_range(self):
+        self.assertEqual(parse_range('bytes=0-99', 1000), (0, 99))
+        self.assertEqual(parse_range('bytes=900-', 1000), (900, 999))
+        self.assertEqual(parse_range('bytes=990-5000', 1000), (990, 999))
+        self.assertEqual(parse_range('bytes=-100', 1000), (900, 999))
+        self.assertEqual(parse_range('bytes=-5000', 1000), (0, 999))
+        self.assertIsNone(parse_range('bytes=0-1,5-9', 1000))
+        self.assertIsNone(parse_range('items=0-1', 1000))
+        self.assertIsNone(parse_range('bytes=-', 1000))
+        self.assertIs(parse_range('bytes=1000-', 1000), False)
+        self.assertIs(parse_range('bytes=50-10', 1000), False)
+        self.assertIs(parse_range('bytes=-0', 1000), False)
+
+    def test_partial_content(self):
+        response = self.serve(Range='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(self.content)}')
+        self.assertEqual(b''.join(response.streaming_content), self.content[100:200])
+
+    def test_if_range_falls_back_to_the_whole_file(self):
+        etag = self.serve()['ETag']
+        self.assertEqual(self.serve(Range='bytes=0-9', If_Range=etag).status_code, 206)
+        response = self.serve(Range='bytes=0-9', If_Range='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+
+    def test_unsatisfiable_range(self):
+        response = self.serve(Range=f'bytes={len(self.content)}-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.content)}')
+
+    def test_filename_is_escaped(self):
+        self.assertEqual(self.serve(filename='week "3".pdf')['Content-Disposition'], 'attachment; filename="week \\"3\\".pdf"')
+        self.assertEqual(self.serve(filename='résumé.pdf')['Content-Disposition'], "attachment; filename*=utf-8''r%C3%A9sum%C3%A9.pdf")
+        response = self.serve(filename='a.pdf\r\nX-Injected: 1')
+        self.assertNotIn('X-Injected', response.headers)
+        self.assertNotIn('\n', response['Content-Disposition'])
+
+
+class CursorPaginationTests(TestCase):
+    """Keyset pages walk every row once in both directions, ties included"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='pager')
+        stamp = at(2026, 3, 1, 9, 0, 0, 123456)
+        for i in range(13):
+            StudyNote.objects.create(
+                user=self.user, title='abc'[i % 3], content='', is_pinned=i % 4 == 0,
+                created_at=stamp + timedelta(microseconds=i // 5),  # runs of equal timestamps
+            )
+        self.request = RequestFactory().get('/notes/')
+
+    def walk(self, ordering, per_page=4):
+        paginator = CursorPaginator(StudyNote.objects.all(), ordering, per_page)
+        forward = [paginator.page(self.request)]
+        while forward[-1].has_next():
+            forward.append(paginator.page(self.request, forward[-1].next_cursor))
+        backward = [forward[-1]]
+        while backward[-1].has_previous():
+            backward.append(paginator.page(self.request, backward[-1].previous_cursor))
+        return [[note.id for note in page] for page in forward], [[note.id for note in page] for page in backward]
+
+    def assertWalks(self, ordering):
+        expected = list(StudyNote.objects.order_by(*ordering).values_list('id', flat=True))
+        forward, backward = self.walk(ordering)
+        self.assertEqual([note_id for page in forward for note_id in page], expected)
+        self.assertEqual([len(page) for page in forward], [4, 4, 4, 1])
+        self.assertEqual(backward, forward[::-1])
+
+    def test_same_direction_ordering_uses_a_row_comparison(self):
+        ordering = ('-is_pinned', '-created_at', '-id')
+        paginator = CursorPaginator(StudyNote.objects.all(), ordering, 4)
+        self.assertIsInstance(paginator._beyond([True, at(2026, 3, 1), 1], False), RowComparison)
+        self.assertWalks(ordering)
+
+    def test_mixed_direction_ordering_uses_an_or_chain(self):
+        ordering = ('title', '-created_at', 'id')
+        paginator = CursorPaginator(StudyNote.objects.all(), ordering, 4)
+        self.assertIsInstance(paginator._beyond(['a', at(2026, 3, 1), 1], True), Q)
+        self.assertWalks(ordering)
+        self.assertWalks(('-title', 'is_pinned', '-id'))
+
+    def test_cursor_keeps_microseconds(self):
+        paginator = CursorPaginator(StudyNote.objects.all(), ('-created_at', '-id'), 4)
+        note = StudyNote.objects.order_by('created_at').first()
+        self.assertEqual(paginator.decode(paginator.encode(note)), (False, [note.created_at, note.id]))
+        self.assertEqual(paginator.decode(paginator.encode(note, backwards=True))[0], True)
+
+    def test_bad_cursor_falls_back_to_the_first_page(self):
+        paginator = CursorPaginator(StudyNote.objects.all(), ('-created_at', '-id'), 4)
+        first = [note.id for note in paginator.page(self.request)]
+        for cursor in ('not-a-cursor', paginator.encode(StudyNote.objects.first())[:-4], 'WzAsWzFdXQ'):
+            with self.assertRaises(InvalidCursor):
+                paginator.page(self.request, cursor)
+            page = paginator.get_page(RequestFactory().get('/notes/', {'cursor': cursor}))
+            self.assertEqual([note.id for note in page], first)
+        with self.assertRaises(ValueError):
+            CursorPaginator(StudyNote.objects.all(), ('-created_at',), 4)
+
+
+class ResourceLibraryTests(TestCase):
+    """The public section lists other users' public resources, filtered, sorted and paged in SQL"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='reader', password='pw')
+        self.other = User.objects.create_user(username='sharer')
+        self.algebra = Course.objects.create(title='Algebra', description='')
+        self.biology = Course.objects.create(title='Biology', description='')
+        self.notes = self.share('Linear algebra notes', resource_type='pdf', course=self.algebra)
+        self.lecture = self.share('Cell lecture', resource_type='video', course=self.biology)
+        self.link = self.share('Useful link', resource_type='link', description='An algebra cheatsheet')
+        self.share('Draft', is_public=False)
+        self.share('My own', user=self.user)
+        self.client.force_login(self.user)
+
+    def share(self, title, **fields):
+        fields.setdefault('user', self.other)
+        fields.setdefault('is_public', True)
+        return SharedResource.objects.create(title=title, **fields)
+
+    def public_ids(self, **params):
+        response = self.client.get(reverse('resources_library'), {'format': 'json', 'section': 'public', **params})
+        self.assertEqual(response.status_code, 200)
+        return [resource['id'] for resource in response.json()['results']]
+
+    def test_own_and_private_resources_are_not_discoverable(self):
+        expected = {self.notes.id, self.lecture.id, self.link.id}
+        self.assertEqual(set(SharedResource.objects.discoverable_by(self.user).values_list('id', flat=True)), expected)
+        self.assertEqual(set(self.public_ids()), expected)
+        self.assertEqual(len(SharedResource.objects.discoverable_by(self.other)), 1)  # just the reader's own
+
+    def test_filters(self):
+        self.assertEqual(self.public_ids(resource_type='pdf'), [self.notes.id])
+        self.assertEqual(self.public_ids(course=self.biology.id), [self.lecture.id])
+        # Search matches titles and descriptions, ignoring case
+        self.assertEqual(self.public_ids(search='ALGEBRA'), [self.link.id, self.notes.id])
+        self.assertEqual(self.public_ids(search='algebra', resource_type='link'), [self.link.id])
+        self.assertEqual(self.public_ids(course='not-a-course'), self.public_ids())
+        self.assertEqual(list(SharedResource.objects.matching('', None, '')), list(SharedResource.objects.all()))
+
+    def test_counter_orderings_break_ties_by_id(self):
+        SharedResource.objects.filter(pk=self.notes.pk).update(views=2, downloads=7)
+        SharedResource.objects.filter(pk=self.lecture.pk).update(views=5, downloads=7)
+        SharedResource.objects.filter(pk=self.link.pk).update(views=2, downloads=1)
+        self.assertEqual(self.public_ids(sort='views'), [self.lecture.id, self.link.id, self.notes.id])
+        self.assertEqual(self.public_ids(sort='downloads'), [self.lecture.id, self.notes.id, self.link.id])
+        self.assertEqual(self.public_ids(sort='bogus'), [self.link.id, self.lecture.id, self.notes.id])  # newest
+
+    def test_cursor_pages_across_equal_counters(self):
+        SharedResource.objects.bulk_create(
+            SharedResource(user=self.other, title=f'Sheet {i}', is_public=True, views=i % 3) for i in range(30)
+        )
+        expected = list(
+            SharedResource.objects.discoverable_by(self.user).order_by('-views', '-id').values_list('id', flat=True)
+        )
+        pages = []
+        url = reverse('resources_library') + '?format=json&section=public&sort=views'
+        while url:
+            body = self.client.get(url).json()
+            pages.append([resource['id'] for resource in body['results']])
+            url = body['next']
+        self.assertEqual([len(page) for page in pages], [24, 9])
+        self.assertEqual([resource_id for page in pages for resource_id in page], expected)
+
+        previous = self.client.get(body['previous']).json()
+        self.assertEqual([resource['id'] for resource in previous['results']], pages[0])
+
+
+class NoteSearchTests(TestCase):
+    """Ranked full-text search with the backend of the test database (FTS5 on SQLite, tsvector on PostgreSQL)"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='searcher')
+        self.other = User.objects.create_user(username='neighbour')
+        self.in_title = self.note('Photosynthesis basics', 'Light reactions and the Calvin cycle.')
+        self.in_content = self.note('Biology week 3', 'Chlorophyll drives photosynthesis in the chloroplast.')
+        self.unrelated = self.note('Algebra', 'Quadratic equations <b>and</b> factoring.')
+        self.note('Photosynthesis', 'Not mine.', user=self.other)
+
+    def note(self, title, content, user=None, tags=''):
+        return StudyNote.objects.create(user=user or self.user, title=title, content=content, tags=tags)
+
+    def search(self, query):
+        return search_notes(StudyNote.objects.filter(user=self.user), query)
+
+    def test_ranks_title_matches_first_and_keeps_to_the_queryset(self):
+        results = self.search('photosynthesis')
+        self.assertEqual(results.count(), 2)
+        self.assertEqual([note.id for note in results[0:10]], [self.in_title.id, self.in_content.id])
+        self.assertGreater(results[0].search_rank, results[1].search_rank)
+
+    def test_snippet_is_escaped_and_highlighted(self):
+        snippet = self.search('quadratic')[0].search_snippet
+        self.assertIn('<mark>', snippet)
+        self.assertNotIn('<b>', snippet)
+
+    def test_index_follows_saves_and_deletes(self):
+        self.unrelated.content = 'Photosynthesis shows up in algebra class too.'
+        self.unrelated.save()
+        self.assertEqual(self.search('photosynthesis').count(), 3)
+        self.in_title.delete()
+        self.assertEqual(self.search('photosynthesis').count(), 2)
+
+    def test_rebuild_command(self):
+        StudyNote.objects.filter(pk=self.unrelated.pk).update(title='Photosynthesis revision')  # bypasses signals
+        self.assertEqual(self.search('photosynthesis').count(), 2)
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.search('photosynthesis').count(), 3)
+
+    def test_pages_through_paginator(self):
+        for i in range(5):
+            self.note(f'Cell {i}', 'photosynthesis again')
+        page = Paginator(self.search('photosynthesis'), 3).get_page(3)
+        self.assertEqual((page.paginator.count, len(page.object_list)), (7, 1))
+
+    @skipUnless(connection.vendor == 'sqlite', 'FTS5 backend')
+    def test_fts5_prefix_and_query_syntax(self):
+        self.assertEqual(self.search('photosynth').count(), 2)  # the last word matches as a prefix
+        for query in ('title:algebra', 'photosynthesis OR "', 'NEAR(a b)', '*', '""'):
+            self.search(query).count()  # user input never reaches FTS5 as query syntax
+        self.assertEqual(self.search('-- !!').count(), 0)
+
+    @skipUnless(connection.vendor == 'postgresql', 'PostgreSQL backend')
+    def test_postgres_websearch_syntax(self):
+        self.assertEqual(self.search('photosynthesis -chlorophyll').count(), 1)
+        self.assertEqual(self.search('"calvin cycle"').count(), 1)
+        self.assertTrue(StudyNote.objects.filter(pk=self.in_title.pk, search_vector__isnull=False).exists())
+
+
+class NoteTagTests(TestCase):
+    """StudyNote.tags is mirrored into Tag/NoteTag rows that the filters and the cloud read"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='tagger')
+        self.other = User.objects.create_user(username='other tagger')
+
+    def note(self, tags, user=None):
+        return StudyNote.objects.create(user=user or self.user, title='Note', content='', tags=tags)
+
+    def linked(self, note):
+        return sorted(note.tag_objects.values_list('name', flat=True))
+
+    def test_normalize_tags(self):
+        self.assertEqual(normalize_tags(' Math, physics ,,MATH,  linear   algebra '), ['math', 'physics', 'linear algebra'])
+        self.assertEqual(normalize_tags(None), [])
+        self.assertEqual(normalize_tags('x' * 80), ['x' * 50])
+
+    def test_sync_tags_follows_edits(self):
+        note = self.note('Math, Physics')
+        self.assertEqual(self.linked(note), ['math', 'physics'])
+        note.tags = 'physics, chemistry'
+        note.save()
+        self.assertEqual(self.linked(note), ['chemistry', 'physics'])
+        with self.assertNumQueries(1):
+            note.sync_tags()  # nothing changed: only the current links are read
+        note.tags = ''
+        note.save()
+        self.assertEqual(self.linked(note), [])
+        # Tags are per user and reused, not duplicated
+        self.note('math', user=self.other)
+        self.note('MATH')
+        self.assertEqual(Tag.objects.filter(name='math').count(), 2)
+
+    def test_tagged_filters_and_cloud(self):
+        both = self.note('math, physics')
+        math = self.note('math')
+        self.note('physics', user=self.other)
+        notes = StudyNote.objects.filter(user=self.user)
+        self.assertEqual(list(notes.tagged(self.user, ['Math', 'physics'])), [both])
+        self.assertEqual(set(notes.tagged(self.user, ['math'])), {both, math})
+        self.assertEqual(set(notes.tagged(self.user, ['physics', 'unknown'], match_all=False)), {both})
+        self.assertFalse(notes.tagged(self.user, ['physics', 'unknown']).exists())
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('note_tag_cloud'))
+        self.assertEqual(response.json()['tags'], [{'name': 'math', 'count': 2}, {'name': 'physics', 'count': 1}])
+        response = self.client.get(reverse('notes_list'), {'tag': ['math', 'physics']})
+        self.assertEqual(list(response.context['page_obj']), [both])
+
+
+class WriteBehindCounterTests(TestCase):
+    """Resource view counts are buffered in process and written as grouped relative UPDATEs"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='sharer')
+        self.resources = [
+            SharedResource.objects.create(user=self.user, title=f'Sheet {i}', is_public=True) for i in range(3)
+        ]
+        self.buffer = counters.CounterBuffer(interval=3600)  # flushed by hand only
+        patcher = mock.patch.object(counters, 'buffer', self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def views(self):
+        return list(SharedResource.objects.order_by('id').values_list('views', flat=True))
+
+    def test_flush_groups_equal_increments(self):
+        first, second, third = self.resources
+        for resource in (first, first, second, second, third):
+            counters.increment(resource, 'views')
+        self.assertEqual(self.views(), [0, 0, 0])
+        self.assertEqual(counters.pending(first, 'views'), 2)
+
+        SharedResource.objects.update(views=10)  # writes made elsewhere meanwhile are added to, not overwritten
+        stamps = list(SharedResource.objects.order_by('id').values_list('updated_at', flat=True))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(counters.flush(), 3)
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('UPDATE')]), 2)
+        self.assertEqual(self.views(), [12, 12, 11])
+        self.assertEqual(list(SharedResource.objects.order_by('id').values_list('updated_at', flat=True)), stamps)
+        self.assertEqual(counters.pending(first, 'views'), 0)
+        self.assertEqual(counters.flush(), 0)
+
+    def test_failed_flush_keeps_every_increment(self):
+        counters.increment(self.resources[0], 'views', 3)
+        self.buffer.incr(SharedResource, 'no_such_column', self.resources[1].pk)
+        with self.assertLogs('users.counters', 'ERROR'):
+            self.assertEqual(counters.flush(), 0)
+        self.assertEqual(self.views(), [0, 0, 0])  # rolled back together
+        self.assertEqual(counters.pending(self.resources[0], 'views'), 3)
+
+    def test_view_shows_pending_count(self):
+        self.client.force_login(self.user)
+        url = reverse('resource_view', args=[self.resources[0].id])
+        self.client.get(url)
+        response = self.client.get(url)
+        self.assertEqual(response.context['resource'].views, 2)
+        self.assertEqual(self.views()[0], 0)
+        counters.flush()
+        self.assertEqual(self.views()[0], 2)
+
+
+class DashboardSnapshotTests(TestCase):
+    """Dashboard, profile and home pages read their totals and goal progress from the cached snapshot"""
+
+    # The session and user lookups of every logged-in request
+    AUTH_QUERIES = 2
+
+    def setUp(self):
+        cache.clear()
+        self.now = at(2026, 6, 3, 12)  # a Wednesday
+        patcher = mock.patch('django.utils.timezone.now', return_value=self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user(username='snap', password='pw')
+        self.course = Course.objects.create(title='Algebra', description='')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.daily = StudyGoal.objects.create(user=self.user, goal_type='daily', target_minutes=60)
+            StudyGoal.objects.create(user=self.user, goal_type='weekly', target_minutes=600)
+        self.client.force_login(self.user)
+
+    def study(self, start, minutes):
+        with self.captureOnCommitCallbacks(execute=True):
+            session = StudySession.objects.create(
+                user=self.user, course=self.course, start_time=start, end_time=start + timedelta(minutes=minutes),
+                duration=minutes, is_active=False,
+            )
+            DailyStudyRollup.add_session(session)
+
+    def progress(self):
+        return {
+            item['goal']['goal_type']: item['progress']['total_minutes']
+            for item in UserDashboardSnapshot(self.user)['active_goals']
+        }
+
+    def test_warm_pages_query_counts(self):
+        for name, queries in (('study_dashboard', 2), ('profile', 1), ('sample_home', 2)):
+            with self.subTest(name):
+                self.assertEqual(self.client.get(reverse(name)).status_code, 200)
+                with self.assertNumQueries(self.AUTH_QUERIES + queries):
+                    self.client.get(reverse(name))
+
+    def test_goal_progress_counts_each_period(self):
+        self.study(at(2026, 6, 3, 9), 30)  # today
+        self.study(at(2026, 6, 1, 9), 90)  # Monday, this week
+        self.study(at(2026, 5, 31, 9), 45)  # last week
+        self.assertEqual(self.progress(), {'daily': 30, 'weekly': 120})
+        item = next(item for item in UserDashboardSnapshot(self.user)['active_goals'] if item['goal']['id'] == self.daily.id)
+        self.assertEqual(item['goal']['goal_type_display'], 'Daily')
+        self.assertEqual(item['progress'], self.daily.get_progress())
+        self.assertEqual(item['progress']['percentage'], 50)
+
+    def test_sessions_and_goals_invalidate_the_snapshot(self):
+        self.assertEqual(self.progress(), {'daily': 0, 'weekly': 0})
+        self.study(at(2026, 6, 3, 9), 30)
+        self.assertEqual(self.progress(), {'daily': 30, 'weekly': 30})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.daily.is_active = False
+            self.daily.save(update_fields=['is_active'])
+        self.assertEqual(self.progress(), {'weekly': 30})
+        self.assertEqual(UserDashboardSnapshot(self.user)['goals_count'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            session = StudySession.objects.create(user=self.user, course=self.course, start_time=self.now)
+        active = UserDashboardSnapshot(self.user)['active_session']
+        self.assertEqual(active, {'id': session.id, 'course': {'title': 'Algebra'}, 'start_time': self.now})
+
+    def test_stats_count_hits_misses_and_rebuilds(self):
+        fields = len(UserDashboardSnapshot.FIELDS)
+        self.assertEqual(UserDashboardSnapshot.stats(), {'hits': 0, 'misses': 0, 'rebuilds': 0})
+
+        UserDashboardSnapshot(self.user).get()
+        self.assertEqual(UserDashboardSnapshot.stats(), {'hits': 0, 'misses': fields, 'rebuilds': 1})
+
+        UserDashboardSnapshot(self.user).get()
+        self.assertEqual(UserDashboardSnapshot.stats(), {'hits': fields, 'misses': fields, 'rebuilds': 1})
+
+        UserDashboardSnapshot.invalidate(self.user.id, 'notes_count')
+        UserDashboardSnapshot(self.user).get('notes_count', 'weekly_minutes')
+        self.assertEqual(UserDashboardSnapshot.stats(), {'hits': fields + 1, 'misses': fields + 1, 'rebuilds': 2})
+
+
+class StudyAnalyticsTests(TestCase):
+    """The analytics page and its JSON and CSV exports are served from the daily rollups"""
+
+    def setUp(self):
+        utc = get_zone('UTC')
+        patcher = mock.patch('django.utils.timezone.now', return_value=datetime(2026, 6, 3, tzinfo=utc))
+        patcher.start()  # noon on June 3rd in Auckland
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user(username='kea', password='pw')
+        profile = Profile.objects.get(user=self.user)
+        profile.time_zone = 'Pacific/Auckland'
+        profile.save()
+        self.algebra = Course.objects.create(title='Algebra', description='')
+        self.biology = Course.objects.create(title='Biology', description='')
+        # Auckland is UTC+12: the first three are on June 2nd there, the last on June 3rd
+        self.study(datetime(2026, 6, 1, 20, tzinfo=utc), 30, self.algebra)  # 08:00
+        self.study(datetime(2026, 6, 2, 2, tzinfo=utc), 60, self.biology)  # 14:00
+        self.study(datetime(2026, 6, 2, 7, tzinfo=utc), 20)  # 19:00
+        self.study(datetime(2026, 6, 2, 13, tzinfo=utc), 45, self.algebra)  # 01:00
+        self.client.force_login(self.user)
+
+    def study(self, start, minutes, course=None):
+        session = StudySession.objects.create(
+            user=self.user, course=course, start_time=start, end_time=start + timedelta(minutes=minutes),
+            duration=minutes, is_active=False,
+        )
+        DailyStudyRollup.add_session(session)
+
+    def test_all_time_totals(self):
+        with self.assertNumQueries(2):  # the rollups and the course titles
+            analytics = compute_user_analytics(self.user)
+        self.assertEqual(analytics['daily'], [
+            {'date': '2026-06-02', 'minutes': 110, 'sessions': 3},
+            {'date': '2026-06-03', 'minutes': 45, 'sessions': 1},
+        ])
+        self.assertEqual(
+            (analytics['morning_minutes'], analytics['afternoon_minutes'], analytics['evening_minutes']), (75, 60, 20)
+        )
+        self.assertEqual(analytics['course_breakdown'], [
+            {'course_id': self.algebra.id, 'course__title': 'Algebra', 'total_minutes': 75, 'session_count': 2},
+            {'course_id': self.biology.id, 'course__title': 'Biology', 'total_minutes': 60, 'session_count': 1},
+            {'course_id': None, 'course__title': 'No Course', 'total_minutes': 20, 'session_count': 1},
+        ])
+        self.assertEqual((analytics['total_sessions'], analytics['total_minutes']), (4, 155))
+        self.assertEqual(analytics['avg_session_minutes'], 38.75)
+
+    def test_window_and_series_days(self):
+        analytics = compute_user_analytics(self.user, 1)
+        self.assertEqual((analytics['start_date'], analytics['end_date']), ('2026-06-03', '2026-06-03'))
+        self.assertEqual(analytics['daily'], [{'date': '2026-06-03', 'minutes': 45, 'sessions': 1}])
+        self.assertEqual((analytics['total_minutes'], analytics['morning_minutes']), (45, 45))
+
+        analytics = compute_user_analytics(self.user, series_days=3)
+        self.assertEqual([day['minutes'] for day in analytics['daily']], [0, 110, 45])
+        self.assertEqual(analytics['total_minutes'], 155)
+
+    def test_json_shape(self):
+        response = self.client.get(reverse('api_study_analytics'), {'days': 2})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(set(data), {
+            'start_date', 'end_date', 'daily', 'course_breakdown', 'morning_minutes', 'afternoon_minutes',
+            'evening_minutes', 'total_sessions', 'total_minutes', 'avg_session_minutes',
+        })
+        self.assertEqual((data['start_date'], data['end_date']), ('2026-06-02', '2026-06-03'))
+        self.assertEqual([day['date'] for day in data['daily']], ['2026-06-02', '2026-06-03'])
+        self.assertEqual(data['course_breakdown'][0]['course__title'], 'Algebra')
+
+    def test_csv_shape(self):
+        response = self.client.get(reverse('study_analytics_export'), {'days': 'all'})
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        self.assertIn('filename="study-analytics-2026-06-03.csv"', response['Content-Disposition'])
+        self.assertEqual(response.content.decode().splitlines(), [
+            'date,minutes,sessions', '2026-06-02,110,3', '2026-06-03,45,1',
+        ])
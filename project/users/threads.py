@@ -0,0 +1,102 @@
+"""
+Reply trees for discussion threads, loaded through DiscussionReply.path.
+
+A reply's path is its ancestors' fixed-width ids followed by its own, so
+ordering by path lists a thread depth-first and every subtree is one path
+range. load_thread() fetches one page of top-level branches, or the subtree
+below one reply, in a single ordered query with the authors joined in, and
+build_tree() hangs the rows off their parents in one pass.
+
+Branches are cut off INLINE_DEPTH levels below where the page starts. The
+query reads one more level than it shows, so a reply at the cut-off knows
+whether it has hidden replies and can link to its own page (?thread=<id>)
+instead of the whole subtree being shipped with the discussion.
+"""
+from django.db.models import Subquery, Value
+from django.db.models.functions import Coalesce
+
+from .models import MAX_REPLY_DEPTH, REPLY_PATH_STEP
+
+BRANCHES_PER_PAGE = 20
+INLINE_DEPTH = 6
+
+# Sorts after every path (they are base-36 digits, no longer than this), so "prefix + PATH_END"
+# closes the range of a subtree. Ranges, unlike LIKE 'prefix%', are run off the index on SQLite.
+PATH_END = 'z' * (REPLY_PATH_STEP * MAX_REPLY_DEPTH)
+
+
+class ThreadPage:
+    def __init__(self, request, roots, focus=None, next_cursor=None, cursor=None):
+        self.request = request
+        self.roots = roots
+        self.focus = focus                  # reply whose subtree this page shows, if any
+        self.next_cursor = next_cursor      # path of the first top-level reply on the next page
+        self.cursor = cursor
+
+    def __iter__(self):
+        return iter(self.roots)
+
+    def __len__(self):
+        return len(self.roots)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def next_url(self):
+        if self.next_cursor is None:
+            return None
+        params = self.request.GET.copy()
+        params['cursor'] = self.next_cursor
+        return f'{self.request.path}?{params.urlencode()}'
+
+
+def build_tree(replies, max_depth):
+    """Top-level replies of ``replies`` (ordered by path) with ``tree_children`` lists attached.
+    Replies deeper than ``max_depth`` are dropped and mark their parent ``has_hidden_replies``."""
+    nodes = {}
+    roots = []
+    for reply in replies:
+        parent = nodes.get(reply.parent_id)
+        if reply.depth > max_depth:
+            if parent is not None:
+                parent.has_hidden_replies = True
+            continue
+        reply.tree_children = []
+        reply.has_hidden_replies = False
+        nodes[reply.pk] = reply
+        if parent is None:
+            roots.append(reply)
+        else:
+            parent.tree_children.append(reply)
+    return roots
+
+
+def load_thread(request, discussion, focus=None, per_page=BRANCHES_PER_PAGE):
+    """One page of ``discussion``'s top-level branches (from ?cursor=), or the subtree below ``focus``"""
+    cursor = request.GET.get('cursor', '')
+    if not (cursor.isascii() and cursor.isalnum()):
+        cursor = ''
+    replies = discussion.replies.select_related('author').order_by('path')
+
+    if focus is not None:
+        max_depth = focus.depth + INLINE_DEPTH - 1
+        rows = replies.filter(path__gte=focus.path, path__lte=focus.path + PATH_END, depth__lte=max_depth + 1)
+        return ThreadPage(request, build_tree(rows, max_depth), focus=focus)
+
+    # The page runs from the cursor up to and including the first top-level reply of the next page,
+    # found by a subquery so the page is still one query; that reply only says where to continue
+    roots = discussion.replies.filter(depth=0).order_by('path')
+    if cursor:
+        roots = roots.filter(path__gte=cursor)
+        replies = replies.filter(path__gte=cursor)
+    boundary = Subquery(roots.values('path')[per_page:per_page + 1])
+    replies = replies.filter(path__lte=Coalesce(boundary, Value(PATH_END)))
+    max_depth = INLINE_DEPTH - 1
+    rows = list(replies.filter(depth__lte=max_depth + 1))
+
+    next_cursor = None
+    if sum(1 for reply in rows if reply.depth == 0) > per_page:
+        next_cursor = rows.pop().path
+    return ThreadPage(request, build_tree(rows, max_depth), next_cursor=next_cursor, cursor=cursor)
@@ -0,0 +1,188 @@
+"""
+Chunked, resumable uploads into content-addressed blob storage.
+
+A client opens an UploadSession with the file's name and size, then PUTs
+the bytes in order, each chunk carrying its offset; after a dropped
+connection it asks the session for the offset it reached and carries on
+from there. Chunks are appended to a partial file under
+MEDIA_ROOT/uploads/partial/ and fed to a SHA-256 hasher as they stream in.
+The hasher lives in the worker process that received the previous chunk,
+tagged with the offset it has hashed up to; it is only reused when that
+offset is still where the session stands, otherwise (a resume that landed
+on another process in between, a lost hasher) the partial file is rehashed.
+The finished file is hashed once more before it is stored, so a blob is
+always named by the bytes actually on disk.
+
+When the last byte arrives the digest names the blob: new content is moved
+to blobs/<aa>/<sha256>, content already stored is discarded, so identical
+files are kept once. ResourceBlob.ref_count counts the resources using a
+blob; release_blob() unlinks the file when the last one goes away. Sessions
+and unreferenced blobs left behind are removed by ``manage.py purge_uploads``.
+"""
+import hashlib
+import logging
+import os
+import threading
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import ResourceBlob, SharedResource, UploadSession
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 8 * 1024 * 1024
+
+# session id -> (offset, hasher fed with the first ``offset`` bytes of the partial file), for this process only
+_hashers = {}
+_hashers_lock = threading.Lock()
+
+
+class UploadError(Exception):
+    pass
+
+
+class OffsetMismatch(UploadError):
+    """The chunk does not start where the session left off"""
+
+    def __init__(self, expected):
+        super().__init__(f'Expected a chunk at offset {expected}.')
+        self.expected = expected
+
+
+def partial_path(session):
+    return os.path.join(settings.MEDIA_ROOT, 'uploads', 'partial', str(session.id))
+
+
+def blob_name(digest):
+    return f'blobs/{digest[:2]}/{digest}'
+
+
+def _hash_file(path, length):
+    """A SHA-256 hasher fed with the first ``length`` bytes of ``path``"""
+    hasher = hashlib.sha256()
+    remaining = length
+    if remaining:
+        with open(path, 'rb') as partial:
+            while remaining:
+                chunk = partial.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    raise UploadError('The partial file is shorter than the bytes received.')
+                hasher.update(chunk)
+                remaining -= len(chunk)
+    return hasher
+
+
+def _hasher_for(session):
+    with _hashers_lock:
+        offset, hasher = _hashers.pop(session.id, (None, None))
+    if hasher is not None and offset == session.received:
+        return hasher
+    # Another process took chunks since this hasher was cached, or none is cached: catch up from the partial file
+    return _hash_file(partial_path(session), session.received)
+
+
+def receive_chunk(session, stream, offset, length):
+    """Append ``length`` bytes read from ``stream`` at ``offset``; finalizes the session on the last byte"""
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().get(pk=session.pk)
+        if session.is_complete or offset != session.received:
+            raise OffsetMismatch(session.received)
+        if length > MAX_CHUNK_SIZE or offset + length > session.size:
+            raise UploadError('The chunk is larger than the rest of the file.')
+
+        hasher = _hasher_for(session)
+        path = partial_path(session)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        written = 0
+        with open(path, 'ab') as partial:
+            partial.truncate(offset)  # drop bytes a failed earlier attempt left behind
+            while written < length:
+                chunk = stream.read(min(CHUNK_SIZE, length - written))
+                if not chunk:
+                    break
+                partial.write(chunk)
+                hasher.update(chunk)
+                written += len(chunk)
+        if written != length:
+            # The connection dropped mid-chunk; the client resumes from session.received
+            raise UploadError('The chunk ended early.')
+
+        session.received = offset + written
+        if session.received == session.size:
+            digest = _hash_file(path, session.size).hexdigest()
+            if digest != hasher.hexdigest():
+                logger.error('Upload %s: streamed digest %s does not match the file, storing it as %s',
+                             session.id, hasher.hexdigest(), digest)
+            session.blob = store_blob(path, digest, session.size)
+        else:
+            with _hashers_lock:
+                _hashers[session.id] = (session.received, hasher)
+        session.save(update_fields=['received', 'blob', 'updated_at'])
+    return session
+
+
+def store_blob(path, digest, size):
+    """Move the file at ``path`` into the blob store, or drop it when that content is already stored"""
+    name = blob_name(digest)
+    blob = ResourceBlob.objects.filter(sha256=digest).first()
+    if blob is None:
+        target = os.path.join(settings.MEDIA_ROOT, name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(path, target)
+        try:
+            with transaction.atomic():
+                return ResourceBlob.objects.create(sha256=digest, file=name, size=size)
+        except IntegrityError:
+            # Stored concurrently by another upload of the same content, into the same path
+            return ResourceBlob.objects.get(sha256=digest)
+    os.remove(path)
+    return blob
+
+
+def store_uploaded_file(uploaded_file):
+    """Blob for a file that arrived in a single multipart POST, hashed as it is copied"""
+    hasher = hashlib.sha256()
+    path = os.path.join(settings.MEDIA_ROOT, 'uploads', 'partial', f'{os.getpid()}-{threading.get_ident()}')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    size = 0
+    with open(path, 'wb') as partial:
+        for chunk in uploaded_file.chunks(CHUNK_SIZE):
+            partial.write(chunk)
+            hasher.update(chunk)
+            size += len(chunk)
+    return store_blob(path, hasher.hexdigest(), size)
+
+
+def attach_blob(resource, blob, filename):
+    """Point ``resource`` (not yet saved) at ``blob`` and take a reference to it"""
+    if not ResourceBlob.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') + 1):
+        raise UploadError('The uploaded file expired; please upload it again.')
+    resource.blob = blob
+    resource.file.name = blob.file.name
+    resource.file_size = blob.size
+    resource.original_filename = filename
+
+
+def release_blob(resource):
+    """Drop ``resource``'s reference to its blob, deleting the blob with its last reference"""
+    with transaction.atomic():
+        blob = ResourceBlob.objects.select_for_update().get(pk=resource.blob_id)
+        blob.ref_count -= 1
+        if blob.ref_count > 0:
+            blob.save(update_fields=['ref_count'])
+            return
+        # Unhook the resource first; the blob is protected while anything points at it
+        SharedResource.objects.filter(pk=resource.pk).update(blob=None)
+        blob.delete()
+        transaction.on_commit(lambda: blob.file.delete(save=False))
+
+
+def discard_session(session):
+    with _hashers_lock:
+        _hashers.pop(session.id, None)
+    if os.path.exists(partial_path(session)):
+        os.remove(partial_path(session))
+    session.delete()
@@ -11,11 +11,14 @@ urlpatterns = [
     path('study/end/', views.end_session, name='end_session'),
     path('study/history/', views.study_history, name='study_history'),
     path('study/analytics/', views.study_analytics, name='study_analytics'),
+    path('study/analytics/export/', views.study_analytics_export, name='study_analytics_export'),
+    path('api/analytics/', views.study_analytics_api, name='api_study_analytics'),
     path('study/schedule/', views.schedule_list, name='study_schedule'),
     path('study/schedule/create/', views.schedule_create, name='study_schedule_create'),
     path('study/schedule/<int:schedule_id>/delete/', views.schedule_delete, name='study_schedule_delete'),
     path('study/schedule/<int:schedule_id>/edit/', views.schedule_edit, name='study_schedule_edit'),
     path('study/schedule/calendar/', views.schedule_calendar, name='study_schedule_calendar'),
+    path('study/schedule/<int:schedule_id>/occurrence/', views.schedule_occurrence_update, name='study_schedule_occurrence'),
     path('api/schedule/events/', views.schedule_events_api, name='api_schedule_events'),
     path('study/goals/', views.manage_goals, name='manage_goals'),
     path('study/goals/delete/<int:goal_id>/', views.delete_goal, name='delete_goal'),
@@ -30,13 +33,17 @@ urlpatterns = [
     path('notes/<int:note_id>/favorite/', views.toggle_note_favorite, name='toggle_note_favorite'),
     
     # Categories URLs
+    path('api/notes/tags/', views.note_tag_cloud, name='note_tag_cloud'),
     path('notes/categories/', views.categories_manage, name='categories_manage'),
     path('notes/categories/<int:category_id>/delete/', views.category_delete, name='category_delete'),
     
     # Resources URLs
     path('resources/', views.resources_library, name='resources_library'),
     path('resources/upload/', views.resource_upload, name='resource_upload'),
+    path('api/uploads/', views.upload_session_create, name='upload_session_create'),
+    path('api/uploads/<uuid:session_id>/', views.upload_session_detail, name='upload_session_detail'),
     path('resources/<int:resource_id>/', views.resource_view, name='resource_view'),
+    path('resources/<int:resource_id>/download/', views.resource_download, name='resource_download'),
     path('resources/<int:resource_id>/delete/', views.resource_delete, name='resource_delete'),
     
     # Study Groups URLs
@@ -58,6 +65,8 @@ urlpatterns = [
     
     # Notification URLs (AJAX endpoints)
     path('api/notifications/', views.get_notifications, name='get_notifications'),
+    path('api/notifications/stream/', views.notification_stream, name='notification_stream'),
+    path('api/notifications/poll/', views.notification_poll, name='notification_poll'),
     path('api/notifications/<int:notification_id>/read/', views.mark_notification_read, name='mark_notification_read'),
     path('api/notifications/read-all/', views.mark_all_notifications_read, name='mark_all_notifications_read'),
     
@@ -67,5 +76,8 @@ urlpatterns = [
     
     # Activity Feed URL
     path('api/activity/', views.get_activity_feed, name='get_activity_feed'),
+
+    # Dashboard snapshot cache counters
+    path('api/dashboard/stats/', views.dashboard_cache_stats, name='dashboard_cache_stats'),
 ]
 
@@ -1,24 +1,75 @@
+import asyncio
+import json
 import logging
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib import messages
 from django.contrib.auth import login
 from django.contrib.auth.decorators import login_required
+from django.core.paginator import Paginator
 from django.utils import timezone
-from django.http import JsonResponse
-from django.db import DatabaseError
+from django.utils.dateparse import parse_date, parse_datetime
+from django.views.decorators.vary import vary_on_headers
+from django.http import (
+    Http404, HttpResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse,
+)
+from django.db import DatabaseError, IntegrityError, transaction
 from django.db.models import Sum, Count, Q
 from datetime import datetime, timedelta
+from . import counters, feed, threads, uploads
+from .analytics import compute_user_analytics
+from .conditional import cache_is_shared, user_resource_condition
+from .downloads import serve_file
+from .pagination import paginate, wants_json
+from .schedules import expand_schedules, is_occurrence
+from .search import search_notes
+from .dashboard import UserDashboardSnapshot
+from .notifications import (
+    STREAM_BATCH_SIZE, aunread_count, hub, mark_read, notification_payload, serialize_notification, version_key,
+)
 from .forms import UserRegisterForm, UserUpdateForm, ProfileUpdateForm
 from .models import (
-    StudySession, StudyGoal, NoteCategory, StudyNote, SharedResource,
-    StudyGroup, GroupMembership, Discussion, DiscussionReply, PeerReview
+    StudySession, DailyStudyRollup, StudyGoal, NoteCategory, StudyNote, SharedResource,
+    StudyGroup, GroupMembership, Discussion, DiscussionReply, PeerReview, Tag, UploadSession,
+    normalize_tags,
 )
 from courses.models import Course
+import csv
 import os
 
 logger = logging.getLogger(__name__)
 
+NOTES_PER_PAGE = 24
+RESOURCES_PER_PAGE = 24
+GROUPS_PER_PAGE = 24
+SESSIONS_PER_PAGE = 50
+DISCUSSIONS_PER_PAGE = 30
+
+# Cursor orderings; each ends with the primary key, in the same direction as the
+# columns before it so one composite index serves the scan forwards and backwards
+NOTE_ORDERING = ('-is_pinned', '-updated_at', '-id')
+SESSION_ORDERING = ('-start_time', '-id')
+RESOURCE_ORDERING = ('-created_at', '-id')
+RESOURCE_SORTS = {
+    'newest': RESOURCE_ORDERING,
+    'views': ('-views', '-id'),
+    'downloads': ('-downloads', '-id'),
+}
+GROUP_ORDERING = ('-created_at', '-id')
+GROUP_SORTS = {
+    'newest': GROUP_ORDERING,
+    'popular': ('-member_count', '-created_at', '-id'),
+}
+DISCUSSION_ORDERING = ('-is_pinned', '-updated_at', '-id')
+DISCUSSION_SORTS = {
+    'updated': DISCUSSION_ORDERING,
+    'activity': ('-is_pinned', '-last_activity_at', '-id'),
+}
+
 
 def safe_queryset_count(qs):
     """Safely count documents, falling back when Djongo cannot translate COUNT."""
@@ -35,16 +86,57 @@ def safe_queryset_count(qs):
 
 def get_inactive_sessions(user, order_by='-start_time', limit=None):
     """
-    Safely retrieve inactive (completed) study sessions.
-    Djongo has recursion issues with is_active=False, so we fetch all and filter in Python.
+    Retrieve inactive (completed) study sessions as a lazy queryset.
+    Filtering, ordering and limiting all happen in SQL.
     """
+    sessions = StudySession.objects.for_user(user).completed().select_related('course').order_by(order_by)
+    return sessions[:limit] if limit else sessions
+
+
+def analytics_window(request, default=None):
+    """Read the ?days=N analytics window; 'all' or missing means the default"""
+    days = request.GET.get('days', '')
+    if days.isdigit() and int(days) > 0:
+        return int(days)
+    return None if days == 'all' else default
+
+
+def parse_window_bound(value):
+    """Parse a FullCalendar start/end parameter (ISO date or datetime) as an aware datetime"""
+    moment = parse_datetime(value.replace(' ', '+'))
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f'Invalid date: {value!r}')
+        moment = datetime.combine(day, datetime.min.time())
+    return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+
+
+def parse_recurrence_until(value):
+    """Parse the optional "repeat until" input; a bare date includes that whole day"""
+    if not value:
+        return None
+    day = parse_date(value)
+    if day is not None:
+        return timezone.make_aware(datetime.combine(day, datetime.max.time()))
     try:
-        all_sessions = list(StudySession.objects.filter(user=user).order_by(order_by))
-        inactive = [s for s in all_sessions if not s.is_active]
-        return inactive[:limit] if limit else inactive
-    except Exception as exc:
-        logger.error("Failed to load inactive sessions for user %s: %s", user.username, exc)
-        return []
+        return parse_window_bound(value)
+    except ValueError:
+        return None
+
+
+def schedule_window(request):
+    """Read the ?start=&end= calendar window; defaults to the coming four weeks"""
+    start, end = request.GET.get('start'), request.GET.get('end')
+    today = timezone.make_aware(datetime.combine(timezone.localdate(), datetime.min.time()))
+    start = parse_window_bound(start) if start else today
+    end = parse_window_bound(end) if end else start + timedelta(days=28)
+    return start, end
+
+
+def get_active_session(user):
+    """Return the user's running study session, or None"""
+    return StudySession.objects.for_user(user).active().order_by('-start_time').first()
 
 def register(request):
     if request.method == "POST":                                                                            #This checks if the request is GET or POST (GET means "someone has just entered the register") and (POST means "someone has entered the register page and typed the details and since in the register.htlm we used POST .it returns back to the views.py file as POST along with the user typed data")
@@ -64,33 +156,20 @@ def register(request):
 
 @login_required
 def profile(request):
-    # Ensure profile exists and gather high-level stats for dashboard view
-    from .models import Profile
-
-    profile_obj, _ = Profile.objects.get_or_create(user=request.user)
-
-    notes_count = StudyNote.objects.filter(user=request.user).count()
-    resources_count = SharedResource.objects.filter(user=request.user).count()
-    groups_count = GroupMembership.objects.filter(user=request.user).count()
-    
-    # Fetch all goals and filter is_active in Python
-    all_user_goals = list(StudyGoal.objects.filter(user=request.user))
-    active_goals = [g for g in all_user_goals if g.is_active]
-    goals_count = len(active_goals)
-    
-    badges_count = request.user.earned_badges.count() if hasattr(request.user, 'earned_badges') else 0
+    # High-level stats for the dashboard view (users.signals creates every user's profile)
+    profile_obj = request.user.profile
 
-    recent_sessions = get_inactive_sessions(request.user, limit=5)
+    snapshot = UserDashboardSnapshot(request.user).get()
     recent_activity = request.user.activities.order_by('-created_at')[:5] if hasattr(request.user, 'activities') else []
 
     context = {
         'profile': profile_obj,
-        'notes_count': notes_count,
-        'resources_count': resources_count,
-        'groups_count': groups_count,
-        'goals_count': goals_count,
-        'badges_count': badges_count,
-        'recent_sessions': recent_sessions,
+        'notes_count': snapshot['notes_count'],
+        'resources_count': snapshot['resources_count'],
+        'groups_count': snapshot['groups_count'],
+        'goals_count': snapshot['goals_count'],
+        'badges_count': snapshot['badges_count'],
+        'recent_sessions': snapshot['recent_sessions'][:5],
         'recent_activity': recent_activity,
     }
     return render(request, 'users/profile.html', context)
@@ -134,51 +213,20 @@ def logout_confirm(request):
 @login_required
 def study_dashboard(request):
     """Main study tracking dashboard with timer and analytics"""
-    # Get active session - fetch all user sessions and filter in Python
-    all_sessions = list(StudySession.objects.filter(user=request.user))
-    active_sessions = [s for s in all_sessions if s.is_active]
-    active_session = active_sessions[0] if active_sessions else None
-    
-    # Get user's active goals - fetch all goals and filter in Python
-    all_goals = list(StudyGoal.objects.filter(user=request.user))
-    goals = [g for g in all_goals if g.is_active]
-    goals_data = [{'goal': goal, 'progress': goal.get_progress()} for goal in goals]
-    
-    # Get recent sessions (last 10)
-    recent_sessions = get_inactive_sessions(request.user, limit=10)
-    
-    # Calculate today's study time
-    today = timezone.now().date()
-    today_start = timezone.make_aware(datetime.combine(today, datetime.min.time()))
-    
-    # Get all user sessions, filter today's inactive ones in Python
-    all_user_sessions = list(StudySession.objects.filter(user=request.user, start_time__gte=today_start))
-    today_sessions = [s for s in all_user_sessions if not s.is_active]
-    today_minutes = sum(session.duration for session in today_sessions)
-    
-    # Get weekly stats
-    week_start = timezone.now() - timedelta(days=timezone.now().weekday())
-    week_start = week_start.replace(hour=0, minute=0, second=0, microsecond=0)
-    
-    all_week_sessions = list(StudySession.objects.filter(user=request.user, start_time__gte=week_start))
-    weekly_sessions = [s for s in all_week_sessions if not s.is_active]
-    weekly_minutes = sum(session.duration for session in weekly_sessions)
+    # The running session, goal progress, recent sessions and today's/weekly study time come from the cached snapshot
+    snapshot = UserDashboardSnapshot(request.user).get()
     
     # Get all courses (no enrollment system in simplified version)
     enrolled_courses = Course.objects.all()
     
-    # Ensure profile exists
-    from .models import Profile
-    profile, created = Profile.objects.get_or_create(user=request.user)
-    
     context = {
-        'active_session': active_session,
-        'goals_data': goals_data,
-        'recent_sessions': recent_sessions,
-        'today_minutes': today_minutes,
-        'weekly_minutes': weekly_minutes,
+        'active_session': snapshot['active_session'],
+        'goals_data': snapshot['active_goals'],
+        'recent_sessions': snapshot['recent_sessions'],
+        'today_minutes': snapshot['today_minutes'],
+        'weekly_minutes': snapshot['weekly_minutes'],
         'enrolled_courses': enrolled_courses,
-        'profile': profile,
+        'profile': request.user.profile,
     }
     return render(request, 'users/study_dashboard.html', context)
 
@@ -186,12 +234,8 @@ def study_dashboard(request):
 @login_required
 def start_session(request):
     """Start a new study session"""
-    # Check if there's already an active session - fetch all and filter in Python
-    all_sessions = list(StudySession.objects.filter(user=request.user))
-    active_sessions = [s for s in all_sessions if s.is_active]
-    active_session = active_sessions[0] if active_sessions else None
-    
-    if active_session:
+    # Check if there's already an active session
+    if StudySession.objects.for_user(request.user).active().exists():
         messages.warning(request, 'You already have an active study session!')
         return redirect('study_dashboard')
     
@@ -214,10 +258,7 @@ def start_session(request):
 @login_required
 def end_session(request):
     """End the active study session"""
-    # Fetch all sessions and filter active ones in Python
-    all_sessions = list(StudySession.objects.filter(user=request.user))
-    active_sessions = [s for s in all_sessions if s.is_active]
-    active_session = active_sessions[0] if active_sessions else None
+    active_session = get_active_session(request.user)
     
     if not active_session:
         messages.error(request, 'No active session found!')
@@ -239,45 +280,49 @@ def end_session(request):
 def study_history(request):
     """View study session history with filters"""
     sessions = get_inactive_sessions(request.user)
+    rollups = DailyStudyRollup.objects.filter(user=request.user)
     
     # Filter by date range
     date_from = request.GET.get('date_from')
     date_to = request.GET.get('date_to')
     course_id = request.GET.get('course')
     
-    # Apply filters in Python since we already have the list
     if date_from:
-        from datetime import datetime
         date_from_obj = datetime.strptime(date_from, '%Y-%m-%d').date()
-        sessions = [s for s in sessions if s.start_time.date() >= date_from_obj]
+        sessions = sessions.filter(start_time__date__gte=date_from_obj)
+        rollups = rollups.in_range(start_date=date_from_obj)
     if date_to:
-        from datetime import datetime
         date_to_obj = datetime.strptime(date_to, '%Y-%m-%d').date()
-        sessions = [s for s in sessions if s.start_time.date() <= date_to_obj]
+        sessions = sessions.filter(start_time__date__lte=date_to_obj)
+        rollups = rollups.in_range(end_date=date_to_obj)
     if course_id:
-        sessions = [s for s in sessions if s.course_id == int(course_id)]
+        sessions = sessions.filter(course_id=int(course_id))
+        rollups = rollups.filter(course_id=int(course_id))
     
-    # Calculate totals
-    total_sessions = len(sessions)
-    total_minutes = sum(session.duration for session in sessions)
-    total_hours = total_minutes / 60.0
+    page_obj = paginate(request, sessions, SESSION_ORDERING, SESSIONS_PER_PAGE)
+    if wants_json(request):
+        return page_obj.json_response(session_json)
     
-    # Group by course (manual aggregation)
-    course_stats_dict = {}
-    for session in sessions:
-        course_title = session.course.title if session.course else "General Study"
-        if course_title not in course_stats_dict:
-            course_stats_dict[course_title] = {'total_time': 0, 'session_count': 0, 'course__title': course_title}
-        course_stats_dict[course_title]['total_time'] += session.duration
-        course_stats_dict[course_title]['session_count'] += 1
+    # Calculate totals from the daily rollups
+    totals = rollups.totals()
+    total_sessions = totals['session_count']
+    total_minutes = totals['minutes']
+    total_hours = total_minutes / 60.0
     
-    course_stats = sorted(course_stats_dict.values(), key=lambda x: x['total_time'], reverse=True)
+    # Group by course
+    course_stats = [
+        {**stat, 'course__title': stat['course__title'] or "General Study"}
+        for stat in rollups.order_by().values('course__title').annotate(
+            total_time=Sum('minutes'), session_count=Sum('session_count')
+        ).order_by('-total_time')
+    ]
     
     # Get all courses (no enrollment system in simplified version)
     enrolled_courses = Course.objects.all()
     
     context = {
-        'sessions': sessions,
+        'sessions': page_obj,
+        'page_obj': page_obj,
         'total_sessions': total_sessions,
         'total_minutes': total_minutes,
         'total_hours': total_hours,
@@ -287,6 +332,17 @@ def study_history(request):
     return render(request, 'users/study_history.html', context)
 
 
+def session_json(session):
+    return {
+        'id': session.id,
+        'course': session.course.title if session.course else None,
+        'start_time': session.start_time,
+        'end_time': session.end_time,
+        'duration': session.duration,
+        'notes': session.notes,
+    }
+
+
 @login_required
 def schedule_list(request):
     """List scheduled study events (simple calendar/list view)."""
@@ -330,6 +386,7 @@ def schedule_create(request):
         end = request.POST.get('scheduled_end')
         duration = request.POST.get('duration_minutes')
         recurrence = request.POST.get('recurrence', 'none')
+        recurrence_until = request.POST.get('recurrence_until')
         reminder = request.POST.get('reminder_minutes_before', 15)
 
         try:
@@ -356,6 +413,7 @@ def schedule_create(request):
             duration_minutes=int(duration) if duration else None,
             is_recurring=(recurrence != 'none'),
             recurrence=recurrence,
+            recurrence_until=parse_recurrence_until(recurrence_until),
             reminder_minutes_before=int(reminder) if reminder else 15,
         )
 
@@ -377,28 +435,81 @@ def schedule_delete(request, schedule_id):
     return render(request, 'users/schedule_delete_confirm.html', {'schedule': schedule})
 
 
+def occurrence_event(occurrence):
+    """FullCalendar event for one schedule occurrence"""
+    schedule = occurrence.schedule
+    return {
+        'id': schedule.id,
+        'groupId': schedule.id if schedule.recurrence != 'none' else None,
+        'title': occurrence.title,
+        'series_title': schedule.title,
+        'start': occurrence.scheduled_start.isoformat(),
+        'end': occurrence.scheduled_end.isoformat() if occurrence.scheduled_end else None,
+        'allDay': False,
+        'description': occurrence.description,
+        'duration_minutes': schedule.duration_minutes,
+        'recurrence': schedule.recurrence,
+        'recurrence_until': schedule.recurrence_until.isoformat() if schedule.recurrence_until else None,
+        'reminder_minutes_before': schedule.reminder_minutes_before,
+        'occurrence_start': occurrence.original_start.isoformat(),
+        'is_override': occurrence.is_override,
+        'series_start': schedule.scheduled_start.isoformat(),
+        'series_end': schedule.scheduled_end.isoformat() if schedule.scheduled_end else None,
+    }
+
+
 @login_required
+@user_resource_condition('schedule', extra=lambda request: timezone.localdate())
 def schedule_events_api(request):
-    """Return schedules as JSON events (for calendar widgets)."""
-    from .models import StudySchedule
-    schedules = StudySchedule.objects.filter(user=request.user, is_active=True)
+    """Return the schedule occurrences in the ?start=&end= window as JSON events (for calendar widgets)."""
+    try:
+        start, end = schedule_window(request)
+        occurrences = expand_schedules(request.user, start, end)
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
 
-    data = []
-    for s in schedules:
-        event = {
-            'id': s.id,
-            'title': s.title,
-            'start': s.scheduled_start.isoformat(),
-            'end': s.scheduled_end.isoformat() if s.scheduled_end else None,
-            'allDay': False,
-            'description': s.description,
-            'duration_minutes': s.duration_minutes,
-            'recurrence': s.recurrence,
-            'reminder_minutes_before': s.reminder_minutes_before,
-        }
-        data.append(event)
+    return JsonResponse([occurrence_event(occurrence) for occurrence in occurrences], safe=False)
 
-    return JsonResponse(data, safe=False)
+
+@login_required
+def schedule_occurrence_update(request, schedule_id):
+    """Cancel, change or restore one occurrence of a recurring schedule.
+
+    POST occurrence_start plus either cancel=1, restore=1 or any of title,
+    description, scheduled_start and scheduled_end to override.
+    """
+    from .models import StudySchedule, ScheduleOccurrenceException
+
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST required'}, status=405)
+    schedule = get_object_or_404(StudySchedule, id=schedule_id, user=request.user)
+
+    try:
+        original_start = parse_window_bound(request.POST.get('occurrence_start', ''))
+        overrides = {
+            field: parse_window_bound(request.POST[field]) if request.POST.get(field) else None
+            for field in ('scheduled_start', 'scheduled_end')
+        }
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    if not is_occurrence(schedule, original_start):
+        return JsonResponse({'error': 'No occurrence of this schedule starts then.'}, status=400)
+
+    if request.POST.get('restore'):
+        ScheduleOccurrenceException.objects.filter(schedule=schedule, original_start=original_start).delete()
+        return JsonResponse({'success': True, 'restored': True})
+
+    exception, created = ScheduleOccurrenceException.objects.update_or_create(
+        schedule=schedule,
+        original_start=original_start,
+        defaults={
+            'is_cancelled': bool(request.POST.get('cancel')),
+            'title': request.POST.get('title', ''),
+            'description': request.POST.get('description', ''),
+            **overrides,
+        },
+    )
+    return JsonResponse({'success': True, 'cancelled': exception.is_cancelled})
 
 
 @login_required
@@ -436,6 +547,7 @@ def schedule_edit(request, schedule_id):
         schedule.duration_minutes = int(duration) if duration else None
         schedule.is_recurring = (recurrence != 'none')
         schedule.recurrence = recurrence
+        schedule.recurrence_until = parse_recurrence_until(request.POST.get('recurrence_until'))
         schedule.reminder_minutes_before = int(reminder) if reminder else 15
         schedule.save()
 
@@ -456,75 +568,48 @@ def schedule_calendar(request):
 @login_required
 def study_analytics(request):
     """Advanced analytics and visualizations"""
-    import json
-    
-    # Get all completed sessions
-    all_sessions = get_inactive_sessions(request.user)
-    
-    # Last 30 days data for chart
-    thirty_days_ago = timezone.now() - timedelta(days=30)
-    recent_sessions = [s for s in all_sessions if s.start_time >= thirty_days_ago]
-    
-    # Daily breakdown for last 30 days
-    daily_data = []
-    for i in range(30):
-        date = (timezone.now() - timedelta(days=i)).date()
-        day_start = timezone.make_aware(datetime.combine(date, datetime.min.time()))
-        day_end = timezone.make_aware(datetime.combine(date, datetime.max.time()))
-        
-        day_sessions = [s for s in recent_sessions if day_start <= s.start_time <= day_end]
-        day_minutes = sum(session.duration for session in day_sessions)
-        
-        daily_data.append({
-            'date': date.strftime('%Y-%m-%d'),
-            'minutes': day_minutes
-        })
-    
-    daily_data.reverse()
-    
-    # Course breakdown - manually aggregate in Python
-    from collections import defaultdict
-    course_stats = defaultdict(lambda: {'total_minutes': 0, 'session_count': 0})
-    
-    for session in all_sessions:
-        course_title = session.course.title if session.course else 'No Course'
-        course_stats[course_title]['total_minutes'] += session.duration
-        course_stats[course_title]['session_count'] += 1
-    
-    # Convert to list and sort by total_minutes
-    course_breakdown = [
-        {'course__title': title, **stats}
-        for title, stats in sorted(course_stats.items(), key=lambda x: x[1]['total_minutes'], reverse=True)[:5]
-    ]
-    
-    # Time of day analysis - manually aggregate in Python
-    morning_minutes = sum(s.duration for s in all_sessions if s.start_time.hour < 12)
-    afternoon_minutes = sum(s.duration for s in all_sessions if 12 <= s.start_time.hour < 18)
-    evening_minutes = sum(s.duration for s in all_sessions if s.start_time.hour >= 18)
-    
-    # Overall stats
-    total_sessions = len(all_sessions)
-    total_minutes = sum(session.duration for session in all_sessions)
-    avg_session = total_minutes / total_sessions if total_sessions > 0 else 0
+    analytics = compute_user_analytics(request.user, analytics_window(request), series_days=30)
     
     # Ensure profile exists
     from .models import Profile
     profile, created = Profile.objects.get_or_create(user=request.user)
     
     context = {
-        'daily_data': json.dumps(daily_data),
-        'course_breakdown': json.dumps(course_breakdown),
-        'morning_minutes': morning_minutes,
-        'afternoon_minutes': afternoon_minutes,
-        'evening_minutes': evening_minutes,
-        'total_sessions': total_sessions,
-        'total_hours': total_minutes / 60.0,
-        'avg_session_minutes': avg_session,
+        'daily_data': json.dumps(analytics['daily']),
+        'course_breakdown': json.dumps(analytics['course_breakdown'][:5]),
+        'morning_minutes': analytics['morning_minutes'],
+        'afternoon_minutes': analytics['afternoon_minutes'],
+        'evening_minutes': analytics['evening_minutes'],
+        'total_sessions': analytics['total_sessions'],
+        'total_hours': analytics['total_minutes'] / 60.0,
+        'avg_session_minutes': analytics['avg_session_minutes'],
         'profile': profile,
     }
     return render(request, 'users/study_analytics.html', context)
 
 
+@login_required
+def study_analytics_api(request):
+    """Return study analytics as JSON (defaults to the last 30 days)"""
+    return JsonResponse(compute_user_analytics(request.user, analytics_window(request, default=30)))
+
+
+@login_required
+def study_analytics_export(request):
+    """Download the daily study series as CSV (defaults to the last 30 days)"""
+    analytics = compute_user_analytics(request.user, analytics_window(request, default=30))
+    
+    response = HttpResponse(content_type='text/csv')
+    response['Content-Disposition'] = (
+        f'attachment; filename="study-analytics-{analytics["end_date"]}.csv"'
+    )
+    writer = csv.writer(response)
+    writer.writerow(['date', 'minutes', 'sessions'])
+    for day in analytics['daily']:
+        writer.writerow([day['date'], day['minutes'], day['sessions']])
+    return response
+
+
 @login_required
 def manage_goals(request):
     """Manage study goals"""
@@ -532,13 +617,11 @@ def manage_goals(request):
         goal_type = request.POST.get('goal_type')
         target_minutes = request.POST.get('target_minutes')
         
-        # Deactivate existing goal of same type - fetch all and filter in Python
+        # Deactivate existing goal of same type
         try:
-            all_goals = list(StudyGoal.objects.filter(user=request.user, goal_type=goal_type))
-            existing_goals = [g for g in all_goals if g.is_active]
-            for goal in existing_goals:
+            for goal in StudyGoal.objects.filter(user=request.user, goal_type=goal_type, is_active=True):
                 goal.is_active = False
-                goal.save()
+                goal.save(update_fields=['is_active'])
         except Exception as exc:
             logger.warning("Could not deactivate old goals: %s", exc)
         
@@ -552,9 +635,7 @@ def manage_goals(request):
         messages.success(request, f'{goal_type.capitalize()} goal set successfully!')
         return redirect('study_dashboard')
     
-    # Fetch all goals and filter active ones in Python
-    all_goals = list(StudyGoal.objects.filter(user=request.user))
-    goals = [g for g in all_goals if g.is_active]
+    goals = StudyGoal.objects.filter(user=request.user, is_active=True)
     return render(request, 'users/manage_goals.html', {'goals': goals})
 
 
@@ -584,35 +665,88 @@ def notes_list(request):
         notes = notes.filter(category_id=category_id)
     if course_id:
         notes = notes.filter(course_id=course_id)
-    if search:
-        notes = notes.filter(Q(title__icontains=search) | Q(content__icontains=search) | Q(tags__icontains=search))
-    
     if filter_type == 'pinned':
-        # Fetch all notes then filter is_pinned in Python
-        all_notes = list(notes)
-        notes = [n for n in all_notes if n.is_pinned]
-        notes_count = len(notes)
+        notes = notes.filter(is_pinned=True)
     elif filter_type == 'favorites':
-        # Fetch all notes then filter is_favorite in Python
-        all_notes = list(notes)
-        notes = [n for n in all_notes if n.is_favorite]
-        notes_count = len(notes)
+        notes = notes.filter(is_favorite=True)
+    
+    # ?tag=a&tag=b matches notes with every tag, or any of them with &tag_mode=any
+    selected_tags = normalize_tags(','.join(request.GET.getlist('tag')))
+    match_all = request.GET.get('tag_mode') != 'any'
+    if selected_tags:
+        notes = notes.tagged(request.user, selected_tags, match_all=match_all)
+    
+    # Ranked full-text matches when searching, pinned then most recent otherwise
+    if search:
+        page_obj = Paginator(search_notes(notes, search), NOTES_PER_PAGE).get_page(request.GET.get('page'))
+        total_notes = page_obj.paginator.count
     else:
-        notes_count = notes.count()
+        notes = notes.select_related('category', 'course').prefetch_related('tag_objects')
+        page_obj = paginate(request, notes, NOTE_ORDERING, NOTES_PER_PAGE)
+        if wants_json(request):
+            return page_obj.json_response(note_json)
+        total_notes = notes.count()
+    
+    cloud = tag_cloud(request.user)
+    for entry in cloud:
+        params = request.GET.copy()
+        params.pop('page', None)
+        params.pop('cursor', None)
+        entry['selected'] = entry['name'] in selected_tags
+        if entry['selected']:
+            params.setlist('tag', [name for name in selected_tags if name != entry['name']])
+        else:
+            params.setlist('tag', selected_tags + [entry['name']])
+        entry['url'] = f'?{params.urlencode()}'
     
     # Get categories and courses for filters
     categories = NoteCategory.objects.filter(user=request.user)
     courses = Course.objects.all()
     
     context = {
-        'notes': notes,
+        'notes': page_obj,
+        'page_obj': page_obj,
         'categories': categories,
         'courses': courses,
-        'total_notes': notes_count,
+        'total_notes': total_notes,
+        'tag_cloud': cloud,
+        'selected_tags': selected_tags,
+        'tag_match_all': match_all,
     }
     return render(request, 'users/notes_list.html', context)
 
 
+def note_json(note):
+    return {
+        'id': note.id,
+        'title': note.title,
+        'tags': note.get_tags_list(),
+        'category': note.category.name if note.category else None,
+        'course': note.course.title if note.course else None,
+        'is_pinned': note.is_pinned,
+        'is_favorite': note.is_favorite,
+        'updated_at': note.updated_at,
+        'url': reverse('note_detail', args=[note.id]),
+    }
+
+
+def tag_cloud(user):
+    """The user's tags with their note counts, most used first, from one GROUP BY"""
+    return list(
+        Tag.objects.filter(user=user)
+        .annotate(count=Count('note_tags'))
+        .filter(count__gt=0)
+        .order_by('-count', 'name')
+        .values('name', 'count')
+    )
+
+
+@login_required
+def note_tag_cloud(request):
+    """Tag cloud JSON: [{name, count}, ...]"""
+    return JsonResponse({'tags': tag_cloud(request.user)})
+
+
 @login_required
 def note_create(request):
     """Create a new note"""
@@ -767,45 +901,72 @@ def category_delete(request, category_id):
 @login_required
 def resources_library(request):
     """View all resources"""
-    # User's own resources
-    my_resources = SharedResource.objects.filter(user=request.user)
-    
-    # Public resources from other users - fetch all then filter is_public in Python
-    all_resources = list(SharedResource.objects.exclude(user=request.user))
-    public_resources_list = [r for r in all_resources if r.is_public]
-    
     # Filters
-    resource_type = request.GET.get('type')
+    resource_type = request.GET.get('resource_type')
     course_id = request.GET.get('course')
+    if course_id and not course_id.isdigit():
+        course_id = None
     search = request.GET.get('search')
+    sort = request.GET.get('sort')
+    if sort not in RESOURCE_SORTS:
+        sort = 'newest'
+    
+    # User's own resources, and public resources from other users, filtered and sorted in SQL
+    my_resources = (
+        SharedResource.objects.filter(user=request.user)
+        .matching(resource_type, course_id, search).select_related('course')
+    )
+    public_resources = (
+        SharedResource.objects.discoverable_by(request.user)
+        .matching(resource_type, course_id, search).select_related('user', 'course')
+    )
+    public_ordering = RESOURCE_SORTS[sort]
     
-    if resource_type:
-        my_resources = my_resources.filter(resource_type=resource_type)
-        public_resources_list = [r for r in public_resources_list if r.resource_type == resource_type]
-    
-    if course_id:
-        my_resources = my_resources.filter(course_id=course_id)
-        public_resources_list = [r for r in public_resources_list if str(r.course_id) == course_id]
-    
-    if search:
-        my_resources = my_resources.filter(Q(title__icontains=search) | Q(description__icontains=search))
-        search_lower = search.lower()
-        public_resources_list = [r for r in public_resources_list 
-                                 if search_lower in r.title.lower() or search_lower in (r.description or '').lower()]
+    # Each section pages independently; the JSON variant serves one, picked by ?section=
+    if wants_json(request):
+        if request.GET.get('section') == 'public':
+            page = paginate(request, public_resources, public_ordering, RESOURCES_PER_PAGE, param='public_cursor')
+        else:
+            page = paginate(request, my_resources, RESOURCE_ORDERING, RESOURCES_PER_PAGE)
+        return page.json_response(resource_json)
     
     courses = Course.objects.all()
     
+    # No COUNT(*) per page view: the unfiltered total of the user's own comes with the dashboard snapshot
+    if not (resource_type or course_id or search):
+        my_resources_count = UserDashboardSnapshot(request.user).get('resources_count')['resources_count']
+    else:
+        my_resources_count = None
+    
     context = {
-        'my_resources': my_resources,
-        'public_resources': public_resources_list,
-        'public_resources_count': len(public_resources_list),
-        'my_resources_count': my_resources.count(),
+        'my_resources': paginate(request, my_resources, RESOURCE_ORDERING, RESOURCES_PER_PAGE),
+        'public_resources': paginate(
+            request, public_resources, public_ordering, RESOURCES_PER_PAGE, param='public_cursor'
+        ),
+        'my_resources_count': my_resources_count,
         'courses': courses,
         'resource_types': SharedResource.RESOURCE_TYPES,
+        'sort': sort,
     }
     return render(request, 'users/resources_library.html', context)
 
 
+def resource_json(resource):
+    return {
+        'id': resource.id,
+        'title': resource.title,
+        'description': resource.description,
+        'resource_type': resource.resource_type,
+        'owner': resource.user.username,
+        'course': resource.course.title if resource.course else None,
+        'is_public': resource.is_public,
+        'views': resource.views,
+        'downloads': resource.downloads,
+        'created_at': resource.created_at,
+        'url': reverse('resource_view', args=[resource.id]),
+    }
+
+
 @login_required
 def resource_upload(request):
     """Upload a new resource"""
@@ -817,7 +978,7 @@ def resource_upload(request):
         course_id = request.POST.get('course')
         is_public = request.POST.get('is_public') == 'on'
         
-        resource = SharedResource.objects.create(
+        resource = SharedResource(
             user=request.user,
             title=title,
             description=description,
@@ -829,13 +990,21 @@ def resource_upload(request):
         if course_id:
             resource.course_id = course_id
         
-        # Handle file upload
-        if 'file' in request.FILES:
-            uploaded_file = request.FILES['file']
-            resource.file = uploaded_file
-            resource.file_size = uploaded_file.size
-        
-        resource.save()
+        # The file arrives either through a finished chunked upload session or in this POST
+        upload_id = request.POST.get('upload_id')
+        try:
+            with transaction.atomic():
+                if upload_id:
+                    session = get_object_or_404(UploadSession, id=upload_id, user=request.user, blob__isnull=False)
+                    uploads.attach_blob(resource, session.blob, session.filename)
+                    session.delete()
+                elif 'file' in request.FILES:
+                    uploaded_file = request.FILES['file']
+                    uploads.attach_blob(resource, uploads.store_uploaded_file(uploaded_file), uploaded_file.name)
+                resource.save()
+        except uploads.UploadError as exc:
+            messages.error(request, str(exc))
+            return redirect('resource_upload')
         
         messages.success(request, 'Resource uploaded successfully!')
         return redirect('resources_library')
@@ -849,6 +1018,64 @@ def resource_upload(request):
     return render(request, 'users/resource_upload.html', context)
 
 
+def upload_session_json(session):
+    return {
+        'id': str(session.id),
+        'filename': session.filename,
+        'size': session.size,
+        'offset': session.received,
+        'complete': session.is_complete,
+    }
+
+
+@login_required
+def upload_session_create(request):
+    """Open a chunked upload: JSON {filename, size} -> the session to PUT chunks to"""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST required'}, status=405)
+    try:
+        data = json.loads(request.body)
+        filename = os.path.basename(str(data['filename']))[:255]
+        size = int(data['size'])
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Send JSON with filename and size.'}, status=400)
+    if not filename or not 0 < size <= settings.RESOURCE_UPLOAD_MAX_SIZE:
+        return JsonResponse({'error': 'The file is empty or too large.'}, status=400)
+    
+    session = UploadSession.objects.create(user=request.user, filename=filename, size=size)
+    response = JsonResponse(upload_session_json(session), status=201)
+    response['Location'] = reverse('upload_session_detail', args=[session.id])
+    return response
+
+
+@login_required
+def upload_session_detail(request, session_id):
+    """GET: how far the upload got. PUT: the next chunk, at the Upload-Offset header. DELETE: abandon it."""
+    session = get_object_or_404(UploadSession, id=session_id, user=request.user)
+    
+    if request.method == 'PUT':
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            length = int(request.headers['Content-Length'])
+        except (KeyError, ValueError):
+            return JsonResponse({'error': 'Upload-Offset and Content-Length are required.'}, status=400)
+        try:
+            session = uploads.receive_chunk(session, request, offset, length)
+        except uploads.OffsetMismatch as exc:
+            session.received = exc.expected
+            return JsonResponse({**upload_session_json(session), 'error': str(exc)}, status=409)
+        except uploads.UploadError as exc:
+            session.refresh_from_db()
+            return JsonResponse({**upload_session_json(session), 'error': str(exc)}, status=400)
+    elif request.method == 'DELETE':
+        uploads.discard_session(session)
+        return HttpResponse(status=204)
+    elif request.method != 'GET':
+        return JsonResponse({'error': 'GET, PUT or DELETE required'}, status=405)
+    
+    return JsonResponse(upload_session_json(session))
+
+
 @login_required
 def resource_view(request, resource_id):
     """View a resource and increment view count"""
@@ -859,9 +1086,9 @@ def resource_view(request, resource_id):
         messages.error(request, 'You do not have permission to view this resource.')
         return redirect('resources_library')
     
-    # Increment views
-    resource.views += 1
-    resource.save()
+    # Buffered, written by the counter flush; show the count including what is still pending
+    counters.increment(resource, 'views')
+    resource.views += counters.pending(resource, 'views')
     
     context = {
         'resource': resource,
@@ -869,13 +1096,46 @@ def resource_view(request, resource_id):
     return render(request, 'users/resource_view.html', context)
 
 
+@login_required
+def resource_download(request, resource_id):
+    """Stream a resource's file (or follow its link) and count the download.
+    
+    ?inline=1 serves the file for in-page players; those requests (and the
+    Range requests players make while seeking) are not counted.
+    """
+    resource = get_object_or_404(SharedResource, id=resource_id)
+    
+    if not resource.is_public and resource.user != request.user:
+        messages.error(request, 'You do not have permission to download this resource.')
+        return redirect('resources_library')
+    
+    inline = request.GET.get('inline') == '1'
+    if resource.file:
+        try:
+            response = serve_file(
+                request, resource.file, as_attachment=not inline, filename=resource.original_filename or None,
+            )
+        except FileNotFoundError:
+            raise Http404('The file for this resource is missing.')
+    elif resource.url:
+        response = redirect(resource.url)
+    else:
+        raise Http404('This resource has nothing to download.')
+    
+    if not inline and response.status_code in (200, 302):
+        counters.increment(resource, 'downloads')
+    return response
+
+
 @login_required
 def resource_delete(request, resource_id):
     """Delete a resource"""
     resource = get_object_or_404(SharedResource, id=resource_id, user=request.user)
     
-    # Delete file if exists
-    if resource.file:
+    # Blobs are shared by every resource with the same content; the last one out unlinks it
+    if resource.blob_id:
+        uploads.release_blob(resource)
+    elif resource.file:
         if os.path.exists(resource.file.path):
             os.remove(resource.file.path)
     
@@ -891,40 +1151,66 @@ def resource_delete(request, resource_id):
 @login_required
 def groups_list(request):
     """List all study groups"""
-    # Get user's groups
-    my_groups = StudyGroup.objects.filter(members__user=request.user).distinct()
-    
-    # Get public groups user is not a member of - fetch all and filter is_private in Python
-    all_other_groups = list(StudyGroup.objects.exclude(members__user=request.user))
-    public_groups = [g for g in all_other_groups if not g.is_private]
+    # Get user's groups, and the public groups they are not a member of
+    groups = StudyGroup.objects.with_viewer(request.user).select_related('creator', 'course')
+    my_groups = groups.filter(viewer_is_member=True)
+    public_groups = groups.filter(is_private=False, viewer_is_member=False)
     
     # Apply filters
     search = request.GET.get('search', '')
     course_id = request.GET.get('course', '')
+    sort = request.GET.get('sort')
+    if sort not in GROUP_SORTS:
+        sort = 'newest'
     
     if search:
-        my_groups = my_groups.filter(Q(name__icontains=search) | Q(description__icontains=search))
-        search_lower = search.lower()
-        public_groups = [g for g in public_groups 
-                        if search_lower in g.name.lower() or search_lower in (g.description or '').lower()]
+        matches = Q(name__icontains=search) | Q(description__icontains=search)
+        my_groups = my_groups.filter(matches)
+        public_groups = public_groups.filter(matches)
     
     if course_id:
         my_groups = my_groups.filter(course_id=course_id)
-        public_groups = [g for g in public_groups if str(g.course_id) == course_id]
+        public_groups = public_groups.filter(course_id=course_id)
+    
+    public_ordering = GROUP_SORTS[sort]
     
-    # Fetch all courses and filter is_published in Python
-    all_courses = list(Course.objects.all())
-    courses = [c for c in all_courses if c.is_published]
+    # Each section pages independently; the JSON variant serves one, picked by ?section=
+    if wants_json(request):
+        if request.GET.get('section') == 'public':
+            page = paginate(request, public_groups, public_ordering, GROUPS_PER_PAGE, param='public_cursor')
+        else:
+            page = paginate(request, my_groups, GROUP_ORDERING, GROUPS_PER_PAGE)
+        return page.json_response(group_json)
+    
+    # No COUNT(*) per page view: the user's total comes with the dashboard snapshot
+    total_groups = UserDashboardSnapshot(request.user).get('groups_count')['groups_count']
     
     context = {
-        'my_groups': my_groups,
-        'public_groups': public_groups,
-        'courses': courses,
-        'total_groups': my_groups.count(),
+        'my_groups': paginate(request, my_groups, GROUP_ORDERING, GROUPS_PER_PAGE),
+        'public_groups': paginate(request, public_groups, public_ordering, GROUPS_PER_PAGE, param='public_cursor'),
+        'courses': Course.objects.only('id', 'title').order_by('title'),
+        'sort': sort,
+        'total_groups': total_groups,
+        'my_groups_count': None if search or course_id else total_groups,
     }
     return render(request, 'users/groups_list.html', context)
 
 
+def group_json(group):
+    return {
+        'id': group.id,
+        'name': group.name,
+        'description': group.description,
+        'creator': group.creator.username,
+        'course': group.course.title if group.course else None,
+        'is_private': group.is_private,
+        'member_count': group.member_count,
+        'max_members': group.max_members,
+        'created_at': group.created_at,
+        'url': reverse('group_detail', args=[group.id]),
+    }
+
+
 @login_required
 def group_create(request):
     """Create a new study group"""
@@ -962,17 +1248,16 @@ def group_create(request):
         messages.success(request, f'Study group "{group.name}" created successfully!')
         return redirect('group_detail', group_id=group.id)
     
-    # Fetch all courses and filter is_published in Python
-    all_courses = list(Course.objects.all())
-    courses = [c for c in all_courses if c.is_published]
-    context = {'courses': courses}
+    context = {'courses': Course.objects.only('id', 'title').order_by('title')}
     return render(request, 'users/group_create.html', context)
 
 
 @login_required
 def group_detail(request, group_id):
     """View study group details"""
-    group = get_object_or_404(StudyGroup, id=group_id)
+    group = get_object_or_404(
+        StudyGroup.objects.with_viewer(request.user).select_related('creator'), id=group_id
+    )
     
     # Check if user is a member
     is_member = group.is_member(request.user)
@@ -984,10 +1269,10 @@ def group_detail(request, group_id):
         return redirect('groups_list')
     
     # Get recent discussions
-    discussions = group.discussions.all()[:10]
+    discussions = group.discussions.select_related('author')[:10]
     
     # Get members
-    members = group.members.select_related('user').all()
+    members = group.members.select_related('user')
     
     context = {
         'group': group,
@@ -1002,25 +1287,23 @@ def group_detail(request, group_id):
 @login_required
 def group_join(request, group_id):
     """Join a study group"""
-    group = get_object_or_404(StudyGroup, id=group_id)
+    group = get_object_or_404(StudyGroup.objects.with_viewer(request.user), id=group_id)
     
     # Check if already a member
     if group.is_member(request.user):
         messages.info(request, 'You are already a member of this group.')
         return redirect('group_detail', group_id=group.id)
     
-    # Check if group is full
-    if group.is_full():
+    # Join the group; the capacity check happens in the same UPDATE that takes the seat
+    try:
+        membership = group.add_member(request.user)
+    except IntegrityError:
+        # Joined from another tab since the check above
+        return redirect('group_detail', group_id=group.id)
+    if membership is None:
         messages.error(request, 'This group is full.')
         return redirect('groups_list')
     
-    # Join the group
-    GroupMembership.objects.create(
-        user=request.user,
-        group=group,
-        role='member'
-    )
-    
     messages.success(request, f'You have joined "{group.name}"!')
     return redirect('group_detail', group_id=group.id)
 
@@ -1031,7 +1314,7 @@ def group_leave(request, group_id):
     group = get_object_or_404(StudyGroup, id=group_id)
     
     # Can't leave if you're the creator
-    if group.creator == request.user:
+    if group.creator_id == request.user.id:
         messages.error(request, 'Group creators cannot leave. Transfer ownership or delete the group.')
         return redirect('group_detail', group_id=group.id)
     
@@ -1059,27 +1342,50 @@ def group_delete(request, group_id):
 @login_required
 def discussion_list(request, group_id):
     """List discussions in a group"""
-    group = get_object_or_404(StudyGroup, id=group_id)
+    group = get_object_or_404(StudyGroup.objects.with_viewer(request.user), id=group_id)
     
     # Check membership
     if not group.is_member(request.user):
         messages.error(request, 'You must be a member to view discussions.')
         return redirect('group_detail', group_id=group.id)
     
-    discussions = group.discussions.all()
+    sort = request.GET.get('sort')
+    if sort not in DISCUSSION_SORTS:
+        sort = 'updated'
+    discussions = paginate(
+        request, group.discussions.select_related('author'), DISCUSSION_SORTS[sort], DISCUSSIONS_PER_PAGE
+    )
+    if wants_json(request):
+        return discussions.json_response(discussion_json)
     
     context = {
         'group': group,
         'discussions': discussions,
+        'sort': sort,
         'is_admin': group.is_admin(request.user),
     }
     return render(request, 'users/discussion_list.html', context)
 
 
+def discussion_json(discussion):
+    return {
+        'id': discussion.id,
+        'title': discussion.title,
+        'author': discussion.author.username,
+        'is_pinned': discussion.is_pinned,
+        'is_locked': discussion.is_locked,
+        'reply_count': discussion.reply_count,
+        'created_at': discussion.created_at,
+        'updated_at': discussion.updated_at,
+        'last_activity_at': discussion.last_activity_at,
+        'url': reverse('discussion_detail', args=[discussion.id]),
+    }
+
+
 @login_required
 def discussion_create(request, group_id):
     """Create a new discussion"""
-    group = get_object_or_404(StudyGroup, id=group_id)
+    group = get_object_or_404(StudyGroup.objects.with_viewer(request.user), id=group_id)
     
     # Check membership
     if not group.is_member(request.user):
@@ -1107,8 +1413,8 @@ def discussion_create(request, group_id):
 @login_required
 def discussion_detail(request, discussion_id):
     """View discussion and replies"""
-    discussion = get_object_or_404(Discussion, id=discussion_id)
-    group = discussion.group
+    discussion = get_object_or_404(Discussion.objects.select_related('author'), id=discussion_id)
+    group = discussion.group = StudyGroup.objects.with_viewer(request.user).get(pk=discussion.group_id)
     
     # Check membership
     if not group.is_member(request.user):
@@ -1118,27 +1424,37 @@ def discussion_detail(request, discussion_id):
     # Handle reply submission
     if request.method == 'POST' and not discussion.is_locked:
         content = request.POST.get('content')
-        parent_id = request.POST.get('parent_id')
+        parent_id = request.POST.get('parent_id', '')
+        parent = discussion.replies.filter(pk=parent_id).first() if parent_id.isdigit() else None
         
-        reply = DiscussionReply.objects.create(
-            discussion=discussion,
-            author=request.user,
-            content=content
-        )
-        
-        if parent_id:
-            reply.parent_id = parent_id
-            reply.save()
+        # One transaction for the reply and the discussion's reply count
+        with transaction.atomic():
+            reply = DiscussionReply.objects.create(
+                discussion=discussion,
+                author=request.user,
+                content=content,
+                parent=parent,
+            )
         
         messages.success(request, 'Reply added successfully!')
-        return redirect('discussion_detail', discussion_id=discussion.id)
-    
-    replies = discussion.replies.filter(parent=None).prefetch_related('children')
+        # Land on a page that shows the new reply
+        url = reverse('discussion_detail', args=[discussion.id])
+        if reply.parent_id:
+            url += f'?thread={reply.parent_id}'
+        elif discussion.replies.filter(depth=0, path__lt=reply.path).count() >= threads.BRANCHES_PER_PAGE:
+            url += f'?cursor={reply.path}'
+        return redirect(f'{url}#reply-{reply.id}')
+    
+    # A single reply's subtree (?thread=) for branches cut off in the full view, else a page of the thread
+    thread_id = request.GET.get('thread', '')
+    focus = None
+    if thread_id.isdigit():
+        focus = get_object_or_404(discussion.replies.select_related('author'), pk=thread_id)
     
     context = {
         'discussion': discussion,
         'group': group,
-        'replies': replies,
+        'replies': threads.load_thread(request, discussion, focus=focus),
         'is_admin': group.is_admin(request.user),
     }
     return render(request, 'users/discussion_detail.html', context)
@@ -1148,10 +1464,10 @@ def discussion_detail(request, discussion_id):
 def discussion_delete(request, discussion_id):
     """Delete a discussion (author or admin only)"""
     discussion = get_object_or_404(Discussion, id=discussion_id)
-    group = discussion.group
+    group = StudyGroup.objects.with_viewer(request.user).get(pk=discussion.group_id)
     
     # Check permissions
-    if discussion.author != request.user and not group.is_admin(request.user):
+    if discussion.author_id != request.user.id and not group.is_admin(request.user):
         messages.error(request, 'You do not have permission to delete this discussion.')
         return redirect('discussion_detail', discussion_id=discussion.id)
     
@@ -1214,33 +1530,95 @@ def add_review(request, target_type, target_id):
 # ============================================================================
 
 @login_required
+@user_resource_condition('notifications', relative_times=True)
 def get_notifications(request):
     """Get user notifications (AJAX endpoint)"""
+    return JsonResponse(notification_payload(request.user.id))
+
+
+def _sse_event(event, data, event_id=None):
+    lines = f'id: {event_id}\n' if event_id is not None else ''
+    return f'{lines}event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+@login_required
+async def notification_stream(request):
+    """Server-Sent Events stream of new notifications and unread counts.
+    
+    Needs an ASGI server (see project_1/asgi.py). Each connection lives for
+    NOTIFICATION_STREAM_LIFETIME seconds; EventSource then reconnects and
+    resumes from the Last-Event-ID header. Without a shared cache other
+    workers' changes would never reach it, so it answers 204, which tells
+    EventSource not to reconnect.
+    """
     from .models import Notification
     
-    notifications = list(Notification.objects.filter(user=request.user).order_by('-created_at')[:20])
+    if not cache_is_shared():
+        return HttpResponse(status=204)
+    user = await request.auser()
+    last_id = request.headers.get('Last-Event-ID', '')
+    if last_id.isdigit():
+        last_id = int(last_id)
+    else:
+        latest = await Notification.objects.filter(user_id=user.id).order_by('-id').afirst()
+        last_id = latest.id if latest else 0
+    
+    async def event_stream():
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.NOTIFICATION_STREAM_LIFETIME
+        version = await cache.aget(version_key(user.id), 0)
+        unread = await aunread_count(user.id)
+        newest_id = last_id
+        
+        yield 'retry: 5000\n\n'
+        yield _sse_event('unread', {'unread_count': unread, 'delta': 0, 'version': version})
+        while loop.time() < deadline:
+            timeout = min(settings.NOTIFICATION_STREAM_HEARTBEAT, deadline - loop.time())
+            current = await hub.wait(user.id, version, timeout)
+            if current == version:
+                yield ': keep-alive\n\n'
+                continue
+            version = current
+            
+            # In batches until none are left past the last one sent
+            while True:
+                sent = 0
+                new_rows = Notification.objects.filter(user_id=user.id, id__gt=newest_id).order_by('id')[:STREAM_BATCH_SIZE]
+                async for notification in new_rows:
+                    newest_id = notification.id
+                    sent += 1
+                    yield _sse_event('notification', serialize_notification(notification), notification.id)
+                if sent < STREAM_BATCH_SIZE:
+                    break
+            
+            count = await aunread_count(user.id)
+            yield _sse_event('unread', {'unread_count': count, 'delta': count - unread, 'version': version})
+            unread = count
     
-    # Count unread notifications in Python
-    unread_count = len([n for n in notifications if not n.is_read])
+    response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@login_required
+async def notification_poll(request):
+    """Conditional / long-poll fallback for the notification bell.
     
-    data = {
-        'notifications': [
-            {
-                'id': str(n.id),
-                'type': n.notification_type,
-                'title': n.title,
-                'message': n.message,
-                'link': n.link,
-                'is_read': n.is_read,
-                'created_at': n.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-                'time_ago': n.time_ago(),
-            }
-            for n in notifications
-        ],
-        'unread_count': unread_count
-    }
+    ?version=N returns 304 when nothing changed; adding ?wait=S holds the
+    request up to S seconds for a change first. Both need a shared cache
+    (users.notifications); without one every request gets the full payload.
+    """
+    user = await request.auser()
+    known = request.GET.get('version', '')
+    if known.isdigit() and cache_is_shared():
+        wait = request.GET.get('wait', '')
+        wait = min(int(wait), settings.NOTIFICATION_LONG_POLL_MAX_WAIT) if wait.isdigit() else 0
+        current = await hub.wait(user.id, int(known), wait)
+        if current == int(known):
+            return HttpResponseNotModified()
     
-    return JsonResponse(data)
+    return JsonResponse(await sync_to_async(notification_payload)(user.id))
 
 
 @login_required
@@ -1249,7 +1627,7 @@ def mark_notification_read(request, notification_id):
     from .models import Notification
     
     notification = get_object_or_404(Notification, id=notification_id, user=request.user)
-    notification.mark_as_read()
+    mark_read(request.user.id, [notification.pk])
     
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         return JsonResponse({'success': True})
@@ -1264,14 +1642,7 @@ def mark_notification_read(request, notification_id):
 @login_required
 def mark_all_notifications_read(request):
     """Mark all notifications as read"""
-    from .models import Notification
-    
-    # Fetch all unread notifications and mark them read in Python
-    all_notifications = list(Notification.objects.filter(user=request.user))
-    unread_notifications = [n for n in all_notifications if not n.is_read]
-    for n in unread_notifications:
-        n.is_read = True
-        n.save()
+    mark_read(request.user.id)
     
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         return JsonResponse({'success': True})
@@ -1281,20 +1652,19 @@ def mark_all_notifications_read(request):
 
 
 @login_required
+@vary_on_headers('X-Requested-With')
+@user_resource_condition('badges', shared=('badge_catalog',), ajax_only=True)
 def get_user_badges(request):
     """Get user's earned badges"""
     from .models import UserBadge, Badge
     
-    # Get earned badges
-    earned_badges = UserBadge.objects.filter(user=request.user).select_related('badge')
-    
-    # Get all available badges - fetch all and filter is_active in Python
-    all_badges_list = list(Badge.objects.all())
-    all_badges = [b for b in all_badges_list if b.is_active]
+    # Earned badges keyed by badge id, loaded once
+    earned_at = dict(UserBadge.objects.filter(user=request.user).values_list('badge_id', 'earned_at'))
+    all_badges = list(Badge.objects.filter(is_active=True))
     
     badge_data = []
     for badge in all_badges:
-        user_badge = earned_badges.filter(badge=badge).first()
+        badge_earned_at = earned_at.get(badge.id)
         badge_data.append({
             'id': str(badge.id),
             'name': badge.name,
@@ -1303,13 +1673,13 @@ def get_user_badges(request):
             'color': badge.color,
             'badge_type': badge.badge_type,
             'requirement': badge.requirement,
-            'earned': user_badge is not None,
-            'earned_at': user_badge.earned_at.strftime('%Y-%m-%d') if user_badge else None,
+            'earned': badge_earned_at is not None,
+            'earned_at': badge_earned_at.strftime('%Y-%m-%d') if badge_earned_at else None,
         })
     
     data = {
         'badges': badge_data,
-        'total_earned': earned_badges.count(),
+        'total_earned': len(earned_at),
         'total_available': len(all_badges),
     }
     
@@ -1321,95 +1691,22 @@ def get_user_badges(request):
 
 @login_required
 def check_badge_eligibility(request):
-    """Check and auto-award eligible badges"""
-    from .models import Badge, UserBadge, Notification, Profile
-    from django.db.models import Sum, Count
+    """Report badges awarded since the user last checked.
     
-    profile = Profile.objects.get(user=request.user)
-    newly_earned = []
+    Badges are awarded by users.badges.evaluate_badges from model signals,
+    so this endpoint only reads UserBadge rows.
+    """
+    from .models import UserBadge
     
-    # Get all active badges - fetch all and filter in Python
-    all_badges_list = list(Badge.objects.all())
-    badges = [b for b in all_badges_list if b.is_active]
+    now = timezone.now()
+    last_checked = request.session.get('badges_checked_at')
+    since = datetime.fromisoformat(last_checked) if last_checked else request.user.last_login
+    request.session['badges_checked_at'] = now.isoformat()
     
-    for badge in badges:
-        # Skip if already earned
-        if UserBadge.objects.filter(user=request.user, badge=badge).exists():
-            continue
-        
-        earned = False
-        
-        # Check study badges
-        if badge.badge_type == 'study':
-            total_hours = profile.total_study_hours or 0
-            
-            if 'First Steps' in badge.name and total_hours >= 1:
-                earned = True
-            elif '10 Hour Hero' in badge.name and total_hours >= 10:
-                earned = True
-            elif 'Century Scholar' in badge.name and total_hours >= 100:
-                earned = True
-            elif '7 Day Streak' in badge.name and (profile.study_streak or 0) >= 7:
-                earned = True
-            elif '30 Day Champion' in badge.name and (profile.study_streak or 0) >= 30:
-                earned = True
-        
-        # Check social badges
-        elif badge.badge_type == 'social':
-            if 'Team Player' in badge.name:
-                group_count = GroupMembership.objects.filter(user=request.user).count()
-                if group_count >= 1:
-                    earned = True
-            elif 'Discussion Starter' in badge.name:
-                discussion_count = Discussion.objects.filter(author=request.user).count()
-                if discussion_count >= 10:
-                    earned = True
-            elif 'Helpful Peer' in badge.name:
-                review_count = PeerReview.objects.filter(reviewer=request.user).count()
-                if review_count >= 25:
-                    earned = True
-        
-        # Check skill badges
-        elif badge.badge_type == 'skill':
-            if 'Note Taker' in badge.name:
-                note_count = StudyNote.objects.filter(user=request.user).count()
-                if note_count >= 10:
-                    earned = True
-            elif 'Resource Master' in badge.name:
-                resource_count = SharedResource.objects.filter(user=request.user).count()
-                if resource_count >= 20:
-                    earned = True
-            elif 'Course Enthusiast' in badge.name:
-                # No enrollment system in simplified version - award based on lesson progress
-                from courses.models import LessonProgress
-                completed_lessons = LessonProgress.objects.filter(
-                    user_link=request.user, 
-                    is_completed=True
-                ).count()
-                if completed_lessons >= 5:
-                    earned = True
-        
-        # Check special badges
-        elif badge.badge_type == 'special':
-            if 'Master Student' in badge.name:
-                earned_count = UserBadge.objects.filter(user=request.user).count()
-                if earned_count >= 10:
-                    earned = True
-        
-        # Award badge if earned
-        if earned:
-            UserBadge.objects.create(user=request.user, badge=badge)
-            
-            # Create notification
-            Notification.objects.create(
-                user=request.user,
-                notification_type='badge',
-                title=f'🏆 Badge Earned: {badge.name}',
-                message=badge.description,
-                link='/profile/'
-            )
-            
-            newly_earned.append(badge)
+    newly_earned = UserBadge.objects.filter(user=request.user).select_related('badge')
+    if since:
+        newly_earned = newly_earned.filter(earned_at__gt=since)
+    newly_earned = [user_badge.badge for user_badge in newly_earned]
     
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         return JsonResponse({
@@ -1432,24 +1729,22 @@ def check_badge_eligibility(request):
 
 
 @login_required
+def dashboard_cache_stats(request):
+    """Dashboard snapshot cache counters (staff only)"""
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Staff access required'}, status=403)
+    return JsonResponse(UserDashboardSnapshot.stats())
+
+
+@login_required
+@user_resource_condition('activity', relative_times=True)
 def get_activity_feed(request):
-    """Get user's recent activity"""
-    from .models import UserActivity
-    
-    activities = UserActivity.objects.filter(user=request.user).order_by('-created_at')[:20]
-    
+    """Activity of the user and their study groups' members, newest first (?cursor= for older)"""
+    page = feed.feed_page(request, request.user.id)
     data = {
-        'activities': [
-            {
-                'id': str(a.id),
-                'activity_type': a.activity_type,
-                'description': a.description,
-                'link': a.link,
-                'created_at': a.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-                'time_ago': a.time_ago(),
-            }
-            for a in activities
-        ]
+        'activities': [feed.serialize_entry(entry) for entry in page],
+        'next': page.next_url,
+        'next_cursor': page.next_cursor,
     }
     
     return JsonResponse(data)